@@ -0,0 +1,72 @@
+"""
+Compression ratio and CPU cost of Compressor
+
+Encodes sessions of a few sizes with ujson and reports, per algorithm, the compressed
+size relative to the encoded one and the time taken to compress and decompress them.
+lz4 and zstd are only measured when installed.
+
+    $ PYTHONPATH=. python benchmarks/compression.py
+"""
+import time
+import random
+
+import ujson
+
+from sanic_cookies import Compressor
+
+ROUNDS = 200
+
+random.seed(0)
+
+
+def make_session(items):
+    return {
+        "cart": [
+            {"sku": "sku-%06d" % random.randrange(10 ** 6), "qty": random.randrange(10), "title": "Product %d" % i}
+            for i in range(items)
+        ],
+        "flags": {"feature_%d" % i: random.random() < 0.5 for i in range(items // 2)},
+    }
+
+
+def median_of(fn, *args):
+    # In microseconds
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1e6
+
+
+def available_compressors():
+    compressors = []
+    for algorithm in ("zlib", "lz4", "zstd"):
+        try:
+            compressors.append(Compressor(threshold=0, algorithm=algorithm))
+        except ImportError:
+            print("({} isn't installed)".format(algorithm))
+    return compressors
+
+
+def main():
+    compressors = available_compressors()
+    print("{:<8} {:>10} {:>12} {:>8} {:>14} {:>16}".format(
+        "algo", "size (B)", "compressed", "ratio", "compress (us)", "decompress (us)"
+    ))
+    for items in (10, 100, 500):
+        encoded = ujson.dumps(make_session(items))
+        for compressor in compressors:
+            compressed = compressor.compress(encoded)
+            print("{:<8} {:>10} {:>12} {:>8.2f} {:>14.1f} {:>16.1f}".format(
+                compressor.algorithm,
+                len(encoded),
+                len(compressed),
+                len(encoded) / len(compressed),
+                median_of(compressor.compress, encoded),
+                median_of(compressor.decompress, compressed),
+            ))
+
+
+if __name__ == "__main__":
+    main()
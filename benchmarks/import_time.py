@@ -0,0 +1,61 @@
+"""
+Cold import time and memory of sanic_cookies
+
+Imports sanic_cookies in fresh interpreters (after sanic, which an app imports anyway)
+and reports the median import time and the peak RSS. "eager" imports every interface,
+like sanic_cookies did before its imports were made lazy.
+
+    $ PYTHONPATH=. python benchmarks/import_time.py
+"""
+import sys
+import json
+import statistics
+import subprocess
+
+RUNS = 15
+
+SCENARIOS = {
+    "import sanic_cookies": "import sanic_cookies",
+    "Session + InMemory": "from sanic_cookies import Session, InMemory",
+    "Session + AuthSession + Aioredis": "from sanic_cookies import Session, AuthSession, Aioredis",
+    "InCookieEncrypted": "from sanic_cookies import Session, InCookieEncrypted",
+    "eager": "import sanic_cookies; [getattr(sanic_cookies, name) for name in sanic_cookies.__all__]",
+}
+
+TEMPLATE = """
+import sys, time, resource, json
+import sanic
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+modules = len(sys.modules)
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+    "modules": len(sys.modules) - modules,
+}}))
+"""
+
+
+def measure(code):
+    results = [
+        json.loads(subprocess.check_output([sys.executable, "-c", TEMPLATE.format(code=code)]))
+        for _ in range(RUNS)
+    ]
+    return (
+        statistics.median(result["elapsed"] for result in results),
+        statistics.median(result["rss"] for result in results),
+        results[0]["modules"],
+    )
+
+
+def main():
+    print("{:<36} {:>10} {:>12} {:>9}".format("scenario", "ms", "RSS (KiB)", "modules"))
+    for name, code in SCENARIOS.items():
+        elapsed, rss, modules = measure(code)
+        print("{:<36} {:>10.2f} {:>12} {:>9}".format(name, elapsed * 1000, rss, modules))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Time to snapshot and restore InMemory sessions
+
+    $ PYTHONPATH=. python benchmarks/inmemory_snapshot.py [number of sessions]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+from sanic_cookies import InMemory
+
+SESSION = '{"current_user":{"id":123,"email":"foo@bar.baz"},"csrf":"0123456789abcdef"}'
+
+
+async def main(n):
+    path = os.path.join(tempfile.mkdtemp(), "sessions.snapshot")
+    interface = InMemory(snapshot_path=path)
+    for i in range(n):
+        interface._store.set("session:%032x" % i, 3600, SESSION)
+
+    start = time.perf_counter()
+    await interface.snapshot()
+    print("snapshot: {:.2f}s, {:.1f} MB".format(time.perf_counter() - start, os.path.getsize(path) / 1e6))
+
+    restored_interface = InMemory(snapshot_path=path)
+    lags = []
+
+    async def ticker():
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            lags.append(loop.time() - start - 0.001)
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    restored = await restored_interface.restore()
+    elapsed = time.perf_counter() - start
+    tick.cancel()
+    print("restore: {:.2f}s, {} sessions, max event loop stall {:.1f} ms".format(elapsed, restored, max(lags) * 1000))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000))
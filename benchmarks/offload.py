@@ -0,0 +1,87 @@
+"""
+Event loop stalls caused by encrypting/decrypting large InCookieEncrypted sessions
+
+Runs N concurrent fetch + store cycles of a large session while a ticker coroutine
+measures how late the event loop wakes it up. Compares inline work with Offload.
+
+    $ PYTHONPATH=. python benchmarks/offload.py
+"""
+import time
+import asyncio
+import statistics
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from cryptography.fernet import Fernet
+
+from sanic_cookies import InCookieEncrypted, Offload
+
+CONCURRENCY = 50
+ROUNDS = 20
+SESSION = {"cart": [{"sku": "sku-%d" % i, "qty": i, "title": "x" * 64} for i in range(500)]}
+TICK = 0.001
+
+
+class Request(dict):
+    def __init__(self, cookie):
+        super().__init__()
+        self.cookies = {"SESSION": cookie}
+
+
+class SessionDict:
+    def __init__(self):
+        self.sid = None
+        self._prev_sid = []
+
+
+async def ticker(lags, stop):
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - start - TICK)
+
+
+async def worker(interface, cookie):
+    for _ in range(ROUNDS):
+        request = Request(cookie)
+        request["session"] = SessionDict()
+        val = await interface.fetch(cookie, None, request, "SESSION")
+        await interface.store(None, None, val, request, "SESSION", "session")
+
+
+async def run(interface, cookie):
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.ensure_future(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(interface, cookie) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "max_stall_ms": round(lags[-1] * 1000, 2),
+        "p99_stall_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2),
+        "mean_stall_ms": round(statistics.mean(lags) * 1000, 3),
+    }
+
+
+def main():
+    key = Fernet.generate_key()
+    cookie = InCookieEncrypted(key)._encrypt(SESSION)
+    print("Payload: {} bytes, {} workers x {} rounds".format(len(cookie), CONCURRENCY, ROUNDS))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for name, offload in (
+        ("inline", None),
+        ("threads", Offload(threshold=16 * 1024, executor=ThreadPoolExecutor(4))),
+        ("processes", Offload(threshold=16 * 1024, executor=ProcessPoolExecutor(4))),
+    ):
+        interface = InCookieEncrypted(key, offload=offload)
+        print(name.ljust(10), loop.run_until_complete(run(interface, cookie)))
+        if offload is not None:
+            offload.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
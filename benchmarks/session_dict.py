@@ -0,0 +1,73 @@
+"""
+Per access overhead of SessionDict and FastSessionDict, compared to a plain dict
+
+Times reads, writes and a few dict methods inside the session's context manager
+(i.e. with its lock held) and reports nanoseconds per operation and instance sizes.
+
+    $ PYTHONPATH=. python benchmarks/session_dict.py
+"""
+import sys
+import timeit
+import asyncio
+
+from sanic_cookies import SessionDict, FastSessionDict
+
+NUMBER = 200000
+
+OPERATIONS = {
+    "sess['foo']": "sess['foo']",
+    "sess['foo'] = 1": "sess['foo'] = 1",
+    "sess.get('foo')": "sess.get('foo')",
+    "sess.setdefault('foo', 1)": "sess.setdefault('foo', 1)",
+    "sess.update(foo=1)": "sess.update(foo=1)",
+    "'foo' in sess": "'foo' in sess",
+}
+
+
+class Session:
+    deferred_flush = False
+
+    async def _fetch_sess(self, sid, request=None):
+        return {"foo": "bar", "cart": list(range(10))}
+
+    async def _save_sess(self, session_dict, request=None, response=None):
+        pass
+
+
+def size_of(obj):
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, "__dict__") else 0)
+
+
+def time_operations(sess):
+    return {name: timeit.timeit(stmt, globals={"sess": sess}, number=NUMBER) for name, stmt in OPERATIONS.items()}
+
+
+async def measure(factory):
+    if factory is dict:
+        sess = {"foo": "bar", "cart": list(range(10))}
+        return sess, time_operations(sess)
+    sess = factory(sid="sid", session=Session())
+    async with sess:
+        return sess, time_operations(sess)
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    factories = (dict, SessionDict, FastSessionDict)
+    results = {}
+    for factory in factories:
+        results[factory] = loop.run_until_complete(measure(factory))
+    loop.close()
+
+    print("{:<28}".format("ns/op") + "".join("{:>18}".format(factory.__name__) for factory in factories))
+    for name in OPERATIONS:
+        print("{:<28}".format(name) + "".join(
+            "{:>18.1f}".format(results[factory][1][name] / NUMBER * 1e9) for factory in factories
+        ))
+    print("{:<28}".format("instance size (bytes)") + "".join(
+        "{:>18}".format(size_of(results[factory][0])) for factory in factories
+    ))
+
+
+if __name__ == "__main__":
+    main()
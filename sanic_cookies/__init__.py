@@ -1,8 +1,50 @@
-from .interfaces import InMemory, GinoAsyncPG, Aioredis, InCookieEncrypted  # noqa: F401  imported but unused
+# Public names are imported on first access (See: _lazy.py), so importing sanic_cookies stays cheap
+from typing import TYPE_CHECKING
 
-from .models import SessionDict  # noqa: F401  imported but unused
+from ._lazy import lazy_attributes
 
-from .sessions import Session, AuthSession, login_required  # noqa: F401  imported but unused
+if TYPE_CHECKING:  # pragma: no cover
+    from .interfaces import InMemory, GinoAsyncPG, AsyncPG, Aioredis, AioredisHash, InCookieEncrypted, SharedMemory, SQLite, Migrating  # noqa: F401  imported but unused
+    from .interfaces import Offload, Compressor, SignedSID, VersionConflict  # noqa: F401  imported but unused
+    from .models import SessionDict, FastSessionDict, LazySessionDict, NotLoadedError  # noqa: F401  imported but unused
+    from .sessions import Session, AuthSession, login_required, Coordinator, InvalidationHub, WebSocketSession  # noqa: F401  imported but unused
+    from .cache import TTLCache  # noqa: F401  imported but unused
+    from .policies import CircuitBreaker, FallbackRead, HedgedRead, TokenBucket, AdmissionPolicy  # noqa: F401  imported but unused
+
+_ATTRIBUTES = {
+    "InMemory": ".interfaces",
+    "GinoAsyncPG": ".interfaces",
+    "AsyncPG": ".interfaces",
+    "Aioredis": ".interfaces",
+    "AioredisHash": ".interfaces",
+    "InCookieEncrypted": ".interfaces",
+    "SharedMemory": ".interfaces",
+    "SQLite": ".interfaces",
+    "Migrating": ".interfaces",
+    "Offload": ".interfaces",
+    "Compressor": ".interfaces",
+    "SignedSID": ".interfaces",
+    "VersionConflict": ".interfaces",
+    "SessionDict": ".models",
+    "FastSessionDict": ".models",
+    "LazySessionDict": ".models",
+    "NotLoadedError": ".models",
+    "Session": ".sessions",
+    "AuthSession": ".sessions",
+    "login_required": ".sessions",
+    "Coordinator": ".sessions",
+    "InvalidationHub": ".sessions",
+    "WebSocketSession": ".sessions",
+    "TTLCache": ".cache",
+    "CircuitBreaker": ".policies",
+    "FallbackRead": ".policies",
+    "HedgedRead": ".policies",
+    "TokenBucket": ".policies",
+    "AdmissionPolicy": ".policies",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTES)
 
 # TODO: Write abstract interfaces for interfaces and store_factories
-# TODO: Validate SID format at _open_sess  # https://gist.github.com/ShawnMilo/7777304 (maybe include interface.sid_validate()) ?
@@ -0,0 +1,35 @@
+import importlib
+
+
+def lazy_attributes(namespace, attributes):
+    """
+    Returns a module level __getattr__ and __dir__ that import a package's attributes on first access
+
+    e.g. __getattr__, __dir__ = lazy_attributes(globals(), {"InMemory": ".inmemory"})
+
+    Arguments:
+
+        namespace (dict):
+
+            globals() of the package
+
+        attributes (dict):
+
+            Attribute name -> (relative) module that defines it
+    """
+    package = namespace["__name__"]
+
+    def __getattr__(name):
+        try:
+            module = attributes[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(package, name)) from None
+        val = getattr(importlib.import_module(module, package), name)
+        # Cache it, so that __getattr__ is only called once per name
+        namespace[name] = val
+        return val
+
+    def __dir__():
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__
@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+
+
+__all__ = ["TTLCache"]
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A bounded LRU cache whose entries expire ``ttl`` seconds after they're set
+
+    Arguments:
+
+        maxsize (int):
+
+            Least recently used entries are evicted beyond this size. Default: 1024
+
+        ttl (float):
+
+            Seconds. Default: 60
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._store = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            expires_at, val = self._store[key]
+        except KeyError:
+            return default
+        if time.monotonic() >= expires_at:
+            del self._store[key]
+            return default
+        self._store.move_to_end(key)
+        return val
+
+    def set(self, key, val):
+        self._store[key] = (time.monotonic() + self.ttl, val)
+        self._store.move_to_end(key)
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    def delete(self, key):
+        self._store.pop(key, None)
+
+    def clear(self):
+        self._store.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._store)
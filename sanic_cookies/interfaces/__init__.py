@@ -1,6 +1,54 @@
-from .gino_asyncpg import GinoAsyncPG
-from .aioredis import Aioredis
-from .inmemory import InMemory
-from .incookie import InCookieEncrypted  # noqa: F401  imported but unused
+# Interfaces are imported on first access, so that e.g. cryptography is only imported by apps that use InCookieEncrypted
+from typing import TYPE_CHECKING
 
-STATIC_SID_COOKIE_INTERFACES = [GinoAsyncPG, Aioredis, InMemory]
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .gino_asyncpg import GinoAsyncPG  # noqa: F401  imported but unused
+    from .asyncpg_pool import AsyncPG  # noqa: F401  imported but unused
+    from .aioredis import Aioredis  # noqa: F401  imported but unused
+    from .aioredis_hash import AioredisHash  # noqa: F401  imported but unused
+    from .inmemory import InMemory  # noqa: F401  imported but unused
+    from .sharedmem import SharedMemory  # noqa: F401  imported but unused
+    from .sqlite import SQLite  # noqa: F401  imported but unused
+    from .migrating import Migrating  # noqa: F401  imported but unused
+    from .incookie import InCookieEncrypted  # noqa: F401  imported but unused
+    from .codec import Offload, Compressor  # noqa: F401  imported but unused
+    from .sid import SignedSID  # noqa: F401  imported but unused
+    from .redis_scripts import VersionConflict  # noqa: F401  imported but unused
+
+__all__ = [
+    "GinoAsyncPG",
+    "AsyncPG",
+    "Aioredis",
+    "AioredisHash",
+    "InMemory",
+    "SharedMemory",
+    "SQLite",
+    "Migrating",
+    "InCookieEncrypted",
+    "Offload",
+    "Compressor",
+    "SignedSID",
+    "VersionConflict",
+    "STATIC_SID_COOKIE_INTERFACES",
+]
+
+_ATTRIBUTES = {
+    "GinoAsyncPG": ".gino_asyncpg",
+    "AsyncPG": ".asyncpg_pool",
+    "Aioredis": ".aioredis",
+    "AioredisHash": ".aioredis_hash",
+    "InMemory": ".inmemory",
+    "SharedMemory": ".sharedmem",
+    "SQLite": ".sqlite",
+    "Migrating": ".migrating",
+    "InCookieEncrypted": ".incookie",
+    "Offload": ".codec",
+    "Compressor": ".codec",
+    "SignedSID": ".sid",
+    "VersionConflict": ".redis_scripts",
+    "STATIC_SID_COOKIE_INTERFACES": ".static",
+}
+
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTES)
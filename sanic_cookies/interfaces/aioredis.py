@@ -1,38 +1,200 @@
+import time
+
 import ujson
-import uuid
+
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
+from .redis_scripts import STORE_USER_SESSION, FETCH_AND_TOUCH, STORE_IF_VERSION, VersionConflict
+
+
+# Where the versions fetched by a request are kept (in the request)
+_VERSIONS_KEY = "__sanic_cookies_versions__"
 
 
-class Aioredis:  # pragma: no cover
+class Aioredis(CodecMixin):
     """
         encoder & decoder:
 
             e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
             Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large payloads in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large sessions. Default: None
+
+        user_prefix:
+
+            Prefix of the sorted sets that index the SIDs of each user
+            (See: AuthSession(track_user_sessions=True)). Default: "session_user:"
+
+        scripts:
+
+            Fetch and store with Lua scripts (EVALSHA), so that:
+                - Fetching a session also refreshes its expiry (sliding expiry) in the same round trip,
+                  to the expiry it was last stored with (e.g. login_user's duration)
+                - Each write increments the session's version, kept with its expiry in a hash prefixed with version_prefix
+            Default: False
+
+        check_version (requires scripts):
+
+            Writes fail with VersionConflict when the session was written by another request
+            since this request fetched it. The check and the write are atomic. Default: False
+
+        version_prefix:
+
+            Default: "session_version:"
     """
 
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
     def __init__(
         self,
         client,
         prefix="session:",
         encoder=ujson.dumps,
         decoder=ujson.loads,
-        sid_factory=lambda: uuid.uuid4().hex,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+        user_prefix="session_user:",
+        scripts=False,
+        check_version=False,
+        version_prefix="session_version:",
     ):
+        if check_version and not scripts:
+            raise ValueError("check_version requires scripts=True")
         self.client = client
         self.prefix = prefix
+        self.user_prefix = user_prefix
+        self.scripts = scripts
+        self.check_version = check_version
+        self.version_prefix = version_prefix
         self.encoder = encoder
         self.decoder = decoder
         self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
+
+    async def load_scripts(self):
+        """ Loads the scripts into Redis' script cache ahead of their first use (optional) """
+        for script in (STORE_USER_SESSION, FETCH_AND_TOUCH, STORE_IF_VERSION):
+            await script.load(self.client)
 
-    async def fetch(self, sid, **kwargs):
-        val = await self.client.get(self.prefix + sid)
+    async def fetch(self, sid, expiry=None, request=None, **kwargs):
+        if self.scripts and expiry is not None:
+            val, version = await self.fetch_versioned(sid, expiry)
+            if self.check_version and request is not None:
+                self._versions(request)[sid] = version
+        else:
+            val = await self.client.get(self.prefix + sid)
         if val is not None:
-            return self.decoder(val)
+            return await self._decode(val)
+
+    async def fetch_versioned(self, sid, expiry):
+        """ Returns the session's encoded value and version (0 if there's no session) and refreshes their expiry """
+        val, version = await FETCH_AND_TOUCH(
+            self.client, keys=[self.prefix + sid, self.version_prefix + sid], args=[expiry]
+        )
+        return val, int(version or 0)
+
+    async def store_if_version(self, sid, expiry, val, version=None, user_id=None):
+        """
+        Stores an encoded value if the session's version is still ``version`` (Not checked if None)
+
+        Returns the new version. Raises VersionConflict otherwise
+        """
+        keys = [self.prefix + sid, self.version_prefix + sid]
+        if user_id is not None:
+            keys.append(self.user_prefix + str(user_id))
+        new_version = await STORE_IF_VERSION(
+            self.client, keys=keys, args=[expiry, val, "" if version is None else version, sid, time.time()]
+        )
+        if new_version is None:
+            raise VersionConflict(sid)
+        return int(new_version)
+
+    @staticmethod
+    def _versions(request):
+        versions = request.get(_VERSIONS_KEY)
+        if versions is None:
+            versions = request[_VERSIONS_KEY] = {}
+        return versions
 
-    async def store(self, sid, expiry, val, **kwargs):
+    async def fetch_many(self, sids, **kwargs):
+        vals = await self.client.mget(*[self.prefix + sid for sid in sids])
+        return [None if val is None else await self._decode(val) for val in vals]
+
+    async def store(self, sid, expiry, val, user_id=None, request=None, **kwargs):
         if val is not None:
-            val = self.encoder(val)
-            await self.client.setex(self.prefix + sid, expiry, val)
+            val = await self._encode(val)
+            if self.scripts:
+                versions = self._versions(request) if self.check_version and request is not None else {}
+                versions[sid] = await self.store_if_version(
+                    sid, expiry, val, version=versions.get(sid), user_id=user_id
+                )
+            elif user_id is None:
+                await self.client.setex(self.prefix + sid, expiry, val)
+            else:
+                now = time.time()
+                await STORE_USER_SESSION(
+                    self.client,
+                    keys=[self.prefix + sid, self.user_prefix + str(user_id)],
+                    args=[expiry, val, now + expiry, sid, now],
+                )
 
     async def delete(self, sid, **kwargs):
-        await self.client.delete(self.prefix + sid)
+        if self.scripts:
+            await self.client.delete(self.prefix + sid, self.version_prefix + sid)
+        else:
+            await self.client.delete(self.prefix + sid)
+
+    async def user_sids(self, user_id, **kwargs):
+        """ SIDs of the user's unexpired sessions (Logged out sessions are listed until they expire) """
+        sids = await self.client.zrangebyscore(self.user_prefix + str(user_id), min=time.time())
+        return [sid.decode() if isinstance(sid, bytes) else sid for sid in sids]
+
+    async def forget_user(self, user_id, **kwargs):
+        await self.client.delete(self.user_prefix + str(user_id))
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields lists of (sid, session) with SCAN, so only one batch is held in memory at a time """
+        cursor = 0
+        while True:
+            cursor, keys = await self.client.scan(cursor, match=self.prefix + "*", count=batch_size)
+            if keys:
+                vals = await self.client.mget(*keys)
+                yield [
+                    (self._sid_of(key), await self._decode(val))
+                    for key, val in zip(keys, vals)
+                    if val is not None
+                ]
+            if int(cursor) == 0:
+                return
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        sids = list(sids)
+        prefixes = (self.prefix, self.version_prefix) if self.scripts else (self.prefix,)
+        for i in range(0, len(sids), batch_size):
+            await self.client.delete(*[prefix + sid for sid in sids[i:i + batch_size] for prefix in prefixes])
+
+    def _sid_of(self, key):
+        if isinstance(key, bytes):
+            key = key.decode()
+        return key[len(self.prefix):]
@@ -0,0 +1,134 @@
+import ujson
+
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
+from ..models import NOT_LOADED, LazyStore
+
+
+__all__ = ["AioredisHash"]
+
+
+class AioredisHash(CodecMixin):
+    """
+        Stores each session as a Redis hash, with one field per session key
+
+        Use it with store_factory=LazySessionDict so that requests only fetch the values they read.
+        (It works with any session dict, but then whole sessions are fetched, as with Aioredis)
+
+        encoder & decoder:
+
+            Applied to each value separately.
+            e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
+            Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large values in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large values. Default: None
+
+    .. note::
+
+        A LazySessionDict's values are only fetched from the master interface,
+        so it can't be combined with other interfaces or read policies
+    """
+
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
+    def __init__(
+        self,
+        client,
+        prefix="session:",
+        encoder=ujson.dumps,
+        decoder=ujson.loads,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.encoder = encoder
+        self.decoder = decoder
+        self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
+
+    async def _decode_fields(self, fields, vals):
+        return {
+            _text(field): await self._decode(val)
+            for field, val in zip(fields, vals)
+            if val is not None
+        }
+
+    async def fetch(self, sid, **kwargs):
+        hash_ = await self.client.hgetall(self.prefix + sid)
+        if hash_:
+            return await self._decode_fields(hash_.keys(), hash_.values())
+
+    async def fetch_lazy(self, sid, eager_fields=(), **kwargs):
+        """
+        Fetches a session's field names and the values of eager_fields, in one round trip
+
+        Returns a LazyStore (or None if there's no such session)
+        """
+        key = self.prefix + sid
+        pipe = self.client.pipeline()
+        fields = pipe.hkeys(key)
+        vals = pipe.hmget(key, *eager_fields) if eager_fields else None
+        await pipe.execute()
+        fields = await fields
+        if not fields:
+            return None
+        store = LazyStore()
+        store.load(dict.fromkeys((_text(field) for field in fields), NOT_LOADED))
+        if vals is not None:
+            store.load(await self._decode_fields(eager_fields, await vals))
+        return store
+
+    async def fetch_values(self, sid, fields, **kwargs):
+        """ Returns {field: value} for the fields of a session that exist """
+        vals = await self.client.hmget(self.prefix + sid, *fields)
+        return await self._decode_fields(fields, vals)
+
+    async def store(self, sid, expiry, val, **kwargs):
+        if val is None:
+            return
+        key = self.prefix + sid
+        tr = self.client.multi_exec()
+        if isinstance(val, LazyStore):
+            # Only write what changed since the session was fetched
+            updates = {field: val[field] for field in val.dirty}
+            if val.deleted:
+                tr.hdel(key, *val.deleted)
+        else:
+            tr.delete(key)
+            updates = val
+        if updates:
+            tr.hmset_dict(key, {field: await self._encode(v) for field, v in updates.items()})
+        tr.expire(key, expiry)
+        await tr.execute()
+        if isinstance(val, LazyStore):
+            val.dirty.clear()
+            val.deleted.clear()
+
+    async def delete(self, sid, **kwargs):
+        await self.client.delete(self.prefix + sid)
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        sids = list(sids)
+        for i in range(0, len(sids), batch_size):
+            await self.client.delete(*[self.prefix + sid for sid in sids[i:i + batch_size]])
+
+
+def _text(field):
+    return field.decode() if isinstance(field, bytes) else field
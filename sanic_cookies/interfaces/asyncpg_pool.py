@@ -0,0 +1,177 @@
+import re
+
+import ujson
+
+from .sid import uuid_sid_factory, sid_validator_of
+
+
+__all__ = ["AsyncPG"]
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+
+
+class AsyncPG:
+    """
+        Postgres storage built directly on an asyncpg pool (Postgres 9.5+)
+
+        Sessions are kept in a jsonb column, sent and received in jsonb's binary format.
+        Each query's text is built once, so asyncpg prepares it once per connection
+        and reuses it from its statement cache (Don't set the pool's statement_cache_size to 0).
+        Has the same interface as GinoAsyncPG, so it can replace it.
+
+            e.g.
+
+                interface = AsyncPG(table="sessions")
+                pool = await asyncpg.create_pool(dsn, init=interface.setup_connection)
+                interface.pool = pool
+                await interface.create_table()  # Once
+
+        pool (asyncpg.pool.Pool):
+
+            Its connections must be set up with setup_connection (See above).
+            Default: None (Set it before the first request)
+
+        table & schema:
+
+            Default: "sessions" and "public"
+
+        acquire_timeout:
+
+            Seconds to wait for a connection from the pool. Default: None (Wait forever)
+
+        encoder & decoder:
+
+            JSON encoder and decoder of the jsonb codec. Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+    """
+
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
+    def __init__(
+        self,
+        pool=None,
+        table="sessions",
+        schema="public",
+        acquire_timeout=None,
+        encoder=ujson.dumps,
+        decoder=ujson.loads,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+    ):
+        for identifier in (table, schema):
+            if not _IDENTIFIER_RE.match(identifier):
+                raise ValueError('Invalid identifier: "{}"'.format(identifier))
+        self.pool = pool
+        self.table = table
+        self.schema = schema
+        self.acquire_timeout = acquire_timeout
+        self.encoder = encoder
+        self.decoder = decoder
+        self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+
+        name = '"{}"."{}"'.format(schema, table)
+        self._create_table = [
+            'CREATE TABLE IF NOT EXISTS {} (sid text PRIMARY KEY, val jsonb NOT NULL, created_at timestamptz NOT NULL DEFAULT NOW(), expires_at timestamptz NOT NULL, user_id text)'.format(  # noqa
+                name
+            ),
+            'CREATE INDEX IF NOT EXISTS "{0}_expires_at" ON {1} (expires_at)'.format(table, name),
+            'CREATE INDEX IF NOT EXISTS "{0}_user_id" ON {1} (user_id)'.format(table, name),
+        ]
+        self._fetch = "SELECT val FROM {} WHERE sid = $1 AND expires_at > NOW()".format(name)
+        self._fetch_many = "SELECT sid, val FROM {} WHERE sid = ANY($1::text[]) AND expires_at > NOW()".format(name)
+        self._store = (
+            "INSERT INTO {} (sid, val, expires_at, user_id) VALUES ($1, $2, NOW() + make_interval(secs => $3), $4) "
+            "ON CONFLICT (sid) DO UPDATE SET val = EXCLUDED.val, expires_at = EXCLUDED.expires_at, user_id = EXCLUDED.user_id"
+        ).format(name)
+        self._delete = "DELETE FROM {} WHERE sid = $1".format(name)
+        self._delete_many = "DELETE FROM {} WHERE sid = ANY($1::text[])".format(name)
+        self._user_sids = "SELECT sid FROM {} WHERE user_id = $1 AND expires_at > NOW()".format(name)
+        self._scan = "SELECT sid, val FROM {} WHERE sid > $1 AND expires_at > NOW() ORDER BY sid LIMIT $2".format(name)
+        self._delete_expired = "DELETE FROM {} WHERE expires_at <= NOW()".format(name)
+
+    async def setup_connection(self, conn):
+        """ Registers the binary jsonb codec. Pass it as the pool's init """
+        await conn.set_type_codec(
+            "jsonb",
+            # Binary jsonb is a version byte followed by the JSON text
+            encoder=lambda val: b"\x01" + _to_bytes(self.encoder(val)),
+            decoder=lambda data: self.decoder(data[1:]),
+            schema="pg_catalog",
+            format="binary",
+        )
+
+    def _acquire(self):
+        return self.pool.acquire(timeout=self.acquire_timeout)
+
+    async def create_table(self):
+        async with self._acquire() as conn:
+            for statement in self._create_table:
+                await conn.execute(statement)
+
+    async def delete_expired(self):
+        async with self._acquire() as conn:
+            await conn.execute(self._delete_expired)
+
+    async def fetch(self, sid, **kwargs):
+        async with self._acquire() as conn:
+            return await conn.fetchval(self._fetch, sid)
+
+    async def fetch_many(self, sids, **kwargs):
+        async with self._acquire() as conn:
+            rows = await conn.fetch(self._fetch_many, sids)
+        vals = {row[0]: row[1] for row in rows}
+        return [vals.get(sid) for sid in sids]
+
+    async def store(self, sid, expiry, val, user_id=None, **kwargs):
+        if val is not None:
+            async with self._acquire() as conn:
+                await conn.execute(
+                    self._store, sid, val, float(expiry), None if user_id is None else str(user_id)
+                )
+
+    async def delete(self, sid, **kwargs):
+        async with self._acquire() as conn:
+            await conn.execute(self._delete, sid)
+
+    async def user_sids(self, user_id, **kwargs):
+        async with self._acquire() as conn:
+            rows = await conn.fetch(self._user_sids, str(user_id))
+        return [row[0] for row in rows]
+
+    async def forget_user(self, user_id, **kwargs):
+        # The index is a column of the sessions themselves
+        pass
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields lists of (sid, session), paginated by sid (keyset), so only one batch is held in memory at a time """
+        last_sid = ""
+        while True:
+            async with self._acquire() as conn:
+                rows = await conn.fetch(self._scan, last_sid, batch_size)
+            if not rows:
+                return
+            yield [(row[0], row[1]) for row in rows]
+            if len(rows) < batch_size:
+                return
+            last_sid = rows[-1][0]
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        sids = list(sids)
+        for i in range(0, len(sids), batch_size):
+            async with self._acquire() as conn:
+                await conn.execute(self._delete_many, sids[i:i + batch_size])
+
+
+def _to_bytes(val):
+    return val.encode() if isinstance(val, str) else val
@@ -0,0 +1,200 @@
+import zlib
+import base64
+import asyncio
+
+
+__all__ = ["Offload", "Compressor"]
+
+
+class Offload:
+    """
+    Runs the CPU bound work of large payloads in an executor instead of the event loop
+
+    Payloads smaller than ``threshold`` bytes are processed inline,
+    because handing them to an executor costs more than processing them.
+
+    Arguments:
+
+        threshold (int):
+
+            Payload size in bytes above which work is offloaded. Default: 16 KB
+
+        executor (concurrent.futures.Executor):
+
+            Default: None (The event loop's default ThreadPoolExecutor)
+
+            When using a ProcessPoolExecutor, your encoder and decoder must be picklable
+
+    .. note::
+
+        The encoded size of a session is only known after it's encoded,
+        so encoding itself is offloaded only when the interface can tell
+        the size of the previous payload (e.g. The request's cookie for InCookieEncrypted).
+        Otherwise the session is encoded inline and the rest of the work (e.g. encryption) is offloaded.
+    """
+
+    def __init__(self, threshold=16 * 1024, executor=None):
+        self.threshold = threshold
+        self.executor = executor
+
+    def should_offload(self, size):
+        return size is not None and size >= self.threshold
+
+    async def __call__(self, size, fn, *args):
+        if not self.should_offload(size):
+            return fn(*args)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+
+# Compressed values start with a tag that encoded sessions can't start with
+# (0xff is never the first byte of UTF-8 text, "~" is never the first character of JSON)
+_BINARY_TAG = b"\xffZ"
+_TEXT_TAG = "~z:"
+
+
+def _zlib(level):
+    return (
+        lambda data: zlib.compress(data, 6 if level is None else level),
+        zlib.decompress,
+    )
+
+
+def _lz4(level):
+    import lz4.frame
+
+    return (
+        lambda data: lz4.frame.compress(data, compression_level=level or 0),
+        lz4.frame.decompress,
+    )
+
+
+def _zstd(level):
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+    decompressor = zstandard.ZstdDecompressor()
+    return compressor.compress, decompressor.decompress
+
+
+# Algorithm -> (ID written in the tag, factory)
+_ALGORITHMS = {"zstd": ("s", _zstd), "lz4": ("l", _lz4), "zlib": ("z", _zlib)}
+
+
+def _best_algorithm():
+    for algorithm, (_, factory) in _ALGORITHMS.items():
+        try:
+            factory(None)
+        except ImportError:
+            continue
+        return algorithm
+
+
+class Compressor:
+    """
+    Compresses encoded sessions larger than ``threshold`` bytes
+
+    Compressed values are tagged, so values written before compression was enabled
+    (or below the threshold) are still read as they are.
+
+    Arguments:
+
+        threshold (int):
+
+            Encoded size in bytes above which sessions are compressed. Default: 1 KB
+
+        algorithm (str):
+
+            "zlib", "lz4" (requires lz4) or "zstd" (requires zstandard)
+            Default: None (zstd or lz4 when installed, zlib otherwise)
+
+        level (int):
+
+            Compression level. Default: None (The algorithm's default)
+
+        text (bool):
+
+            Base64 encode compressed values, for stores that only accept text
+            (e.g. GinoAsyncPG with a character varying val column). Default: False
+
+    .. note::
+
+        All the workers sharing a store need the algorithms it holds values of installed
+    """
+
+    def __init__(self, threshold=1024, algorithm=None, level=None, text=False):
+        algorithm = algorithm or _best_algorithm()
+        if algorithm not in _ALGORITHMS:
+            raise ValueError('Unknown compression algorithm: "{}"'.format(algorithm))
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level
+        self.text = text
+        self._algorithm_id = _ALGORITHMS[algorithm][0]
+        self._compress = _ALGORITHMS[algorithm][1](level)[0]
+        self._decompressors = {}
+
+    def __getstate__(self):
+        # Compression functions are rebuilt on unpickling (e.g. when sent to a ProcessPoolExecutor)
+        return {"threshold": self.threshold, "algorithm": self.algorithm, "level": self.level, "text": self.text}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _decompressor(self, algorithm_id):
+        decompress = self._decompressors.get(algorithm_id)
+        if decompress is None:
+            for candidate_id, factory in _ALGORITHMS.values():
+                if candidate_id == algorithm_id:
+                    decompress = self._decompressors[algorithm_id] = factory(None)[1]
+                    break
+            else:
+                raise ValueError('Unknown compression algorithm ID: "{}"'.format(algorithm_id))
+        return decompress
+
+    def compress(self, val):
+        data = val.encode() if isinstance(val, str) else val
+        if len(data) < self.threshold:
+            return val
+        compressed = self._compress(data)
+        if self.text:
+            return _TEXT_TAG + self._algorithm_id + base64.b64encode(compressed).decode()
+        return _BINARY_TAG + self._algorithm_id.encode() + compressed
+
+    def decompress(self, val):
+        if isinstance(val, str):
+            if not val.startswith(_TEXT_TAG):
+                return val
+            algorithm_id = val[len(_TEXT_TAG)]
+            return self._decompressor(algorithm_id)(base64.b64decode(val[len(_TEXT_TAG) + 1:])).decode()
+        if val[:len(_BINARY_TAG)] != _BINARY_TAG:
+            return val
+        algorithm_id = chr(val[len(_BINARY_TAG)])
+        return self._decompressor(algorithm_id)(bytes(val[len(_BINARY_TAG) + 1:]))
+
+
+def _decompress_and_decode(compressor, decoder, val):
+    return decoder(compressor.decompress(val))
+
+
+class CodecMixin:
+    """ Encoding and decoding of interfaces that have: encoder, decoder, offload and compressor attributes """
+
+    offload = None
+    compressor = None
+
+    async def _run(self, size, fn, *args):
+        if self.offload is None:
+            return fn(*args)
+        return await self.offload(size, fn, *args)
+
+    async def _encode(self, val):
+        val = self.encoder(val)
+        if self.compressor is not None:
+            val = await self._run(len(val), self.compressor.compress, val)
+        return val
+
+    async def _decode(self, val):
+        if self.compressor is not None:
+            return await self._run(len(val), _decompress_and_decode, self.compressor, self.decoder, val)
+        return await self._run(len(val), self.decoder, val)
@@ -1,42 +1,93 @@
 import datetime
 import ujson
-import uuid
 
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
 
-class GinoAsyncPG:  # pragma: no cover
+
+class GinoAsyncPG(CodecMixin):
     """
         encoder & decoder:
 
             e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
             Default ujson
 
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large payloads in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large sessions. Default: None
+            Use Compressor(text=True) with the character varying val column of the README
+
+        user_id_column:
+
+            Whether the sessions table has a user_id column. Required to index sessions by user
+            (See: AuthSession(track_user_sessions=True) and README). Default: False
+
         Requires postgres 9.5+ for UPSERT (ON CONFLICT DO UPDATE)
     """
 
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
     def __init__(
         self,
         client,
         prefix="session:",
         encoder=ujson.dumps,
         decoder=ujson.loads,
-        sid_factory=lambda: uuid.uuid4().hex,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+        user_id_column=False,
     ):
         self.client = client
+        self.user_id_column = user_id_column
         self.prefix = prefix
         self.encoder = encoder
         self.decoder = decoder
         self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
 
     async def fetch(self, sid, **kwargs):
         val = await self.client.scalar(
             "SELECT val FROM sessions WHERE sid = $1 AND expires_at > NOW()", sid
         )
         if val is not None:
-            return self.decoder(val)
+            return await self._decode(val)
 
-    async def store(self, sid, expiry, val, **kwargs):
+    async def fetch_many(self, sids, **kwargs):
+        rows = await self.client.all(
+            "SELECT sid, val FROM sessions WHERE sid = ANY($1) AND expires_at > NOW()", sids
+        )
+        vals = {sid: val for sid, val in rows}
+        return [None if vals.get(sid) is None else await self._decode(vals[sid]) for sid in sids]
+
+    async def store(self, sid, expiry, val, user_id=None, **kwargs):
         if val is not None:
-            val = self.encoder(val)
+            val = await self._encode(val)
+            if self.user_id_column:
+                # Always set, so that a session whose user was removed leaves the index
+                await self.client.scalar(
+                    "INSERT INTO sessions(created_at, sid, val, expires_at, user_id) VALUES(NOW(), $1, $2, $3, $4) ON CONFLICT (sid) DO UPDATE SET val = EXCLUDED.val, expires_at = EXCLUDED.expires_at, user_id = EXCLUDED.user_id",  # noqa
+                    sid,
+                    val,
+                    datetime.datetime.utcnow() + datetime.timedelta(seconds=expiry),
+                    None if user_id is None else str(user_id),
+                )
+                return
+            if user_id is not None:
+                self._check_user_id_column()
             await self.client.scalar(
                 "INSERT INTO sessions(created_at, sid, val, expires_at) VALUES(NOW(), $1, $2, $3) ON CONFLICT (sid) DO UPDATE SET val = EXCLUDED.val, expires_at = EXCLUDED.expires_at",  # noqa
                 sid,
@@ -46,3 +97,44 @@ class GinoAsyncPG:  # pragma: no cover
 
     async def delete(self, sid, **kwargs):
         await self.client.scalar("DELETE FROM sessions WHERE sid = $1", sid)
+
+    def _check_user_id_column(self):
+        if not self.user_id_column:
+            raise ValueError("Indexing sessions by user requires a user_id column, see: GinoAsyncPG(user_id_column=True)")
+
+    async def user_sids(self, user_id, **kwargs):
+        self._check_user_id_column()
+        rows = await self.client.all(
+            "SELECT sid FROM sessions WHERE user_id = $1 AND expires_at > NOW()", str(user_id)
+        )
+        return [row[0] for row in rows]
+
+    async def forget_user(self, user_id, **kwargs):
+        # The index is a column of the sessions themselves
+        pass
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields lists of (sid, session), paginated by sid (keyset), so only one batch is held in memory at a time """
+        last_sid = ""
+        while True:
+            rows = await self.client.all(
+                "SELECT sid, val FROM sessions WHERE sid > $1 AND expires_at > NOW() ORDER BY sid LIMIT $2",
+                last_sid,
+                batch_size,
+            )
+            if not rows:
+                return
+            yield [(sid, await self._decode(val)) for sid, val in rows]
+            if len(rows) < batch_size:
+                return
+            last_sid = rows[-1][0]
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        sids = list(sids)
+        for i in range(0, len(sids), batch_size):
+            await self.client.status("DELETE FROM sessions WHERE sid = ANY($1)", sids[i:i + batch_size])
@@ -1,67 +1,163 @@
+import re
+
 import ujson
 from cryptography.fernet import Fernet, InvalidToken
 
+from .codec import CodecMixin
+
 
 __all__ = ('InCookieEncrypted')
 
+_KEY_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,16}$")
+
+
+# Module level functions (instead of methods) can be pickled and sent to a ProcessPoolExecutor
+
+
+def _ensure_encoded(val):
+    # Encodes encoded value (typically bytes, sometime str)
+    # e.g. '{}' -> b'{}' NOT {} -> b'{}'
+    if not isinstance(val, (bytes, bytearray)):
+        try:
+            val = val.encode()
+        except AttributeError:
+            val = b"{}"
+    return val
+
+
+def _encrypt_encoded(fernet, encoded):
+    return fernet.encrypt(encoded).decode()
+
+
+def _encrypt(fernet, encoder, val):
+    if val is not None:
+        new_sid = encoder(val)
+    else:
+        new_sid = encoder({})
+    return _encrypt_encoded(fernet, _ensure_encoded(new_sid))
+
+
+def _decrypt(fernet, decoder, val, ttl):
+    val = _ensure_encoded(val)
+    try:
+        val = fernet.decrypt(val, ttl=ttl)
+    except InvalidToken:
+        return {}
+    else:
+        if val is not None:
+            return decoder(val)
+
 
-class InCookieEncrypted:
+class InCookieEncrypted(CodecMixin):
     """
         Encrypted in-cookie storage
 
         key e.g. cryptography.fernet.Fernet.generate_key()
 
+            or a keyring: a dict of key IDs to keys e.g. {"2020-06": new_key, "2020-01": old_key}
+
+            With a keyring, every cookie is prefixed with the ID of the key that encrypted it,
+            so decrypting picks the right key right away instead of trying every key.
+            Cookies encrypted by an older key are re-encrypted with the active key on their next write.
+            To retire a key, remove it from the keyring (its cookies will be treated as invalid)
+
+        active_key_id:
+
+            ID of the keyring's key that encrypts new cookies. Default: The keyring's first key
+
+        legacy_key_id:
+
+            ID of the keyring's key that decrypts cookies without a key ID
+            (i.e. cookies issued before you switched to a keyring). Default: active_key_id
+
         Always use this interface alone without any additional interfaces.
 
         If in doubt, instantiate a new Session object and set this as the master interface and none else
+
+        offload (Offload):
+
+            Encrypts and decrypts large cookies in an executor. Default: None
     """
 
     def __init__(
-        self, key, encoder=ujson.dumps, decoder=ujson.loads
+        self,
+        key,
+        encoder=ujson.dumps,
+        decoder=ujson.loads,
+        offload=None,
+        active_key_id=None,
+        legacy_key_id=None,
     ):  # pragma: no cover
-        self.fernet = Fernet(key)
+        if isinstance(key, dict):
+            if not key:
+                raise ValueError("keyring must have at least one key")
+            for key_id in key:
+                if not _KEY_ID_RE.match(key_id):
+                    raise ValueError('Invalid key ID: "{}". Use up to 16 letters, digits, "-" or "_"'.format(key_id))
+            self.fernets = {key_id: Fernet(k) for key_id, k in key.items()}
+            self.active_key_id = active_key_id or next(iter(key))
+            self._prefix = self.active_key_id + "."
+            self._legacy_fernet = self.fernets.get(legacy_key_id or self.active_key_id)
+            self.fernet = self.fernets[self.active_key_id]
+        else:
+            self.fernet = Fernet(key)
+            self.fernets = None
+            self.active_key_id = None
+            self._prefix = ""
         self.encoder = encoder
         self.decoder = decoder
+        self.offload = offload
 
     def _ensure_encoded(self, val):
-        # Encodes encoded value (typically bytes, sometime str)
-        # e.g. '{}' -> b'{}' NOT {} -> b'{}'
-        if not isinstance(val, (bytes, bytearray)):
-            try:
-                val = val.encode()
-            except AttributeError:
-                val = b"{}"
-        return val
+        return _ensure_encoded(val)
+
+    def _fernet_of(self, token):
+        """ Returns the Fernet that decrypts a token and the token without its key ID """
+        if self.fernets is None:
+            return self.fernet, token
+        key_id, sep, fernet_token = token.partition(".")
+        if not sep:
+            return self._legacy_fernet, token
+        return self.fernets.get(key_id), fernet_token
 
     def _encrypt(self, val):
-        if val is not None:
-            new_sid = self.encoder(val)
-        else:
-            new_sid = self.encoder({})
-        new_sid = self._ensure_encoded(new_sid)
-        return self.fernet.encrypt(new_sid).decode()
+        return self._prefix + _encrypt(self.fernet, self.encoder, val)
 
     def _decrypt(self, val, ttl):
-        val = self._ensure_encoded(val)
-        try:
-            val = self.fernet.decrypt(val, ttl=ttl)
-        except InvalidToken:
+        fernet, val = self._fernet_of(val)
+        if fernet is None:
             return {}
+        return _decrypt(fernet, self.decoder, val, ttl)
+
+    async def _encrypt_offloaded(self, val, size_hint=None):
+        if self.offload is None or self.offload.should_offload(size_hint):
+            token = await self._run(size_hint, _encrypt, self.fernet, self.encoder, val)
         else:
-            if val is not None:
-                return self.decoder(val)
+            # Unknown or small previous payload. Encode inline, then decide by the encoded size
+            encoded = _ensure_encoded(self.encoder(val if val is not None else {}))
+            token = await self._run(
+                len(encoded), _encrypt_encoded, self.fernet, encoded
+            )
+        return self._prefix + token
 
     def sid_factory(self):
         return self._encrypt({})
 
     async def fetch(self, sid, expiry, request, cookie_name):
         if sid is not None:
-            return self._decrypt(sid, expiry)
+            fernet, token = self._fernet_of(sid)
+            if fernet is None:
+                return {}
+            return await self._run(
+                len(token), _decrypt, fernet, self.decoder, token, expiry
+            )
         else:
             return {}
 
     async def store(self, sid, expiry, val, request, cookie_name, session_name):
-        request[session_name].sid = self._encrypt(val)
+        # The size of the cookie the client sent is a good estimate of the size of the new one
+        size_hint = len(request.cookies.get(cookie_name) or "")
+        request[session_name].sid = await self._encrypt_offloaded(val, size_hint)
         # Shouldn't set is_sid_modified, else it will infinitely loop
         if request[session_name]._prev_sid:
             request[session_name]._prev_sid.pop()
@@ -1,9 +1,13 @@
+import os
 import time
+import struct
 import asyncio
-import uuid
 
 import ujson
 
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
+
 
 class ExpiringDict(dict):
     def __init__(self):
@@ -14,8 +18,12 @@ class ExpiringDict(dict):
         self[key] = val
         self.expiry_times[key] = time.time() + expiry
 
+    def set_until(self, key, expires_at, val):
+        self[key] = val
+        self.expiry_times[key] = expires_at
+
     def get(self, key):
-        val = dict(self).get(key)
+        val = dict.get(self, key)
         if val is None:
             return None
         if time.time() > self.expiry_times[key]:
@@ -32,14 +40,96 @@ class ExpiringDict(dict):
             return
 
 
-class InMemory:
+_SNAPSHOT_MAGIC = b"SCIM\x01"
+# expires_at, key_len, val_len, is_bytes
+_RECORD = struct.Struct("<dIIB")
+
+
+def _write_snapshot(path, store, expiry_times):
+    now = time.time()
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb", buffering=1024 * 1024) as f:
+        f.write(_SNAPSHOT_MAGIC)
+        for key, val in store.items():
+            expires_at = expiry_times.get(key)
+            if expires_at is None or expires_at <= now:
+                continue
+            is_bytes = isinstance(val, (bytes, bytearray))
+            key = key.encode()
+            if not is_bytes:
+                val = val.encode()
+            f.write(_RECORD.pack(expires_at, len(key), len(val), is_bytes))
+            f.write(key)
+            f.write(val)
+    # Atomic, so that a crash mid-snapshot doesn't corrupt the previous one
+    os.replace(tmp_path, path)
+
+
+class _SnapshotReader:
+    def __init__(self, path):
+        self.f = open(path, "rb", buffering=1024 * 1024)
+        if self.f.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+            self.f.close()
+            raise ValueError("{} is not a sanic_cookies InMemory snapshot".format(path))
+
+    def read_batch(self, size):
+        """ Returns up to ``size`` unexpired (key, expires_at, val) records """
+        batch = []
+        now = time.time()
+        read = self.f.read
+        for _ in range(size):
+            header = read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            expires_at, key_len, val_len, is_bytes = _RECORD.unpack(header)
+            key, val = read(key_len), read(val_len)
+            if expires_at <= now:
+                continue
+            batch.append((key.decode(), expires_at, val if is_bytes else val.decode()))
+        else:
+            return batch, True
+        return batch, False
+
+    def close(self):
+        self.f.close()
+
+
+class InMemory(CodecMixin):
     """
         encoder & decoder:
 
             e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
             Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large payloads in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large sessions. Default: None
+
+        snapshot_path:
+
+            File the sessions are saved to by snapshot() and loaded from by restore()
+            (and by init(), in the background) so that restarts don't log everyone out. Default: None
+
+        snapshot_interval:
+
+            Seconds between background snapshots started by init(). Default: None (No periodic snapshots)
+
+        The user -> SIDs index (See: AuthSession(track_user_sessions=True)) is a dict of dicts
+        that isn't part of snapshots
     """
 
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
     def __init__(
         self,
         store=ExpiringDict,
@@ -47,15 +137,29 @@ class InMemory:
         cleanup_interval=60 * 60 * 1,
         encoder=ujson.dumps,
         decoder=ujson.loads,
-        sid_factory=lambda: uuid.uuid4().hex,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+        snapshot_path=None,
+        snapshot_interval=None,
     ):
         self.prefix = prefix
         self._store = store()
         self.cleanup_interval = cleanup_interval
         self.cleaner = None
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshotter = None
+        self.restorer = None
+        self._deleted_while_restoring = None
+        self._user_sessions = {}
         self.encoder = encoder
         self.decoder = decoder
         self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
 
     def init(self):
         # Call after the event loop starts
@@ -68,23 +172,151 @@ class InMemory:
                     if time.time() > self._store.expiry_times[k]:
                         del self._store[k]
                         del self._store.expiry_times[k]
+                for user_id in list(self._user_sessions):
+                    self._live_user_sessions(user_id)
 
         loop = asyncio.get_event_loop()
         self.cleaner = loop.create_task(clean_up_expired_keys())
 
+        if self.snapshot_path is not None:
+            # Deleted sessions must not be restored, even if they're deleted before restoring starts
+            self._deleted_while_restoring = set()
+            self.restorer = loop.create_task(self.restore())
+
+            if self.snapshot_interval:
+
+                async def take_snapshots():
+                    await self.restorer
+                    while True:
+                        await asyncio.sleep(self.snapshot_interval)
+                        await self.snapshot()
+
+                self.snapshotter = loop.create_task(take_snapshots())
+
     def kill(self):
-        if self.cleaner is not None:
-            self.cleaner.cancel()
+        for task in (self.cleaner, self.restorer, self.snapshotter):
+            if task is not None:
+                task.cancel()
+        self._deleted_while_restoring = None
+
+    async def snapshot(self, path=None):
+        """
+        Saves the unexpired sessions to ``path`` (Default: snapshot_path)
+
+        Only copying the store happens on the event loop, writing the file happens in a thread.
+        Waits for the restore started by init() to finish first. If it was cancelled (e.g. by kill()),
+        the sessions aren't all restored, so the previous snapshot is kept instead
+
+        Returns whether the snapshot was written
+        """
+        if self.restorer is not None:
+            if not self.restorer.done():
+                await asyncio.wait([self.restorer])
+            if self.restorer.cancelled():
+                return False
+        path = path or self.snapshot_path
+        store, expiry_times = dict(self._store), dict(self._store.expiry_times)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, _write_snapshot, path, store, expiry_times)
+        return True
+
+    async def restore(self, path=None, batch_size=10000):
+        """
+        Loads the unexpired sessions of a snapshot from ``path`` (Default: snapshot_path)
+
+        The file is read and parsed in a thread, one batch at a time, so requests are served while restoring.
+        Sessions written since the server started aren't overwritten.
+
+        Returns the number of restored sessions
+        """
+        path = path or self.snapshot_path
+        if self._deleted_while_restoring is None:
+            self._deleted_while_restoring = set()
+        deleted = self._deleted_while_restoring
+        restored = 0
+        loop = asyncio.get_event_loop()
+        reader = None
+        try:
+            if not os.path.exists(path):
+                return 0
+            reader = await loop.run_in_executor(None, _SnapshotReader, path)
+            more = True
+            while more:
+                batch, more = await loop.run_in_executor(None, reader.read_batch, batch_size)
+                for key, expires_at, val in batch:
+                    if key not in self._store and key not in deleted:
+                        self._store.set_until(key, expires_at, val)
+                        restored += 1
+        finally:
+            self._deleted_while_restoring = None
+            if reader is not None:
+                reader.close()
+        return restored
 
     async def fetch(self, sid, **kwargs):
         val = self._store.get(self.prefix + sid)
         if val is not None:
-            return self.decoder(val)
+            return await self._decode(val)
 
-    async def store(self, sid, expiry, val, **kwargs):
+    async def fetch_many(self, sids, **kwargs):
+        return [await self.fetch(sid) for sid in sids]
+
+    async def store(self, sid, expiry, val, user_id=None, **kwargs):
         if val is not None:
-            val = self.encoder(val)
+            val = await self._encode(val)
             self._store.set(self.prefix + sid, expiry, val)
+            if user_id is not None:
+                self._user_sessions.setdefault(str(user_id), {})[sid] = time.time() + expiry
 
     async def delete(self, sid, **kwargs):
         self._store.delete(self.prefix + sid)
+        if self._deleted_while_restoring is not None:
+            self._deleted_while_restoring.add(self.prefix + sid)
+
+    def _live_user_sessions(self, user_id):
+        # Prunes the user's expired and deleted sessions
+        sessions = self._user_sessions.get(user_id)
+        if sessions is None:
+            return []
+        now = time.time()
+        for sid, expires_at in list(sessions.items()):
+            if expires_at < now or self._store.get(self.prefix + sid) is None:
+                del sessions[sid]
+        if not sessions:
+            del self._user_sessions[user_id]
+        return list(sessions)
+
+    async def user_sids(self, user_id, **kwargs):
+        return self._live_user_sessions(str(user_id))
+
+    async def forget_user(self, user_id, **kwargs):
+        self._user_sessions.pop(str(user_id), None)
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """
+        Yields lists of (sid, session) from a snapshot of the store's keys
+
+        Sessions deleted while scanning are skipped, sessions added while scanning aren't yielded
+        """
+        keys = [key for key in self._store if key.startswith(self.prefix)]
+        for i in range(0, len(keys), batch_size):
+            batch = []
+            for key in keys[i:i + batch_size]:
+                val = self._store.get(key)
+                if val is not None:
+                    batch.append((key[len(self.prefix):], await self._decode(val)))
+            if batch:
+                yield batch
+            # Let requests through between batches
+            await asyncio.sleep(0)
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        for i, sid in enumerate(sids, 1):
+            await self.delete(sid)
+            if i % batch_size == 0:
+                await asyncio.sleep(0)
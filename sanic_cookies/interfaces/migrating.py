@@ -0,0 +1,298 @@
+import os
+import time
+import asyncio
+
+import ujson
+
+
+__all__ = ["Migrating"]
+
+
+def _either(old_validator, new_validator):
+    # SIDs minted by either interface stay valid during the migration
+    if old_validator is None or new_validator is None:
+        return None
+
+    def sid_validator(sid):
+        return new_validator(sid) or old_validator(sid)
+
+    return sid_validator
+
+
+class Migrating:
+    """
+        Moves sessions from one interface to another without logging anyone out
+
+        Reads from the new interface and falls back to the old one, writes to the new one
+        and deletes from both. Sessions that are never written again are moved by copy().
+        Once copy() completes, replace the Migrating interface with the new one.
+
+            interface = Migrating(old=InMemory(), new=Aioredis(client))
+            Session(app, master_interface=interface)
+
+            @app.listener('after_server_start')
+            async def migrate(app, loop):
+                loop.create_task(interface.copy(expiry=app.exts.session.expiry, rate=1000, checkpoint='migration.json'))
+
+        New SIDs are made by the new interface's sid_factory,
+        SIDs are valid if either interface's sid_validator accepts them.
+
+        old & new:
+
+            Static interfaces (i.e. not InCookieEncrypted)
+    """
+
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.sid_factory = new.sid_factory
+        self.sid_validator = _either(
+            getattr(old, "sid_validator", None), getattr(new, "sid_validator", None)
+        )
+        self.fallbacks = 0
+        # While copy() runs (None otherwise): the SIDs it scanned but hasn't written yet -> whether they were
+        # written or deleted since. Only a few batches are tracked at a time. And copy()'s writes in flight
+        self._scanned = None
+        self._copying = {}
+
+    async def fetch(self, sid, **kwargs):
+        val = await self.new.fetch(sid, **kwargs)
+        if val is None:
+            val = await self.old.fetch(sid, **kwargs)
+            if val is not None:
+                self.fallbacks += 1
+        return val
+
+    async def fetch_many(self, sids, **kwargs):
+        vals = await self._fetch_many(self.new, sids, **kwargs)
+        missing = [i for i, val in enumerate(vals) if val is None]
+        if missing:
+            old_vals = await self._fetch_many(self.old, [sids[i] for i in missing], **kwargs)
+            for i, val in zip(missing, old_vals):
+                if val is not None:
+                    vals[i] = val
+                    self.fallbacks += 1
+        return vals
+
+    @staticmethod
+    async def _fetch_many(interface, sids, **kwargs):
+        if hasattr(interface, "fetch_many"):
+            return list(await interface.fetch_many(sids, **kwargs))
+        return [await interface.fetch(sid, **kwargs) for sid in sids]
+
+    async def store(self, sid, expiry, val, **kwargs):
+        await self._touch([sid])
+        await self.new.store(sid, expiry, val, **kwargs)
+
+    async def delete(self, sid, **kwargs):
+        await self._touch([sid])
+        # From both, so that a deleted session can't be read back from the old interface
+        await self.new.delete(sid, **kwargs)
+        await self.old.delete(sid, **kwargs)
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        sids = list(sids)
+        await self._touch(sids)
+        for interface in (self.new, self.old):
+            await interface.delete_many(sids, batch_size=batch_size, **kwargs)
+
+    async def user_sids(self, user_id, **kwargs):
+        sids = await self.new.user_sids(user_id, **kwargs)
+        if hasattr(self.old, "user_sids"):
+            sids = list(dict.fromkeys([*sids, *await self.old.user_sids(user_id, **kwargs)]))
+        return sids
+
+    async def forget_user(self, user_id, **kwargs):
+        await self.new.forget_user(user_id, **kwargs)
+        if hasattr(self.old, "forget_user"):
+            await self.old.forget_user(user_id, **kwargs)
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields the batches of the new interface, then the sessions of the old one that aren't in the new one """
+        async for batch in self.new.scan_batches(batch_size=batch_size, **kwargs):
+            yield batch
+        async for batch in self.old.scan_batches(batch_size=batch_size, **kwargs):
+            batch = await self._missing_from_new(batch)
+            if batch:
+                yield batch
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def _missing_from_new(self, batch):
+        vals = await self._fetch_many(self.new, [sid for sid, _ in batch])
+        return [item for item, val in zip(batch, vals) if val is None]
+
+    #### ------------- Bulk copy ------------- ####
+
+    async def _touch(self, sids):
+        """ Keeps copy() from writing these sessions, and waits for its writes of them that already started """
+        if self._scanned is None:
+            return
+        for sid in sids:
+            if sid in self._scanned:
+                self._scanned[sid] = True
+        copying = [self._copying[sid] for sid in sids if sid in self._copying]
+        if copying:
+            await asyncio.wait(copying)
+
+    def _forget_scanned(self, batch):
+        for sid, _ in batch:
+            self._scanned.pop(sid, None)
+
+    async def _copy_batch(self, batch, expiry, user_id_of=None):
+        """ Writes the sessions of the batch that are missing from the new interface, returns how many were written """
+        missing = [sid for sid, _ in await self._missing_from_new(batch)]
+        # Read again, the batch may have been scanned a while ago (sessions deleted since aren't brought back)
+        vals = await self._fetch_many(self.old, missing)
+        writes = {
+            sid: asyncio.ensure_future(
+                self.new.store(sid, expiry, val, **({} if user_id_of is None else {"user_id": user_id_of(val)}))
+            )
+            for sid, val in zip(missing, vals)
+            if val is not None and not self._scanned.get(sid)
+        }
+        self._copying.update(writes)
+        try:
+            await asyncio.gather(*writes.values())
+        finally:
+            for sid in writes:
+                del self._copying[sid]
+        return len(writes)
+
+    @staticmethod
+    def _read_checkpoint(path):
+        try:
+            with open(path) as f:
+                return ujson.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write_checkpoint(path, progress):
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            ujson.dump(progress, f)
+        # Atomic, so that a crash mid-write doesn't lose the previous checkpoint
+        os.replace(tmp_path, path)
+
+    async def copy(self, expiry, batch_size=500, rate=None, checkpoint=None, resume=True, progress=None, user_id_of=None):
+        """
+        Copies the sessions of the old interface that are missing from the new one
+
+        Each batch is checked against the new interface in one call (fetch_many) and its missing sessions
+        are read again from the old interface and written concurrently, while the next batch is scanned.
+        Sessions already in the new interface are skipped, so copy() can be run again safely.
+
+        Sessions written or deleted through this interface while copy() runs are never overwritten or written back.
+        Those written or deleted by other processes in between the new interface's check and the copy's write
+        (a single round trip) may be.
+
+        Arguments:
+
+            expiry (int):
+
+                Expiry of the copied sessions (Their remaining time to live isn't known), e.g. session.expiry
+
+            batch_size (int):
+
+                Default: 500
+
+            rate (float):
+
+                Maximum number of sessions scanned per second. Default: None (unlimited)
+
+            checkpoint (str):
+
+                File the progress is saved to after every batch. Default: None
+
+            resume (bool):
+
+                Skip the batches a previous run saved to the checkpoint as done
+                (or everything if it completed). Default: True
+                Resuming assumes the old interface scans in the same order as before. Sessions that
+                moved in that order may be skipped (they're still read through the fallback), so run a
+                final copy(resume=False) before removing the old interface.
+
+            progress (callable):
+
+                Called with the progress dict after every batch. Default: None
+
+            user_id_of (callable):
+
+                Returns the user ID of a session (or None), to index the copied sessions by user in the new interface
+                (See: AuthSession(track_user_sessions=True)), e.g. lambda val: (val.get('current_user') or {}).get('id')
+                Default: None (Copied sessions aren't indexed, so logout_all and list_sessions won't find them
+                once the old interface is removed)
+
+        Returns the progress dict: batches, scanned, copied, skipped (already in the new interface, written or deleted) and elapsed (seconds)
+        """
+        state = {"batches": 0, "scanned": 0, "copied": 0, "skipped": 0, "elapsed": 0.0, "done": False}
+        if checkpoint is not None and resume:
+            state.update(self._read_checkpoint(checkpoint) or {})
+            if state["done"]:
+                return state
+        resume_after = state["batches"]
+        started_at = time.monotonic() - state["elapsed"]
+
+        batches = asyncio.Queue(maxsize=1)
+
+        async def scan():
+            # Returns the error that stopped the scan, if any
+            error = None
+            try:
+                async for batch in self.old.scan_batches(batch_size=batch_size):
+                    self._scanned.update((sid, False) for sid, _ in batch)
+                    await batches.put(batch)
+            except Exception as e:
+                error = e
+            await batches.put(None)
+            return error
+
+        self._scanned = {}
+        scanner = asyncio.ensure_future(scan())
+        try:
+            skipped_batches = 0
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                if skipped_batches < resume_after:
+                    skipped_batches += 1
+                    self._forget_scanned(batch)
+                    continue
+                batch_started_at = time.monotonic()
+
+                try:
+                    copied = await self._copy_batch(batch, expiry, user_id_of)
+                finally:
+                    self._forget_scanned(batch)
+
+                state["batches"] += 1
+                state["scanned"] += len(batch)
+                state["copied"] += copied
+                state["skipped"] += len(batch) - copied
+                state["elapsed"] = time.monotonic() - started_at
+                if checkpoint is not None:
+                    self._write_checkpoint(checkpoint, state)
+                if progress is not None:
+                    progress(dict(state))
+                if rate is not None:
+                    await asyncio.sleep(max(0, len(batch) / rate - (time.monotonic() - batch_started_at)))
+            error = await scanner
+            if error is not None:
+                raise error
+        finally:
+            scanner.cancel()
+            self._scanned = None
+
+        state["done"] = True
+        state["elapsed"] = time.monotonic() - started_at
+        if checkpoint is not None:
+            self._write_checkpoint(checkpoint, state)
+        return state
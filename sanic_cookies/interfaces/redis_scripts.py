@@ -0,0 +1,96 @@
+import hashlib
+
+
+__all__ = ["Script", "VersionConflict"]
+
+
+class VersionConflict(Exception):
+    """ Raised when a session was written by another request since it was fetched (See: Aioredis(check_version=True)) """
+
+    def __init__(self, sid):
+        super().__init__('Session "{}" was modified concurrently'.format(sid))
+        self.sid = sid
+
+
+class Script:
+    """
+    A Lua script run with EVALSHA
+
+    Falls back to EVAL (which also caches the script) when the server doesn't have it,
+    e.g. on first use or after a restart or SCRIPT FLUSH
+
+    Arguments:
+
+        source (str)
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def load(self, client):
+        await client.script_load(self.source)
+
+    async def __call__(self, client, keys=(), args=()):
+        try:
+            return await client.evalsha(self.sha, keys=list(keys), args=list(args))
+        except Exception as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+        return await client.eval(self.source, keys=list(keys), args=list(args))
+
+
+# Stores a session and indexes it in its user's sorted set (scored by expiry time).
+# The set expires along with the user's longest lived session
+# KEYS: session, user index
+# ARGV: expiry, val, expires_at, sid, now
+STORE_USER_SESSION = Script(
+    """
+redis.call('SETEX', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[5])
+local last = redis.call('ZRANGE', KEYS[2], -1, -1, 'WITHSCORES')
+redis.call('EXPIREAT', KEYS[2], math.ceil(tonumber(last[2])))
+"""
+)
+
+# Returns a session with its version and refreshes their expiry (sliding expiry)
+# with the expiry the session was stored with (ARGV's if it wasn't stored by STORE_IF_VERSION)
+# KEYS: session, version (a hash of the session's version and expiry)
+# ARGV: expiry
+FETCH_AND_TOUCH = Script(
+    """
+local val = redis.call('GET', KEYS[1])
+if not val then
+    return {false, false}
+end
+local expiry = redis.call('HGET', KEYS[2], 'expiry') or ARGV[1]
+redis.call('EXPIRE', KEYS[1], expiry)
+redis.call('EXPIRE', KEYS[2], expiry)
+return {val, redis.call('HGET', KEYS[2], 'version')}
+"""
+)
+
+# Stores a session unless its version isn't the expected one (A missing session's version is 0),
+# optionally indexing it in its user's sorted set (See: STORE_USER_SESSION)
+# Returns the new version, or false if the versions don't match
+# KEYS: session, version (See: FETCH_AND_TOUCH)[, user index]
+# ARGV: expiry, val, expected version ('' doesn't check), sid, now
+STORE_IF_VERSION = Script(
+    """
+if ARGV[3] ~= '' and (redis.call('HGET', KEYS[2], 'version') or '0') ~= ARGV[3] then
+    return false
+end
+local version = redis.call('HINCRBY', KEYS[2], 'version', 1)
+redis.call('HSET', KEYS[2], 'expiry', ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('SETEX', KEYS[1], ARGV[1], ARGV[2])
+if KEYS[3] then
+    redis.call('ZADD', KEYS[3], tonumber(ARGV[5]) + tonumber(ARGV[1]), ARGV[4])
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[5])
+    local last = redis.call('ZRANGE', KEYS[3], -1, -1, 'WITHSCORES')
+    redis.call('EXPIREAT', KEYS[3], math.ceil(tonumber(last[2])))
+end
+return version
+"""
+)
@@ -0,0 +1,357 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import asyncio
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+import ujson
+
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
+
+
+__all__ = ["SharedMemory"]
+
+_MAGIC = b"SCSM"
+_VERSION = 1
+# magic, version, capacity, slot_size, max_key_size
+_HEADER = struct.Struct("<4sHIII")
+_HEADER_SIZE = 64
+# state, expires_at, key_hash, key_len, val_len
+_SLOT_HEADER = struct.Struct("<BdQHI")
+
+_EMPTY = 0
+_USED = 1
+_DELETED = 2
+
+
+def _default_path():
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "sanic_cookies_sessions")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class SharedMemory(CodecMixin):
+    """
+        A memory mapped hash table shared by all the worker processes of a host
+
+        Sessions are stored in a fixed number of fixed size slots (open addressing with linear probing),
+        so a session's encoded value must fit in a slot. Writers take an exclusive flock on the file,
+        readers take a shared one. (POSIX only)
+
+        path:
+
+            File to memory map. All the workers of an app must use the same path.
+            Default: /dev/shm/sanic_cookies_sessions (or a file in the temp dir if there's no /dev/shm)
+
+        capacity:
+
+            Number of slots. Default: 65536
+
+        slot_size:
+
+            Size of a slot in bytes (header + key + value). Default: 2048
+
+        max_key_size:
+
+            Default: 64
+
+        max_probes:
+
+            Maximum number of slots visited per lookup. When all of them are taken by
+            live sessions, the one closest to expiring is evicted. Default: 32
+
+        encoder & decoder:
+
+            e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
+            Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large payloads in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large sessions. Default: None
+    """
+
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
+    def __init__(
+        self,
+        path=None,
+        capacity=65536,
+        slot_size=2048,
+        max_key_size=64,
+        max_probes=32,
+        prefix="session:",
+        cleanup_interval=60 * 60 * 1,
+        encoder=ujson.dumps,
+        decoder=ujson.loads,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+    ):
+        if slot_size <= _SLOT_HEADER.size + max_key_size:
+            raise ValueError("slot_size must be larger than max_key_size + {}".format(_SLOT_HEADER.size))
+        self.path = path or _default_path()
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.max_key_size = max_key_size
+        self.max_val_size = slot_size - _SLOT_HEADER.size - max_key_size
+        self.max_probes = min(max_probes, capacity)
+        self.prefix = prefix
+        self.cleanup_interval = cleanup_interval
+        self.cleaner = None
+        self.encoder = encoder
+        self.decoder = decoder
+        self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
+        self.evictions = 0
+        self._fd = None
+        self._mmap = None
+        self._pid = None
+
+    #### ------------- Memory mapping ------------- ####
+
+    @property
+    def _size(self):
+        return _HEADER_SIZE + self.capacity * self.slot_size
+
+    def _open(self):
+        # Lazily (re)opened, so that an instance created before the workers are forked
+        # doesn't share its file descriptor (and its locks) with the other workers
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, self._size)
+                os.pwrite(
+                    fd,
+                    _HEADER.pack(_MAGIC, _VERSION, self.capacity, self.slot_size, self.max_key_size),
+                    0,
+                )
+            header = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+            if header != (_MAGIC, _VERSION, self.capacity, self.slot_size, self.max_key_size):
+                raise ValueError(
+                    "{} has an incompatible layout. Remove it or use a different path".format(self.path)
+                )
+        except Exception:
+            os.close(fd)
+            raise
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError:
+                pass
+        self._fd = fd
+        self._mmap = mmap.mmap(fd, self._size)
+        self._pid = os.getpid()
+
+    def close(self):
+        if self._mmap is not None and self._pid == os.getpid():
+            self._mmap.close()
+            os.close(self._fd)
+        self._fd = self._mmap = self._pid = None
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield self._mmap
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    #### ------------- Hash table ------------- ####
+
+    def _offset(self, index):
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _probe(self, key_hash):
+        start = key_hash % self.capacity
+        for i in range(self.max_probes):
+            yield (start + i) % self.capacity
+
+    @staticmethod
+    def _holds_key(buf, offset, slot_hash, key_len, key, key_hash):
+        if slot_hash != key_hash or key_len != len(key):
+            return False
+        start = offset + _SLOT_HEADER.size
+        return buf[start:start + key_len] == key
+
+    def _find(self, buf, key, key_hash):
+        """ Returns (index of the key's slot, its expiry time) or (None, None) """
+        for index in self._probe(key_hash):
+            offset = self._offset(index)
+            state, expires_at, slot_hash, key_len, _ = _SLOT_HEADER.unpack_from(buf, offset)
+            if state == _EMPTY:
+                return None, None
+            if state == _USED and self._holds_key(buf, offset, slot_hash, key_len, key, key_hash):
+                return index, expires_at
+        return None, None
+
+    def _get(self, key):
+        key_hash = _hash(key)
+        with self._locked() as buf:
+            index, expires_at = self._find(buf, key, key_hash)
+            if index is None or expires_at < time.time():
+                return None
+            offset = self._offset(index)
+            val_len = _SLOT_HEADER.unpack_from(buf, offset)[4]
+            start = offset + _SLOT_HEADER.size + self.max_key_size
+            return buf[start:start + val_len]
+
+    def _set(self, key, expiry, val):
+        if len(key) > self.max_key_size:
+            raise ValueError("Session key is larger than max_key_size ({} bytes)".format(self.max_key_size))
+        if len(val) > self.max_val_size:
+            raise ValueError("Session is larger than a slot can hold ({} bytes)".format(self.max_val_size))
+        key_hash = _hash(key)
+        now = time.time()
+        with self._locked(exclusive=True) as buf:
+            target = None
+            soonest, soonest_expiry = None, None
+            for index in self._probe(key_hash):
+                offset = self._offset(index)
+                state, expires_at, slot_hash, key_len, _ = _SLOT_HEADER.unpack_from(buf, offset)
+                if state == _USED and self._holds_key(buf, offset, slot_hash, key_len, key, key_hash):
+                    target = index
+                    break
+                reusable = state != _USED or expires_at < now
+                if reusable and target is None:
+                    target = index
+                if state == _EMPTY:
+                    break
+                if not reusable and (soonest_expiry is None or expires_at < soonest_expiry):
+                    soonest, soonest_expiry = index, expires_at
+            if target is None:
+                target = soonest
+                self.evictions += 1
+            offset = self._offset(target)
+            _SLOT_HEADER.pack_into(buf, offset, _USED, now + expiry, key_hash, len(key), len(val))
+            start = offset + _SLOT_HEADER.size
+            buf[start:start + len(key)] = key
+            start += self.max_key_size
+            buf[start:start + len(val)] = val
+
+    def _delete(self, key):
+        key_hash = _hash(key)
+        with self._locked(exclusive=True) as buf:
+            index, _ = self._find(buf, key, key_hash)
+            if index is not None:
+                buf[self._offset(index)] = _DELETED
+
+    def _sweep(self, start=0, stop=None):
+        """ Marks the expired slots in [start, stop) as deleted """
+        now = time.time()
+        with self._locked(exclusive=True) as buf:
+            for index in range(start, self.capacity if stop is None else stop):
+                offset = self._offset(index)
+                state, expires_at = _SLOT_HEADER.unpack_from(buf, offset)[:2]
+                if state == _USED and expires_at < now:
+                    buf[offset] = _DELETED
+
+    def _read_slots(self, start, stop):
+        """ Returns the unexpired (key, value) pairs in slots [start, stop) """
+        now = time.time()
+        items = []
+        with self._locked() as buf:
+            for index in range(start, stop):
+                offset = self._offset(index)
+                state, expires_at, _, key_len, val_len = _SLOT_HEADER.unpack_from(buf, offset)
+                if state != _USED or expires_at < now:
+                    continue
+                key_start = offset + _SLOT_HEADER.size
+                val_start = key_start + self.max_key_size
+                items.append((buf[key_start:key_start + key_len], buf[val_start:val_start + val_len]))
+        return items
+
+    async def sweep(self, chunk_size=1024):
+        """
+        Marks expired slots as deleted, ``chunk_size`` slots at a time
+
+        The exclusive lock is released between chunks, so the workers of the host
+        (and this event loop) aren't stalled for the whole sweep
+        """
+        for start in range(0, self.capacity, chunk_size):
+            self._sweep(start, min(start + chunk_size, self.capacity))
+            await asyncio.sleep(0)
+
+    #### ------------- Interface ------------- ####
+
+    def init(self):
+        # Call after the event loop starts
+        # Will not be called by the session interface
+
+        async def clean_up_expired_keys():
+            while True:
+                await asyncio.sleep(self.cleanup_interval)
+                await self.sweep()
+
+        loop = asyncio.get_event_loop()
+        self.cleaner = loop.create_task(clean_up_expired_keys())
+
+    def kill(self):
+        if self.cleaner is not None:
+            self.cleaner.cancel()
+
+    async def fetch(self, sid, **kwargs):
+        val = self._get((self.prefix + sid).encode())
+        if val is not None:
+            return await self._decode(val)
+
+    async def fetch_many(self, sids, **kwargs):
+        return [await self.fetch(sid) for sid in sids]
+
+    async def store(self, sid, expiry, val, **kwargs):
+        if val is not None:
+            val = await self._encode(val)
+            if isinstance(val, str):
+                val = val.encode()
+            self._set((self.prefix + sid).encode(), expiry, val)
+
+    async def delete(self, sid, **kwargs):
+        self._delete((self.prefix + sid).encode())
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields lists of (sid, session), reading batch_size slots at a time """
+        prefix = self.prefix.encode()
+        for start in range(0, self.capacity, batch_size):
+            batch = [
+                (key[len(prefix):].decode(), await self._decode(val))
+                for key, val in self._read_slots(start, min(start + batch_size, self.capacity))
+                if key.startswith(prefix)
+            ]
+            if batch:
+                yield batch
+            await asyncio.sleep(0)
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=1000, **kwargs):
+        for i, sid in enumerate(sids, 1):
+            self._delete((self.prefix + sid).encode())
+            if i % batch_size == 0:
+                await asyncio.sleep(0)
@@ -0,0 +1,74 @@
+import re
+import hmac
+import uuid
+import hashlib
+import secrets
+
+
+__all__ = ["uuid_sid_factory", "is_uuid_sid", "SignedSID"]
+
+_UUID4_HEX_RE = re.compile(r"^[0-9a-f]{12}4[0-9a-f]{3}[89ab][0-9a-f]{15}$")
+
+
+def uuid_sid_factory():
+    return uuid.uuid4().hex
+
+
+def is_uuid_sid(sid):
+    """ Validates SIDs made by uuid_sid_factory """
+    return isinstance(sid, str) and _UUID4_HEX_RE.match(sid) is not None
+
+
+def sid_validator_of(sid_factory, sid_validator=None):
+    """ The validator static interfaces use for the SIDs of their sid_factory """
+    if sid_validator is not None:
+        return sid_validator
+    if sid_factory is uuid_sid_factory:
+        return is_uuid_sid
+    return getattr(sid_factory, "validate", None)
+
+
+class SignedSID:
+    """
+    SID factory whose SIDs carry an HMAC of their random part
+
+    Forged or garbage SIDs can then be told apart from expired ones without a lookup.
+    Pass it as an interface's sid_factory, its validate method is used as the sid_validator.
+
+        e.g. Aioredis(client, sid_factory=SignedSID(app.config.SID_SECRET))
+
+    Arguments:
+
+        secret (str or bytes)
+
+        nbytes (int):
+
+            Random bytes per SID. Default: 16
+
+        digest_size (int):
+
+            Bytes of the (truncated) HMAC-SHA256. Default: 16
+    """
+
+    def __init__(self, secret, nbytes=16, digest_size=16):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.secret = secret
+        self.nbytes = nbytes
+        self.digest_size = digest_size
+        self._length = (nbytes + digest_size) * 2 + 1
+
+    def _sign(self, random_part):
+        return hmac.new(self.secret, random_part.encode(), hashlib.sha256).hexdigest()[
+            :self.digest_size * 2
+        ]
+
+    def __call__(self):
+        random_part = secrets.token_hex(self.nbytes)
+        return "{}.{}".format(random_part, self._sign(random_part))
+
+    def validate(self, sid):
+        if not isinstance(sid, str) or len(sid) != self._length:
+            return False
+        random_part, _, signature = sid.partition(".")
+        return hmac.compare_digest(signature, self._sign(random_part))
@@ -0,0 +1,282 @@
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ujson
+
+from .codec import CodecMixin
+from .sid import uuid_sid_factory, sid_validator_of
+
+
+__all__ = ["SQLite"]
+
+
+class SQLite(CodecMixin):
+    """
+        Embedded SQLite storage (WAL mode, requires SQLite 3.24+ for UPSERT)
+
+        Queries run in threads, never on the event loop. Writes are queued and committed
+        by a single writer thread, so the writes of concurrent requests share a transaction.
+
+        path:
+
+            Database file. Default: "sessions.db"
+
+        table:
+
+            Created on first connection along with an index on its expiry column. Default: "sessions"
+
+        readers:
+
+            Number of reader threads (each has its own connection). Default: 4
+
+        batch_delay:
+
+            Seconds to wait for more writes before committing a batch. Default: 0
+            (Only the writes queued while the previous batch was being committed are batched)
+
+        cleanup_interval:
+
+            Seconds between deletions of expired rows. Default: 1 hour
+
+        encoder & decoder:
+
+            e.g. json, ujson, pickle, cpickle, bson, msgpack etc..
+            Default ujson
+
+        sid_factory & sid_validator:
+
+            SIDs that fail sid_validator are replaced by a new session without looking them up.
+            Default: uuid4 hex SIDs validated by their format (See: SignedSID)
+
+        offload (Offload):
+
+            Decodes large payloads in an executor. Default: None
+
+        compressor (Compressor):
+
+            Compresses large sessions. Default: None
+    """
+
+    # SIDs aren't changed by writes (See: BaseSession._is_static_master_interface)
+    static_sid = True
+
+    def __init__(
+        self,
+        path="sessions.db",
+        table="sessions",
+        readers=4,
+        batch_delay=0,
+        cleanup_interval=60 * 60 * 1,
+        cleanup_batch_size=1000,
+        encoder=ujson.dumps,
+        decoder=ujson.loads,
+        sid_factory=uuid_sid_factory,
+        sid_validator=None,
+        offload=None,
+        compressor=None,
+    ):
+        if not table.replace("_", "").isalnum():
+            raise ValueError('Invalid table name: "{}"'.format(table))
+        self.path = path
+        self.table = table
+        self.batch_delay = batch_delay
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch_size = cleanup_batch_size
+        self.cleaner = None
+        self.encoder = encoder
+        self.decoder = decoder
+        self.sid_factory = sid_factory
+        self.sid_validator = sid_validator_of(sid_factory, sid_validator)
+        self.offload = offload
+        self.compressor = compressor
+        self.commits = 0
+
+        self._reader = ThreadPoolExecutor(max_workers=readers)
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._local = threading.local()
+        self._connections = []
+        self._pending = []
+        self._flusher = None
+
+    #### ------------- Connections ------------- ####
+
+    def _connection(self):
+        # One connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS {0} (sid TEXT PRIMARY KEY, val BLOB NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL, user_id TEXT)".format(
+                    self.table
+                )
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS {0}_expires_at ON {0} (expires_at)".format(self.table))
+            columns = [row[1] for row in conn.execute("PRAGMA table_info({})".format(self.table))]
+            if "user_id" not in columns:
+                # Tables created before sessions were indexed by user
+                conn.execute("ALTER TABLE {} ADD COLUMN user_id TEXT".format(self.table))
+            conn.execute("CREATE INDEX IF NOT EXISTS {0}_user_id ON {0} (user_id)".format(self.table))
+            self._local.conn = conn
+            self._connections.append(conn)
+        return conn
+
+    def close(self):
+        self.kill()
+        self._reader.shutdown()
+        self._writer.shutdown()
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    #### ------------- Queries ------------- ####
+
+    def _select(self, sql, params):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _commit(self, statements):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rowcounts = [conn.execute(sql, params).rowcount for sql, params in statements]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self.commits += 1
+        return rowcounts
+
+    async def _read(self, sql, params):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._reader, self._select, sql, params)
+
+    async def _write(self, sql, params):
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((sql, params, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        loop = asyncio.get_event_loop()
+        while self._pending:
+            if self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+            batch, self._pending = self._pending, []
+            try:
+                rowcounts = await loop.run_in_executor(
+                    self._writer, self._commit, [(sql, params) for sql, params, _ in batch]
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, _, future), rowcount in zip(batch, rowcounts):
+                    if not future.done():
+                        future.set_result(rowcount)
+
+    async def delete_expired(self):
+        """ Deletes expired rows in small transactions to avoid holding the write lock for long """
+        sql = "DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} WHERE expires_at <= ? LIMIT ?)".format(self.table)
+        deleted = self.cleanup_batch_size
+        while deleted >= self.cleanup_batch_size:
+            deleted = await self._write(sql, (time.time(), self.cleanup_batch_size))
+
+    #### ------------- Interface ------------- ####
+
+    def init(self):
+        # Call after the event loop starts
+        # Will not be called by the session interface
+
+        async def clean_up_expired_keys():
+            while True:
+                await asyncio.sleep(self.cleanup_interval)
+                await self.delete_expired()
+
+        loop = asyncio.get_event_loop()
+        self.cleaner = loop.create_task(clean_up_expired_keys())
+
+    def kill(self):
+        if self.cleaner is not None:
+            self.cleaner.cancel()
+
+    async def fetch(self, sid, **kwargs):
+        rows = await self._read(
+            "SELECT val FROM {} WHERE sid = ? AND expires_at > ?".format(self.table),
+            (sid, time.time()),
+        )
+        if rows:
+            return await self._decode(rows[0][0])
+
+    async def fetch_many(self, sids, **kwargs):
+        rows = await self._read(
+            "SELECT sid, val FROM {} WHERE sid IN ({}) AND expires_at > ?".format(
+                self.table, ", ".join("?" * len(sids))
+            ),
+            (*sids, time.time()),
+        )
+        vals = dict(rows)
+        return [None if vals.get(sid) is None else await self._decode(vals[sid]) for sid in sids]
+
+    async def store(self, sid, expiry, val, user_id=None, **kwargs):
+        if val is not None:
+            val = await self._encode(val)
+            now = time.time()
+            await self._write(
+                "INSERT INTO {} (sid, val, created_at, expires_at, user_id) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (sid) DO UPDATE SET val = excluded.val, expires_at = excluded.expires_at, user_id = excluded.user_id".format(
+                    self.table
+                ),
+                (sid, val, now, now + expiry, None if user_id is None else str(user_id)),
+            )
+
+    async def delete(self, sid, **kwargs):
+        await self._write("DELETE FROM {} WHERE sid = ?".format(self.table), (sid,))
+
+    async def user_sids(self, user_id, **kwargs):
+        rows = await self._read(
+            "SELECT sid FROM {} WHERE user_id = ? AND expires_at > ?".format(self.table),
+            (str(user_id), time.time()),
+        )
+        return [row[0] for row in rows]
+
+    async def forget_user(self, user_id, **kwargs):
+        # The index is a column of the sessions themselves
+        pass
+
+    async def scan_batches(self, batch_size=1000, **kwargs):
+        """ Yields lists of (sid, session), paginated by sid (keyset), so only one batch is held in memory at a time """
+        last_sid = ""
+        while True:
+            rows = await self._read(
+                "SELECT sid, val FROM {} WHERE sid > ? AND expires_at > ? ORDER BY sid LIMIT ?".format(self.table),
+                (last_sid, time.time(), batch_size),
+            )
+            if not rows:
+                return
+            yield [(sid, await self._decode(val)) for sid, val in rows]
+            if len(rows) < batch_size:
+                return
+            last_sid = rows[-1][0]
+
+    async def scan(self, batch_size=1000, **kwargs):
+        async for batch in self.scan_batches(batch_size):
+            for item in batch:
+                yield item
+
+    async def delete_many(self, sids, batch_size=500, **kwargs):
+        # Batches are kept under SQLite's default limit of 999 host parameters
+        batch_size = min(batch_size, 999)
+        sids = list(sids)
+        for i in range(0, len(sids), batch_size):
+            chunk = sids[i:i + batch_size]
+            await self._write(
+                "DELETE FROM {} WHERE sid IN ({})".format(self.table, ", ".join("?" * len(chunk))),
+                tuple(chunk),
+            )
@@ -0,0 +1,12 @@
+from .gino_asyncpg import GinoAsyncPG
+from .asyncpg_pool import AsyncPG
+from .aioredis import Aioredis
+from .aioredis_hash import AioredisHash
+from .inmemory import InMemory
+from .sharedmem import SharedMemory
+from .sqlite import SQLite
+from .migrating import Migrating
+
+# Kept for backwards compatibility. Session managers recognize static interfaces by their static_sid attribute
+# (Set it on custom interfaces whose SIDs aren't changed by writes)
+STATIC_SID_COOKIE_INTERFACES = [GinoAsyncPG, AsyncPG, Aioredis, AioredisHash, InMemory, SharedMemory, SQLite, Migrating]
@@ -1,3 +1,5 @@
+import copy
+import asyncio
 import warnings
 from asyncio import Lock
 from collections import abc
@@ -75,6 +77,155 @@ class LockKeeper:
 lock_keeper = LockKeeper()
 
 
+class SingleFlight:
+    """
+    Runs one call at a time per key. Concurrent callers with the same key
+    wait for the running call and each get their own (deep) copy of its result
+
+    Counts:
+
+        calls: Calls that actually ran
+
+        deduplicated: Calls that shared the result of a running call
+    """
+
+    def __init__(self, copy=copy.deepcopy):
+        self.copy = copy
+        self.calls = 0
+        self.deduplicated = 0
+        self._flights = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.deduplicated += 1
+            flight[1] += 1
+            try:
+                return self.copy(await asyncio.shield(flight[0]))
+            except asyncio.CancelledError:
+                if not flight[0].cancelled():
+                    raise
+                # The running call was cancelled, not this one
+                return await fn(*args, **kwargs)
+
+        self.calls += 1
+        future = asyncio.get_event_loop().create_future()
+        # [future, number of waiting callers]
+        flight = self._flights[key] = [future, 0]
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved, so that asyncio doesn't complain when no other caller is waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self.forget(key, flight)
+        # The waiting callers copy the result after this caller returns it,
+        # so it must not be the same object they copy
+        return self.copy(result) if flight[1] else result
+
+    def forget(self, key, flight=None):
+        """ New callers with this key won't wait for the running call (e.g. because its result is outdated) """
+        if flight is None or self._flights.get(key) is flight:
+            self._flights.pop(key, None)
+
+
+class NotLoadedError(LookupError):
+    pass
+
+
+class _NotLoaded:
+    """ Value of the fields of a LazySessionDict that haven't been loaded yet """
+
+    def __repr__(self):
+        return "<not loaded>"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return "NOT_LOADED"
+
+
+NOT_LOADED = _NotLoaded()
+
+
+class LazyStore(dict):
+    """
+    The fields of a session, of which only some values are loaded (the others are NOT_LOADED)
+
+    Keeps track of the fields set (dirty) and deleted since it was fetched,
+    so that interfaces only write those
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty = set()
+        self.deleted = set()
+
+    def _loaded(self, key):
+        val = dict.__getitem__(self, key)
+        if val is NOT_LOADED:
+            raise NotLoadedError(
+                '"{}" isn\'t loaded. Use: await session_dict.aget(key) or await session_dict.load(key)'.format(key)
+            )
+        return val
+
+    def __setitem__(self, key, val):
+        super().__setitem__(key, val)
+        self.dirty.add(key)
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.dirty.discard(key)
+        self.deleted.add(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        val = self._loaded(key)
+        del self[key]
+        return val
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self._loaded(key)
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for key, val in dict(*args, **kwargs).items():
+            self[key] = val
+
+    def clear(self):
+        self.deleted.update(self)
+        self.dirty.clear()
+        super().clear()
+
+    def load(self, vals):
+        """ Sets loaded values, without marking them as dirty """
+        for key, val in vals.items():
+            dict.__setitem__(self, key, val)
+
+
 class SessionDict(abc.MutableMapping):
     def __init__(
         self, initial=None, sid=None, session=None, warn_lock=True, request=None
@@ -89,6 +240,7 @@ class SessionDict(abc.MutableMapping):
         self.locked_key = None
         self._should_set_cookie = False
         self._should_del_cookie = False
+        self._flush_pending = False
 
     @property
     def sid(self):
@@ -150,6 +302,13 @@ class SessionDict(abc.MutableMapping):
         else:
             raise AttributeError(key)
 
+    async def aget(self, key, default=None):
+        """ Same as get, for code that also supports LazySessionDict """
+        return self.get(key, default)
+
+    async def load(self, *keys):
+        """ Loads the values of keys (All values are always loaded, See: LazySessionDict) """
+
     def reset(self):
         if getattr(self, "store") != {}:
             self._warn_if_not_locked()
@@ -170,8 +329,12 @@ class SessionDict(abc.MutableMapping):
         else:
             return False
 
+    @property
+    def _defers_flush(self):
+        return self.request is not None and getattr(self._session, "deferred_flush", False)
+
     async def __aenter__(self):
-        if self.is_modified or self.is_sid_modified:
+        if (self.is_modified or self.is_sid_modified) and not self._flush_pending:
             warnings.warn(*UNLOCKED_LOCKED_ACCESS_MIX_MSG)
         # While we can always await lock_keeper.acquire(self.sid)
         # self.locked_key will be a better choice to accurately
@@ -179,12 +342,215 @@ class SessionDict(abc.MutableMapping):
         # is changed in ctx
         await lock_keeper.acquire(self.sid)
         self.locked_key = self.sid
-        self.store = (
-            await self._session._fetch_sess(self.sid, request=self.request) or {}
+        # Changes waiting to be flushed at response time are more recent than what's stored
+        if not self._flush_pending:
+            self.store = (
+                await self._session._fetch_sess(self.sid, request=self.request) or {}
+            )
+        return self
+
+    async def __aexit__(self, *args):
+        try:
+            if self._defers_flush:
+                # Only one write per request, when the response middleware calls _save_sess
+                self._flush_pending = (
+                    self._flush_pending or self.is_modified or self.is_sid_modified
+                )
+            else:
+                try:
+                    await self._session._save_sess(self)
+                except BaseException:
+                    # The changes are dropped rather than written again at response time
+                    # (e.g. on VersionConflict). Entering the context manager again fetches the stored session
+                    self.is_modified = False
+                    raise
+        finally:
+            lock_keeper.release(self.locked_key)
+            self.locked_key = None
+
+
+class LazySessionDict(SessionDict):
+    """
+    A session dict that only loads the values it's asked for (See: AioredisHash)
+
+    Only the session's field names (and a few fields the session managers read on every request)
+    are fetched when the session is opened. Other values must be loaded before they're read:
+
+        async with request['session'] as sess:
+            user = await sess.aget('current_user')
+            # or
+            await sess.load('cart', 'flags')
+            cart = sess['cart']
+
+    Reading a value that isn't loaded raises NotLoadedError. Loaded values are kept until
+    the session is fetched again (i.e. on entering its context manager).
+    Writes only send the fields that were set or deleted.
+    """
+
+    # Tells session managers to fetch lazily
+    lazy = True
+
+    def __init__(
+        self, initial=None, sid=None, session=None, warn_lock=True, request=None
+    ):
+        super().__init__(
+            initial=initial, sid=sid, session=session, warn_lock=warn_lock, request=request
         )
+        if not isinstance(self.store, LazyStore):
+            self.store = LazyStore(self.store)
+
+    def __getitem__(self, key):
+        self._warn_if_not_locked()
+        if not isinstance(self.store, LazyStore):
+            return self.store[key]
+        return self.store._loaded(key)
+
+    async def aget(self, key, default=None):
+        await self.load(key)
+        return self.get(key, default)
+
+    async def load(self, *keys):
+        if not isinstance(self.store, LazyStore):
+            return
+        missing = [key for key in keys if dict.get(self.store, key) is NOT_LOADED]
+        if not missing:
+            return
+        vals = await self._session.master_interface.fetch_values(self.sid, missing)
+        for key in missing:
+            if key in vals:
+                self.store.load({key: vals[key]})
+            else:
+                # Deleted since the field names were fetched
+                dict.pop(self.store, key, None)
+
+
+class FastSessionDict(abc.MutableMapping):
+    """
+    A compact SessionDict, for apps that access their sessions a lot
+
+    Same API and behavior as SessionDict, but:
+
+        - It has __slots__ (no per instance __dict__)
+        - Whether it holds its lock is remembered on entering and leaving its context manager,
+          instead of being looked up in the lock keeper on every access
+        - get, pop, update, setdefault etc. are methods, not attributes looked up with __getattr__
+
+        e.g. Session(app, store_factory=FastSessionDict)
+    """
+
+    __slots__ = (
+        "store",
+        "_sid",
+        "_session",
+        "warn_lock",
+        "request",
+        "is_modified",
+        "_prev_sid",
+        "locked_key",
+        "_should_set_cookie",
+        "_should_del_cookie",
+        "_flush_pending",
+        "_locked",
+    )
+
+    def __init__(
+        self, initial=None, sid=None, session=None, warn_lock=True, request=None
+    ):
+        SessionDict.__init__(
+            self, initial=initial, sid=sid, session=session, warn_lock=warn_lock, request=request
+        )
+        self._locked = False
+
+    sid = SessionDict.sid
+    is_sid_modified = SessionDict.is_sid_modified
+    is_locked = SessionDict.is_locked
+    _defers_flush = SessionDict._defers_flush
+    aget = SessionDict.aget
+    load = SessionDict.load
+
+    def _warn_if_not_locked(self):
+        if not self._locked and self.warn_lock:
+            warnings.warn(*UNLOCKED_WARNING_MSG)
+
+    def _is_locked(self):
+        return self._locked
+
+    # The lock check is inlined in the most used methods
+
+    def __getitem__(self, key):
+        if not self._locked and self.warn_lock:
+            warnings.warn(*UNLOCKED_WARNING_MSG)
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        if not self._locked and self.warn_lock:
+            warnings.warn(*UNLOCKED_WARNING_MSG)
+        self.is_modified = True
+        self.store[key] = value
+
+    def __delitem__(self, key):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        del self.store[key]
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def __repr__(self):
+        return repr(self.store)
+
+    def __str__(self):
+        return str(self.store)
+
+    def get(self, key, default=None):
+        if not self._locked and self.warn_lock:
+            warnings.warn(*UNLOCKED_WARNING_MSG)
+        return self.store.get(key, default)
+
+    def pop(self, key, *default):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        return self.store.pop(key, *default)
+
+    def popitem(self):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        return self.store.popitem()
+
+    def update(self, *args, **kwargs):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        self.store.update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        return self.store.setdefault(key, default)
+
+    def clear(self):
+        self._warn_if_not_locked()
+        self.is_modified = True
+        self.store.clear()
+
+    def reset(self):
+        if self.store != {}:
+            self._warn_if_not_locked()
+            self.store = {}
+            self.is_modified = True
+
+    async def __aenter__(self):
+        await SessionDict.__aenter__(self)
+        self._locked = True
         return self
 
     async def __aexit__(self, *args):
-        await self._session._save_sess(self)
-        lock_keeper.release(self.locked_key)
-        self.locked_key = None
+        try:
+            await SessionDict.__aexit__(self, *args)
+        finally:
+            self._locked = False
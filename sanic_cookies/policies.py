@@ -0,0 +1,409 @@
+import hmac
+import time
+import base64
+import asyncio
+import hashlib
+from collections import deque
+
+import ujson
+
+
+__all__ = ["CircuitBreaker", "FallbackRead", "HedgedRead", "TokenBucket", "AdmissionPolicy"]
+
+# Where the pending sessions of a request are kept (in the request)
+_PENDING_KEY = "__sanic_cookies_pending__"
+
+
+class CircuitBreaker:
+    """
+    Stops reading from an unhealthy interface
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    ``allow()`` returns False for ``reset_timeout`` seconds. Then a single
+    trial read is let through (half-open). A success closes the breaker again,
+    a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_cancelled(self):
+        # A cancelled trial (e.g. a hedged read that lost) tells nothing about the interface's health
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class FallbackRead:
+    """
+    Reads from the master interface and falls back to the secondary interfaces
+    (in the order they were added) if the master raises or takes longer than ``timeout``
+
+    Arguments:
+
+        timeout (float):
+
+            Seconds to wait for the master interface. Default: None (wait forever)
+
+        breaker (CircuitBreaker):
+
+            Skips the master interface altogether while it's unhealthy. Default: CircuitBreaker()
+    """
+
+    def __init__(self, timeout=None, breaker=None):
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+
+    async def _fetch_master(self, session, sid, request=None):
+        fetching = session._fetch_from(session.master_interface, sid, request=request)
+        if self.timeout is not None:
+            fetching = asyncio.wait_for(fetching, self.timeout)
+        try:
+            val = await fetching
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return val
+
+    async def _fetch_secondaries(self, session, sid, request=None, error=None):
+        for interface in list(session.interfaces)[1:]:
+            try:
+                return await session._fetch_from(interface, sid, request=request)
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+        raise RuntimeError("Master interface is unavailable and there are no secondary interfaces to read from")
+
+    async def fetch(self, session, sid, request=None):
+        if not self.breaker.allow():
+            return await self._fetch_secondaries(session, sid, request=request)
+        try:
+            return await self._fetch_master(session, sid, request=request)
+        except Exception as e:
+            return await self._fetch_secondaries(session, sid, request=request, error=e)
+
+
+class HedgedRead(FallbackRead):
+    """
+    Reads from the master interface and, if it hasn't answered within the ``percentile``-th
+    percentile of its recent latencies, also reads from the first secondary interface.
+    Whichever answers first wins.
+
+    Also falls back to the secondary interface if the master raises (See: FallbackRead)
+
+    Arguments:
+
+        percentile (float):
+
+            Percentile of the master's recent latencies to wait before hedging. Default: 95
+
+        window (int):
+
+            Number of recent master latencies to keep. Default: 100
+
+        min_delay (float):
+
+            Lower bound of the hedging delay in seconds. Default: 0.001
+
+        initial_delay (float):
+
+            Hedging delay used until ``min_samples`` latencies are recorded. Default: 0.05
+
+        min_samples (int):
+
+            Default: 10
+    """
+
+    def __init__(
+        self,
+        percentile=95,
+        window=100,
+        min_delay=0.001,
+        initial_delay=0.05,
+        min_samples=10,
+        timeout=None,
+        breaker=None,
+    ):
+        super().__init__(timeout=timeout, breaker=breaker)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.hedged = 0
+
+    @property
+    def delay(self):
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        samples = sorted(self.latencies)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay, samples[index])
+
+    async def _fetch_master(self, session, sid, request=None):
+        start = time.monotonic()
+        try:
+            val = await super()._fetch_master(session, sid, request=request)
+        except asyncio.CancelledError:
+            # Lost the race, its latency is at least this long (So that the delay follows a slowing master)
+            self.latencies.append(time.monotonic() - start)
+            raise
+        self.latencies.append(time.monotonic() - start)
+        return val
+
+    async def fetch(self, session, sid, request=None):
+        if len(session.interfaces) < 2 or not self.breaker.allow():
+            return await super().fetch(session, sid, request=request)
+
+        master = asyncio.ensure_future(self._fetch_master(session, sid, request=request))
+        try:
+            done, _ = await asyncio.wait((master,), timeout=self.delay)
+        except asyncio.CancelledError:
+            master.cancel()
+            raise
+        if done and master.exception() is None:
+            return master.result()
+
+        self.hedged += 1
+        secondary = asyncio.ensure_future(
+            session._fetch_from(session.interfaces[1], sid, request=request)
+        )
+        pending = {master, secondary}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` operations per second on average and bursts of up to ``burst`` operations
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class PendingSession:
+    """ A new anonymous session that isn't stored yet (See: AdmissionPolicy) """
+
+    __slots__ = ("data", "requests", "first_seen", "from_cookie", "admitted", "cookie")
+
+    def __init__(self, data=None, requests=1, first_seen=None, from_cookie=False):
+        self.data = data or {}
+        self.requests = requests
+        self.first_seen = first_seen if first_seen is not None else time.time()
+        self.from_cookie = from_cookie
+        self.admitted = False
+        self.cookie = None
+
+
+class AdmissionPolicy:
+    """
+    Keeps new anonymous sessions out of the store until their clients come back
+
+    Until it's admitted, a new session is kept in a signed (not encrypted) cookie named
+    after the session's cookie, e.g. "SESSION_PENDING". Clients that don't keep cookies
+    (e.g. most crawlers) then never cost a write. Pending sessions must be JSON serializable.
+    Sessions with a logged in user (AuthSession) are always admitted.
+
+    Only applies to interfaces that store sessions server side (i.e. not InCookieEncrypted)
+
+    Arguments:
+
+        secret (str or bytes):
+
+            Signs the pending cookies
+
+        min_requests (int):
+
+            Requests made with the session (including the one that created it) before it's stored. Default: 2
+
+        min_age (float):
+
+            Seconds since the session was created before it's stored. Default: 0
+
+        rate (float):
+
+            New sessions admitted per second (per process) on average. Default: None (unlimited)
+
+            Sessions over the limit stay pending and are retried on their next request
+
+        burst (int):
+
+            Default: rate
+
+        max_size (int):
+
+            Pending cookies larger than this (in bytes) are admitted right away. Default: 3072
+
+        max_age (int):
+
+            Seconds a pending session is kept. Default: 1 day
+
+        cookie_suffix (str):
+
+            Default: "_PENDING"
+
+    Counters: admitted, deferred and throttled (deferred by the rate limit)
+    """
+
+    def __init__(
+        self,
+        secret,
+        min_requests=2,
+        min_age=0,
+        rate=None,
+        burst=None,
+        max_size=3072,
+        max_age=24 * 60 * 60,
+        cookie_suffix="_PENDING",
+    ):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.secret = secret
+        self.min_requests = min_requests
+        self.min_age = min_age
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.max_size = max_size
+        self.max_age = max_age
+        self.cookie_suffix = cookie_suffix
+        self.admitted = 0
+        self.deferred = 0
+        self.throttled = 0
+
+    #### ------------- Pending cookies ------------- ####
+
+    def cookie_name(self, session):
+        return session.cookie_name + self.cookie_suffix
+
+    def _sign(self, cookie_name, payload):
+        # Signed along with the cookie's name so a cookie can't be replayed as another session's
+        return hmac.new(self.secret, "{}.{}".format(cookie_name, payload).encode(), hashlib.sha256).hexdigest()
+
+    def dumps(self, session, pending):
+        payload = base64.urlsafe_b64encode(
+            ujson.dumps([pending.requests, pending.first_seen, pending.data]).encode()
+        ).decode()
+        return "{}.{}".format(payload, self._sign(self.cookie_name(session), payload))
+
+    def loads(self, session, value):
+        """ Returns a PendingSession or None if the cookie is invalid or too old """
+        if not isinstance(value, str):
+            return None
+        payload, _, signature = value.rpartition(".")
+        if not hmac.compare_digest(signature, self._sign(self.cookie_name(session), payload)):
+            return None
+        try:
+            requests, first_seen, data = ujson.loads(base64.urlsafe_b64decode(payload.encode()))
+            if time.time() - first_seen > self.max_age:
+                return None
+        except (TypeError, ValueError):
+            return None
+        return PendingSession(data, requests + 1, first_seen, from_cookie=True)
+
+    def set_cookie(self, session, pending, response):
+        cookie_name = self.cookie_name(session)
+        response.cookies[cookie_name] = pending.cookie or self.dumps(session, pending)
+        cookie = response.cookies[cookie_name]
+        cookie["max-age"] = self.max_age
+        for name, value in session._cookie_attributes:
+            cookie[name] = value
+
+    def del_cookie(self, session, response):
+        try:
+            del response.cookies[self.cookie_name(session)]
+        except KeyError:
+            pass
+
+    #### ------------- Requests ------------- ####
+
+    def open(self, session, request):
+        """ Starts (or resumes, from its cookie) the pending session of a request """
+        pending = self.loads(session, request.cookies.get(self.cookie_name(session))) or PendingSession()
+        pendings = request.get(_PENDING_KEY)
+        if pendings is None:
+            pendings = request[_PENDING_KEY] = {}
+        pendings[session.session_name] = pending
+        return pending
+
+    @staticmethod
+    def pending_of(session, request):
+        pendings = request.get(_PENDING_KEY) if request is not None else None
+        if pendings is not None:
+            return pendings.get(session.session_name)
+
+    def admit(self, session, pending):
+        """ Whether a pending session should be stored now """
+        pending.cookie = self.dumps(session, pending)
+        if len(pending.cookie) <= self.max_size:
+            if pending.requests < self.min_requests or time.time() - pending.first_seen < self.min_age:
+                self.deferred += 1
+                return False
+            if self.bucket is not None and not self.bucket.take():
+                self.throttled += 1
+                self.deferred += 1
+                return False
+        self.admitted += 1
+        return True
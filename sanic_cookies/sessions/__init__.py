@@ -1,3 +1,22 @@
-from .auth import AuthSession, login_required  # noqa: F401  imported but unused
+from typing import TYPE_CHECKING
 
-from .base import Session  # noqa: F401  imported but unused
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .auth import AuthSession, login_required  # noqa: F401  imported but unused
+    from .base import Session  # noqa: F401  imported but unused
+    from .coordinator import Coordinator  # noqa: F401  imported but unused
+    from .websocket import InvalidationHub, WebSocketSession  # noqa: F401  imported but unused
+
+_ATTRIBUTES = {
+    "AuthSession": ".auth",
+    "login_required": ".auth",
+    "Session": ".base",
+    "Coordinator": ".coordinator",
+    "InvalidationHub": ".websocket",
+    "WebSocketSession": ".websocket",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTES)
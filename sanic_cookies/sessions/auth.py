@@ -1,10 +1,12 @@
 from inspect import iscoroutinefunction
 from functools import wraps
+from collections.abc import Hashable
 
 from sanic.exceptions import abort
 
-from .base import BaseSession
+from .base import BaseSession, _ISSUED_AT_KEY
 from ..models import SessionDict
+from ..cache import TTLCache
 
 
 __all__ = ["AuthSession", "login_required"]
@@ -72,6 +74,32 @@ class AuthSession(BaseSession):
             .. example::
 
                 no_auth_handler = lambda request: sanic.response.redirect(request.app.url_for('index'))
+
+        user_loader:
+
+            async function that takes a user ID and returns the user (or None)
+
+            When set, only the user's ID is stored in the session and current_user
+            resolves it through this loader. Default: None (The whole user is stored in the session)
+
+        user_id_getter:
+
+            function that takes the user passed to login_user and returns its ID
+            Default: None (login_user is passed the ID itself)
+
+            Also maps the whole users held by sessions logged in before a user_loader was set
+            (Without it, those sessions are treated as logged out)
+
+        user_cache:
+
+            Where loaded users are cached across requests. Default: TTLCache(maxsize=1024, ttl=60)
+            Call invalidate_user(user_id) when a user changes.
+
+        track_user_sessions:
+
+            When True, the master interface keeps an index of each user's SIDs, written along with the sessions,
+            so that list_sessions(user_id) and logout_all(user_id) don't have to scan every session.
+            Users are identified by user_id_getter (or the stored user itself when there's none). Default: False
     """
 
     def __init__(
@@ -91,11 +119,27 @@ class AuthSession(BaseSession):
         warn_lock=True,
         auth_key="current_user",
         no_auth_handler=None,
+        user_loader=None,
+        user_id_getter=None,
+        user_cache=None,
         store_factory=SessionDict,
+        read_policy=None,
+        exclude=None,
+        deferred_flush=False,
+        negative_cache=None,
+        singleflight=False,
+        coordinator=None,
+        track_user_sessions=False,
+        reissue_fraction=None,
+        admission=None,
     ):
 
         self.auth_key = auth_key
+        self.track_user_sessions = track_user_sessions
         self.no_auth_handler = no_auth_handler or default_no_auth_handler
+        self.user_loader = user_loader
+        self.user_id_getter = user_id_getter
+        self.user_cache = user_cache if user_cache is not None else TTLCache()
         super().__init__(
             app=app,
             master_interface=master_interface,
@@ -111,6 +155,14 @@ class AuthSession(BaseSession):
             session_name=session_name,
             warn_lock=warn_lock,
             store_factory=store_factory,
+            read_policy=read_policy,
+            exclude=exclude,
+            deferred_flush=deferred_flush,
+            negative_cache=negative_cache,
+            singleflight=singleflight,
+            coordinator=coordinator,
+            reissue_fraction=reissue_fraction,
+            admission=admission,
         )
 
     async def login_user(
@@ -124,9 +176,15 @@ class AuthSession(BaseSession):
             remember_me (bool): Whether or not this user session will be a session_cookie. Defaults to self.session_cookie
             reset_session: Whether or not to reset the session dict before adding a current user
                          Defaults to persisting data from anonymous user
+
+            When a user_loader is set, only the user's ID is stored (See: user_id_getter)
         """
         if not user:
             raise TypeError('user must be a truthy value, not: "{}"'.format(user))
+        if self.user_loader is not None and self.user_id_getter is not None:
+            user_id = self.user_id_getter(user)
+            self.user_cache.set(user_id, user)
+            user = user_id
         async with request[self.session_name] as sess:
             # Delete previous SID upon privelage escelation to avoid session fixation attacks
             sess = self.refresh_sid(sess)
@@ -139,22 +197,45 @@ class AuthSession(BaseSession):
                 sess[_DURATION_KEY] = duration
 
     # Overriding (to set custom expiry (login_user(duration)))
-    async def _post_sess(self, sid, val, request=None, response=None):
-        # Get custom expiry
-        expiry = (
-            val.get(_DURATION_KEY) or self.expiry if val is not None else self.expiry
-        )
-        [
-            await interface.store(
-                sid,
-                expiry,
-                val,
-                request=request,
-                cookie_name=self.cookie_name,
-                session_name=self.session_name,
-            )
-            for interface in self.interfaces
-        ]
+    def _store_expiry(self, val):
+        return val.get(_DURATION_KEY) or self.expiry if val is not None else self.expiry
+
+    # Overriding (read by _store_expiry, _set_cookie_expiry, _store_kwargs and _is_anonymous)
+    @property
+    def _eager_fields(self):
+        return (_ISSUED_AT_KEY, _REMEMBER_ME_KEY, _DURATION_KEY, self.auth_key)
+
+    # Overriding (to index sessions by user)
+    def _store_kwargs(self, val):
+        if not self.track_user_sessions or val is None:
+            return {}
+        user = val.get(self.auth_key)
+        if user is None:
+            return {}
+        return {"user_id": self._user_id_of(user)}
+
+    # Overriding (sessions with a logged in user skip admission)
+    def _is_anonymous(self, store):
+        return store.get(self.auth_key) is None
+
+    def _user_id_of(self, user):
+        # With a user_loader, the session already holds the ID
+        if self.user_loader is None and self.user_id_getter is not None:
+            return self.user_id_getter(user)
+        return self._stored_user_id(user)
+
+    def _stored_user_id(self, stored):
+        """
+        The user ID of a session's auth_key, when there's a user_loader
+
+        Sessions logged in before the user_loader was set hold whole users (e.g. dicts).
+        Their ID is taken with user_id_getter, or they're treated as logged out (None) without one
+        """
+        if isinstance(stored, Hashable):
+            return stored
+        if self.user_id_getter is not None:
+            return self.user_id_getter(stored)
+        return None
 
     # Overriding (to set remember_me)
     async def _set_cookie_expiry(self, request, response):
@@ -178,12 +259,61 @@ class AuthSession(BaseSession):
         """ logout_anon: Set to false to delete the authenticated session only when
         there's a logged in user """
         async with request[self.session_name] as sess:
-            if logout_anon or (not logout_anon and sess.get(self.auth_key)):
+            if logout_anon or (not logout_anon and await sess.aget(self.auth_key)):
                 sess.reset()
 
     async def current_user(self, request):
         async with request[self.session_name] as sess:
-            return sess.get(self.auth_key)
+            user = await sess.aget(self.auth_key)
+        if user is None or self.user_loader is None:
+            return user
+        user_id = self._stored_user_id(user)
+        if user_id is None:
+            return None
+        return await self.load_user(user_id)
+
+    async def load_user(self, user_id):
+        user = self.user_cache.get(user_id)
+        if user is None:
+            user = await self.user_loader(user_id)
+            if user is not None:
+                self.user_cache.set(user_id, user)
+        return user
+
+    def invalidate_user(self, user_id):
+        """ Call when a user changes or is deleted, so that the next current_user() reloads it """
+        self.user_cache.delete(user_id)
+
+    async def list_sessions(self, user_id):
+        """ Returns the (sid, session) pairs of the user's live sessions. Requires track_user_sessions """
+        sids = await self.master_interface.user_sids(user_id)
+        if not sids:
+            return []
+        if hasattr(self.master_interface, "fetch_many"):
+            vals = await self.master_interface.fetch_many(sids)
+        else:
+            vals = [await self.master_interface.fetch(sid) for sid in sids]
+        return [(sid, val) for sid, val in zip(sids, vals) if val is not None]
+
+    async def logout_all(self, user_id):
+        """
+        Deletes all the sessions of a user, from all interfaces. Requires track_user_sessions
+
+        Returns the number of sessions that were indexed for the user
+        """
+        sids = await self.master_interface.user_sids(user_id)
+        for sid in sids:
+            if self.singleflight is not None:
+                self.singleflight.forget(sid)
+        for interface in self.interfaces:
+            if hasattr(interface, "delete_many"):
+                await interface.delete_many(sids)
+            else:
+                [await interface.delete(sid) for sid in sids]
+        for sid in sids:
+            self.hub.publish(sid)
+        await self.master_interface.forget_user(user_id)
+        return len(sids)
 
     def login_required(self, no_auth_handler=None):
         return login_required(
@@ -1,8 +1,22 @@
+import re
+import time
 import datetime
+from functools import lru_cache
 from collections import deque
 
-from ..models import SessionDict, Object
-from ..interfaces import STATIC_SID_COOKIE_INTERFACES
+from ..models import NOT_LOADED, LazyStore, SessionDict, Object, SingleFlight
+from .websocket import InvalidationHub, WebSocketSession
+
+
+_ISSUED_AT_KEY = "_cookie_issued_at"
+
+# Flags of patterns compiled without any (str patterns are always unicode)
+_DEFAULT_FLAGS = re.compile("").flags
+
+
+@lru_cache(maxsize=16)
+def _expires_at(second, expiry):
+    return datetime.datetime.utcfromtimestamp(second + expiry)
 
 
 class BaseSession:
@@ -19,6 +33,77 @@ class BaseSession:
 
                 - request[session_name] AND
                 - app.exts.{session_name}
+
+        read_policy:
+
+            Default: None (Only read from the master interface)
+
+            How to read across the master and the secondary interfaces
+            e.g. sanic_cookies.FallbackRead() or sanic_cookies.HedgedRead()
+
+        exclude:
+
+            Default: None
+
+            Paths that skip the session middleware entirely (No fetching, no saving and no request[session_name])
+            Strings are treated as path prefixes, compiled regexes are matched from the start of the path
+            e.g. ['/static', '/healthz', re.compile('/webhooks/[a-z]+/events')]
+
+            To exclude a single route, decorate it with ``@session.exempt``
+
+        deferred_flush:
+
+            Default: False
+
+            When True, exiting the session dict's context manager doesn't write the session.
+            All the changes of a request are written once, by the response middleware.
+            The lock is still released on exit, so if concurrent requests modify the same session,
+            the one that responds last wins.
+
+        negative_cache:
+
+            Default: None
+
+            Remembers the SIDs that were recently looked up and not found (e.g. expired sessions)
+            so that clients that keep sending them don't cost a lookup each.
+            e.g. sanic_cookies.TTLCache(maxsize=100000, ttl=60)
+            It's per process, so keep its ttl short if the SIDs you mint could be written by another process
+
+        singleflight:
+
+            Default: False
+
+            When True, concurrent requests with the same session cookie share a single fetch at request start.
+            Counts are available at session.singleflight.calls and session.singleflight.deduplicated
+
+        coordinator:
+
+            Default: None
+
+            A sanic_cookies.Coordinator shared by the session managers of an app.
+            Managers that share a master interface then fetch their sessions in one batched call per request
+            (e.g. a single MGET for a Session and an AuthSession backed by the same Redis)
+
+        reissue_fraction:
+
+            Default: None (The cookie is set on every response that modifies the session)
+
+            When set, a modified session whose SID didn't change only gets a new cookie once this fraction
+            of its lifetime has passed since the cookie was last set, e.g. 0.1 reissues a 30 day cookie at most every 3 days.
+            The cookie's issue time is kept in the session under "_cookie_issued_at".
+            The cookie may then expire up to (reissue_fraction * expiry) seconds before the stored session
+
+        admission:
+
+            Default: None (New sessions are stored as soon as they're modified)
+
+            A sanic_cookies.AdmissionPolicy that keeps new anonymous sessions in a signed cookie
+            until their clients come back, so that one-hit clients (e.g. crawlers) don't fill the store
+            e.g. sanic_cookies.AdmissionPolicy(app.config.SECRET, min_requests=2, rate=100)
+
+    .. note::
+
+        Cookie attributes (domain, path, secure etc.) are built once, when the session is created
     """
 
     def __init__(
@@ -37,6 +122,14 @@ class BaseSession:
         session_name="session",
         warn_lock=True,
         store_factory=SessionDict,
+        read_policy=None,
+        exclude=None,
+        deferred_flush=False,
+        negative_cache=None,
+        singleflight=False,
+        coordinator=None,
+        reissue_fraction=None,
+        admission=None,
     ):
         self.cookie_name = cookie_name
         self.domain = domain
@@ -47,10 +140,32 @@ class BaseSession:
         self.session_cookie = session_cookie
         self.path = path
         self.comment = comment
+        self.reissue_fraction = reissue_fraction
+        self._cookie_attributes = tuple(
+            (name, value)
+            for name, value in (
+                ("httponly", httponly),
+                ("domain", domain),
+                ("samesite", samesite),
+                ("secure", secure),
+                ("path", path),
+                ("comment", comment),
+            )
+            if value is not None
+        )
 
         self.session_name = session_name
         self.warn_lock = warn_lock
         self.store_factory = store_factory
+        self._lazy_store = getattr(store_factory, "lazy", False)
+        self.read_policy = read_policy
+        self.deferred_flush = deferred_flush
+        self.negative_cache = negative_cache
+        self.singleflight = SingleFlight() if singleflight else None
+        self.admission = admission
+        self.hub = InvalidationHub()
+        self._excluded_paths = self._compile_exclusions(exclude)
+        self._has_exempt_handlers = False
 
         self.interfaces = deque()
         if master_interface is not None:
@@ -60,7 +175,10 @@ class BaseSession:
             app.exts = Object()
         setattr(app.exts, self.session_name, self)
 
-        app.register_middleware(self._open_sess, attach_to="request")
+        if coordinator is not None:
+            coordinator.register(self)
+        else:
+            app.register_middleware(self._open_sess, attach_to="request")
         app.register_middleware(self._close_sess, attach_to="response")
 
     #### ------------ Interface management ------------- ####
@@ -86,27 +204,108 @@ class BaseSession:
         if self.interfaces:
             return self.interfaces[0]
 
+    #### ------------ Route exclusion ------------- ####
+
+    @staticmethod
+    def _compile_exclusions(rules):
+        """ Returns a tuple of compiled patterns, or None if there are no rules """
+        if not rules:
+            return None
+        patterns = []
+        compiled = []
+        for rule in rules:
+            if isinstance(rule, str):
+                patterns.append(re.escape(rule))
+            elif rule.flags == _DEFAULT_FLAGS:
+                patterns.append(rule.pattern)
+            else:
+                # Flags (e.g. re.I or an inline "(?i)") apply to the whole pattern, so it's matched on its own
+                compiled.append(rule)
+        if patterns:
+            compiled.insert(0, re.compile("|".join("(?:{})".format(pattern) for pattern in patterns)))
+        return tuple(compiled)
+
+    def exempt(self, fn):
+        """ Decorator that makes a route skip this session's middleware """
+        exempt_from = getattr(fn, "__sanic_cookies_exempt__", frozenset())
+        fn.__sanic_cookies_exempt__ = exempt_from | {self.session_name}
+        self._has_exempt_handlers = True
+        return fn
+
+    @staticmethod
+    def _get_handler(request):
+        route = getattr(request, "route", None)
+        if route is not None:
+            return route.handler
+        try:
+            return request.app.router.get(request)[0]
+        except Exception:
+            return None
+
+    def _is_excluded(self, request):
+        if self._excluded_paths is not None:
+            for pattern in self._excluded_paths:
+                if pattern.match(request.path):
+                    return True
+        if self._has_exempt_handlers:
+            handler = self._get_handler(request)
+            return self.session_name in getattr(handler, "__sanic_cookies_exempt__", ())
+        return False
+
     #### ------------- Interface API -------------- ####
 
-    async def _fetch_sess(self, sid, request=None):
-        return await self.master_interface.fetch(
+    # Fields read on every request by the session manager itself, fetched along with the field names of lazy sessions
+    _eager_fields = (_ISSUED_AT_KEY,)
+
+    async def _fetch_from(self, interface, sid, request=None):
+        if self._lazy_store:
+            return await interface.fetch_lazy(
+                sid, eager_fields=self._eager_fields, expiry=self.expiry, request=request, cookie_name=self.cookie_name
+            )
+        return await interface.fetch(
             sid, expiry=self.expiry, request=request, cookie_name=self.cookie_name
         )
 
+    async def _fetch_sess(self, sid, request=None):
+        pending = self._pending_of(request)
+        if pending is not None and not pending.admitted:
+            # Only in the pending cookie (See: AdmissionPolicy)
+            return dict(pending.data)
+        if self.read_policy is not None:
+            return await self.read_policy.fetch(self, sid, request=request)
+        return await self._fetch_from(self.master_interface, sid, request=request)
+
+    def _store_expiry(self, val):
+        return self.expiry
+
+    def _store_kwargs(self, val):
+        # Extra keyword arguments passed to interface.store
+        return {}
+
     async def _post_sess(self, sid, val, request=None, response=None):
+        if self.negative_cache is not None:
+            self.negative_cache.delete(sid)
+        if self.singleflight is not None:
+            self.singleflight.forget(sid)
+        expiry = self._store_expiry(val)
+        kwargs = self._store_kwargs(val)
         [
             await interface.store(
                 sid,
-                self.expiry,
+                expiry,
                 val,
                 request=request,
                 cookie_name=self.cookie_name,
                 session_name=self.session_name,
+                **kwargs
             )
             for interface in self.interfaces
         ]
+        self.hub.publish(sid, request)
 
     async def _del_sess(self, sid, request=None, response=None):
+        if self.singleflight is not None:
+            self.singleflight.forget(sid)
         [
             await interface.delete(
                 sid,
@@ -116,12 +315,25 @@ class BaseSession:
             )
             for interface in self.interfaces
         ]
+        self.hub.publish(sid, request)
 
     #### ------------- Helpers ------------ ####
 
     @staticmethod
     def _calculate_expires(expiry):
-        return datetime.datetime.utcnow() + datetime.timedelta(seconds=expiry)
+        # Cookie dates have a resolution of a second, so they're only computed once a second
+        return _expires_at(int(time.time()), expiry)
+
+    def _should_reissue_cookie(self, session_dict, request):
+        if self.reissue_fraction is None or request is None:
+            return True
+        if self._get_sid(request, external=True) != session_dict.sid:
+            # New or refreshed SID
+            return True
+        issued_at = session_dict.store.get(_ISSUED_AT_KEY)
+        if issued_at is None:
+            return True
+        return time.time() - issued_at >= self.reissue_fraction * self._store_expiry(session_dict.store)
 
     def _get_sid(self, request, external=True):
         if external:
@@ -133,13 +345,36 @@ class BaseSession:
     def _is_static_master_interface(self):
         # Static interfaces don't change their SID automatically when the
         # value of their underlying store changes (Unlike Fernet, which always changes when modified)
-        return True in tuple(
-            map(
-                lambda interface: isinstance(self.master_interface, interface),
-                STATIC_SID_COOKIE_INTERFACES,
-            )
+        # Marked with a class attribute, so that checking doesn't import every interface
+        return getattr(self.master_interface, "static_sid", False)
+
+    @property
+    def _can_batch_fetch(self):
+        # Read policies pick their own interfaces, so their reads can't be merged
+        return (
+            self.read_policy is None and self._is_static_master_interface and hasattr(self.master_interface, "fetch_many")
         )
 
+    @staticmethod
+    def _is_empty(store):
+        """ Whether a session holds nothing but the session manager's bookkeeping (e.g. the cookie's issue time) """
+        return not store or (len(store) == 1 and _ISSUED_AT_KEY in store)
+
+    def _is_anonymous(self, store):
+        return True
+
+    def _pending_of(self, request):
+        if self.admission is None:
+            return None
+        return self.admission.pending_of(self, request)
+
+    def _defers_admission(self, pending, store):
+        return pending is not None and not pending.admitted and self._is_anonymous(store)
+
+    def _is_valid_sid(self, sid):
+        sid_validator = getattr(self.master_interface, "sid_validator", None)
+        return sid_validator is None or sid_validator(sid)
+
     def refresh_sid(self, sess):
         """
         Important:
@@ -152,6 +387,46 @@ class BaseSession:
             sess.sid = self.master_interface.sid_factory()
         return sess
 
+    def websocket(self, request, flush_interval=1):
+        """
+        A handle for reading and writing the session of a websocket handler without per-message locking
+
+            async with app.exts.session.websocket(request) as sess:
+                ...
+
+        See: WebSocketSession
+        """
+        return WebSocketSession(self, request, flush_interval=flush_interval)
+
+    #### -------------- Bulk --------------- ####
+
+    async def delete_where(self, predicate, batch_size=1000):
+        """
+        Deletes the sessions for which ``predicate(sid, session)`` is true from all interfaces
+
+        Scans the master interface one batch at a time and deletes the matches of each batch together,
+        so memory use doesn't grow with the number of sessions. Requires interfaces with scan_batches and delete_many
+
+            e.g. await app.exts.session.delete_where(lambda sid, sess: sess.get('created_at', 0) < cutoff)
+
+        Returns the number of deleted sessions
+        """
+        deleted = 0
+        async for batch in self.master_interface.scan_batches(batch_size=batch_size):
+            sids = [sid for sid, val in batch if predicate(sid, val)]
+            if not sids:
+                continue
+            for sid in sids:
+                if self.singleflight is not None:
+                    self.singleflight.forget(sid)
+            for interface in self.interfaces:
+                # With the interface's own batch size (e.g. SQLite's is bounded by its host parameter limit)
+                await interface.delete_many(sids)
+            for sid in sids:
+                self.hub.publish(sid)
+            deleted += len(sids)
+        return deleted
+
     #### -------------- Loading --------------- ####
 
     async def _open_sess(self, request):
@@ -176,35 +451,98 @@ class BaseSession:
         # libs to access the session dict
         # and also would make it even harder to have to maintain the current API where you can
         # access the session object via request['session'] at request start
+        if self._is_excluded(request):
+            return
+        sid = self._lookup_sid(request)
+        initial = None
+        if sid is not None:
+            initial = await self._fetch_sess_or_none(sid, request=request)
+        self._set_sess(request, sid, initial)
+
+    def _lookup_sid(self, request):
+        """ Returns the request's SID if it's worth fetching, else None """
         sid = self._get_sid(request, external=True)
         if not sid:
-            sid = self.master_interface.sid_factory()
+            return None
+        if not self._is_valid_sid(sid):
+            # Forged or garbage cookie, don't bother looking it up
+            return None
+        if (
+            self.negative_cache is not None and self._is_static_master_interface and sid in self.negative_cache
+        ):
+            return None
+        return sid
+
+    def _remember_if_missing(self, sid, initial):
+        if initial is None and self.negative_cache is not None:
+            self.negative_cache.set(sid, True)
+
+    def _set_sess(self, request, sid, initial):
+        """ Sets the session dict of a fetched session (or a new one if initial is empty) to the request """
+        if not initial and self.admission is not None and self._is_static_master_interface:
+            pending = self.admission.open(self, request)
             request[self.session_name] = self.store_factory(
-                sid=sid, session=self, warn_lock=self.warn_lock, request=request
+                initial=dict(pending.data) or None,
+                sid=self.master_interface.sid_factory(),
+                session=self,
+                warn_lock=self.warn_lock,
+                request=request,
+            )
+        elif not initial:
+            request[self.session_name] = self.store_factory(
+                sid=self.master_interface.sid_factory(),
+                session=self,
+                warn_lock=self.warn_lock,
+                request=request,
             )
         else:
-            initial = await self._fetch_sess(sid, request=request)
-            if not initial:
-                sid = self.master_interface.sid_factory()
-                request[self.session_name] = self.store_factory(
-                    sid=sid, session=self, warn_lock=self.warn_lock, request=request
-                )
-            else:
-                request[self.session_name] = self.store_factory(
-                    initial=initial,
-                    sid=sid,
-                    session=self,
-                    warn_lock=self.warn_lock,
-                    request=request,
-                )
+            request[self.session_name] = self.store_factory(
+                initial=initial,
+                sid=sid,
+                session=self,
+                warn_lock=self.warn_lock,
+                request=request,
+            )
+
+    async def _fetch_sess_or_none(self, sid, request=None):
+        """ Fetches a session and remembers it if it's missing """
+        if not self._is_static_master_interface:
+            return await self._fetch_sess(sid, request=request)
+        initial = await self._fetch_shared(sid, request=request)
+        self._remember_if_missing(sid, initial)
+        return initial
+
+    async def _fetch_shared(self, sid, request=None):
+        if self.singleflight is None:
+            return await self._fetch_sess(sid, request=request)
+        return await self.singleflight.do(sid, self._fetch_sess, sid, request=request)
 
     #### ------------ Saving --------------- ####
 
     async def _close_sess(self, request, response):
         # NOTE: SHOULD NOT RETURN ANY VALUE, unless you know what you're doing
+        if self._is_excluded(request):
+            return
         session_dict = request.get(self.session_name)
         await self._save_sess(session_dict, request, response)
 
+    async def _load_whole(self, store, sid):
+        """
+        Loads the values of a LazyStore fetched under sid (before it's deleted)
+        and marks them all as dirty, so that they're all written under the new SID
+        """
+        if not isinstance(store, LazyStore):
+            return
+        missing = [key for key, val in dict.items(store) if val is NOT_LOADED]
+        if missing:
+            vals = await self.master_interface.fetch_values(sid, missing)
+            for key in missing:
+                if key in vals:
+                    store.load({key: vals[key]})
+                else:
+                    dict.pop(store, key, None)
+        store.dirty.update(store)
+
     async def _save_sess(self, session_dict, request=None, response=None):
         if session_dict is None:
             await self._del_sess(self._get_sid(request, external=True), request=request)
@@ -212,34 +550,66 @@ class BaseSession:
                 self._del_cookie(response)
         else:
             request = request or session_dict.request
+            session_dict._flush_pending = False
+            pending = self._pending_of(request)
 
             # Handle SID modified
             if session_dict.is_sid_modified:
                 _prev_sids = session_dict._prev_sid.copy()
+                await self._load_whole(session_dict.store, _prev_sids[0])
                 [await self._del_sess(_sid, request=request) for _sid in _prev_sids]
                 session_dict._prev_sid = []
                 # Shouldn't set cookie here, unless is_modified (which will be checked below)
 
             # Handle Session dict store modified
-            if not session_dict.store and session_dict.is_modified:
+            if session_dict.is_modified and self._is_empty(session_dict.store):
                 await self._del_sess(session_dict.sid, request)
                 session_dict.is_modified = False
                 session_dict._should_del_cookie = True
+                if pending is not None:
+                    pending.data = {}
+
+            elif session_dict.is_modified and self._defers_admission(pending, session_dict.store):
+                # Kept in the pending cookie until it's admitted (See: _close_pending)
+                pending.data = dict(session_dict.store)
+                session_dict.is_modified = False
 
             elif session_dict.is_modified:
+                if pending is not None:
+                    pending.admitted = True
+                reissue = self._should_reissue_cookie(session_dict, request)
+                if reissue and self.reissue_fraction is not None:
+                    session_dict.store[_ISSUED_AT_KEY] = int(time.time())
                 await self._post_sess(
                     session_dict.sid, session_dict.store, request=request
                 )
                 session_dict.is_modified = False
-                session_dict._should_set_cookie = True
+                if reissue:
+                    session_dict._should_set_cookie = True
 
             if response is not None:
+                if pending is not None:
+                    await self._close_pending(pending, session_dict, request, response)
+
                 if session_dict._should_del_cookie is True:
                     self._del_cookie(response)
 
                 elif session_dict._should_set_cookie is True:
                     await self._set_cookie(session_dict.sid, request, response)
 
+    async def _close_pending(self, pending, session_dict, request, response):
+        """ Stores the pending session if it's admitted, else (re)sets its cookie """
+        if pending.data and not pending.admitted and self.admission.admit(self, pending):
+            pending.admitted = True
+            if self.reissue_fraction is not None:
+                pending.data[_ISSUED_AT_KEY] = int(time.time())
+            await self._post_sess(session_dict.sid, pending.data, request=request)
+            session_dict._should_set_cookie = True
+        if pending.data and not pending.admitted:
+            self.admission.set_cookie(self, pending, response)
+        elif pending.from_cookie:
+            self.admission.del_cookie(self, response)
+
     #### ------------ Cookie Munching ------------- ####
 
     async def _set_cookie_expiry(self, request, response):
@@ -253,16 +623,9 @@ class BaseSession:
     async def _set_cookie(self, sid, request, response):
         response.cookies[self.cookie_name] = sid
         request, response = await self._set_cookie_expiry(request, response)
-        for name, value in {
-            "httponly": self.httponly,
-            "domain": self.domain,
-            "samesite": self.samesite,
-            "secure": self.secure,
-            "path": self.path,
-            "comment": self.comment,
-        }.items():
-            if value is not None:
-                response.cookies[self.cookie_name][name] = value
+        cookie = response.cookies[self.cookie_name]
+        for name, value in self._cookie_attributes:
+            cookie[name] = value
 
     def _del_cookie(self, response):
         try:
@@ -292,6 +655,14 @@ class Session(BaseSession):
         session_name="session",
         warn_lock=True,
         store_factory=SessionDict,
+        read_policy=None,
+        exclude=None,
+        deferred_flush=False,
+        negative_cache=None,
+        singleflight=False,
+        coordinator=None,
+        reissue_fraction=None,
+        admission=None,
     ):
         super().__init__(
             app=app,
@@ -308,4 +679,12 @@ class Session(BaseSession):
             session_name=session_name,
             warn_lock=warn_lock,
             store_factory=store_factory,
+            read_policy=read_policy,
+            exclude=exclude,
+            deferred_flush=deferred_flush,
+            negative_cache=negative_cache,
+            singleflight=singleflight,
+            coordinator=coordinator,
+            reissue_fraction=reissue_fraction,
+            admission=admission,
         )
@@ -0,0 +1,78 @@
+import copy
+import asyncio
+
+
+__all__ = ["Coordinator"]
+
+
+class Coordinator:
+    """
+    Opens the sessions of several session managers with one request middleware
+
+    The managers that share a master interface fetch their sessions in a single
+    ``interface.fetch_many`` call (e.g. MGET or ``WHERE sid = ANY($1)``) instead of one round trip each.
+    Managers that can't be batched (read policies, interfaces without fetch_many) are fetched concurrently.
+
+        e.g.
+
+            coordinator = Coordinator(app)
+            Session(app, master_interface=interface, coordinator=coordinator)
+            AuthSession(app, master_interface=interface, coordinator=coordinator)
+
+    Arguments:
+
+        app (sanic.Sanic)
+    """
+
+    def __init__(self, app):
+        self.sessions = []
+        self.batches = 0
+        app.register_middleware(self._open_sessions, attach_to="request")
+
+    def register(self, session):
+        self.sessions.append(session)
+
+    async def _open_sessions(self, request):
+        # NOTE: SHOULD NOT RETURN ANY VALUE, unless you know what you're doing
+        groups = {}
+        pending = []
+        for session in self.sessions:
+            if not session._can_batch_fetch:
+                pending.append(session._open_sess(request))
+                continue
+            if session._is_excluded(request):
+                continue
+            sid = session._lookup_sid(request)
+            if sid is None:
+                session._set_sess(request, None, None)
+                continue
+            interface = session.master_interface
+            groups.setdefault(id(interface), (interface, []))[1].append((session, sid))
+
+        for interface, entries in groups.values():
+            if len(entries) == 1:
+                session, sid = entries[0]
+                pending.append(self._open_one(session, sid, request))
+            else:
+                pending.append(self._open_many(interface, entries, request))
+        await asyncio.gather(*pending)
+
+    @staticmethod
+    async def _open_one(session, sid, request):
+        initial = await session._fetch_sess_or_none(sid, request=request)
+        session._set_sess(request, sid, initial)
+
+    async def _open_many(self, interface, entries, request):
+        sids = list(dict.fromkeys(sid for _, sid in entries))
+        self.batches += 1
+        vals = await interface.fetch_many(sids, request=request)
+        fetched = dict(zip(sids, vals))
+        handed_out = set()
+        for session, sid in entries:
+            initial = fetched[sid]
+            if sid in handed_out:
+                # Managers with the same cookie must not share a store
+                initial = copy.deepcopy(initial)
+            handed_out.add(sid)
+            session._remember_if_missing(sid, initial)
+            session._set_sess(request, sid, initial)
@@ -0,0 +1,226 @@
+import asyncio
+from collections import abc
+
+from ..models import NOT_LOADED
+
+
+__all__ = ["InvalidationHub", "WebSocketSession"]
+
+# Marks keys deleted by a WebSocketSession until its changes are flushed
+_DELETED = object()
+
+
+class InvalidationHub:
+    """
+    Tells the WebSocketSessions of a process when the sessions they hold are written or deleted
+
+    Each session manager has one (session.hub), fed by the writes and deletes of the manager itself.
+    Writes made by other processes can be forwarded with publish(sid), e.g. from a Redis pub/sub channel
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self.published = 0
+
+    def subscribe(self, sid, callback):
+        """ callback(sid, source) is called on every publish(sid, source) """
+        self._subscribers.setdefault(sid, set()).add(callback)
+
+    def unsubscribe(self, sid, callback):
+        callbacks = self._subscribers.get(sid)
+        if callbacks is not None:
+            callbacks.discard(callback)
+            if not callbacks:
+                del self._subscribers[sid]
+
+    def publish(self, sid, source=None):
+        callbacks = self._subscribers.get(sid)
+        if not callbacks:
+            return
+        self.published += 1
+        for callback in list(callbacks):
+            callback(sid, source)
+
+
+class WebSocketSession(abc.MutableMapping):
+    """
+    A session handle for websocket handlers
+
+    The session is loaded once, when the handle is entered (from what the request middleware
+    already fetched), and reads are served from that snapshot without any locking or fetching.
+    When the session is written or deleted by another request of the process, the snapshot is
+    reloaded in the background (See: InvalidationHub).
+
+    Writes are kept locally and flushed every ``flush_interval`` seconds and when the handle exits.
+    A flush merges the changed keys into the latest stored session, so concurrent writes to other keys are kept.
+
+        @app.websocket('/feed')
+        async def feed(request, ws):
+            async with app.exts.session.websocket(request) as sess:
+                async for message in ws:
+                    if sess.get('muted'):
+                        continue
+                    sess['last_seen'] = time.time()
+
+    Cookies can't be set once the websocket is open, so only sessions that already have a cookie are worth writing to.
+    Sessions of interfaces that change their SIDs on every write (e.g. InCookieEncrypted) are read only.
+
+    Arguments:
+
+        session (BaseSession)
+
+        request
+
+        flush_interval (float):
+
+            Default: 1 (None: Only flush on exit)
+    """
+
+    def __init__(self, session, request, flush_interval=1):
+        self._session = session
+        self.request = request
+        self.flush_interval = flush_interval
+        self.sid = None
+        self.snapshot = {}
+        self.reloads = 0
+        self.flushes = 0
+        self._changes = {}
+        self._stale = False
+        self._reloader = None
+        self._flusher = None
+
+    #### ------------- Reads ------------- ####
+
+    def __getitem__(self, key):
+        return self.snapshot[key]
+
+    def __iter__(self):
+        return iter(self.snapshot)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __contains__(self, key):
+        return key in self.snapshot
+
+    def __repr__(self):
+        return "WebSocketSession({!r})".format(self.snapshot)
+
+    #### ------------- Writes ------------- ####
+
+    def __setitem__(self, key, value):
+        self._check_writable()
+        self.snapshot[key] = value
+        self._changes[key] = value
+
+    def __delitem__(self, key):
+        self._check_writable()
+        del self.snapshot[key]
+        self._changes[key] = _DELETED
+
+    def _check_writable(self):
+        if not self._session._is_static_master_interface:
+            raise RuntimeError(
+                "Sessions of {} can't be written from a websocket, their cookie can't be updated".format(
+                    type(self._session.master_interface).__name__
+                )
+            )
+
+    @staticmethod
+    def _apply(changes, store):
+        for key, value in changes.items():
+            if value is _DELETED:
+                store.pop(key, None)
+            else:
+                store[key] = value
+        return store
+
+    async def flush(self):
+        """ Writes the changes made since the last flush """
+        if not self._changes:
+            return
+        changes, self._changes = self._changes, {}
+        try:
+            store = self._apply(changes, await self._fetch())
+            if not self._session._is_empty(store):
+                await self._session._post_sess(self.sid, store, request=self.request)
+            else:
+                await self._session._del_sess(self.sid, request=self.request)
+        except BaseException:
+            # Retried on the next flush
+            self._changes = self._apply(self._changes, changes)
+            raise
+        self.snapshot = self._apply(self._changes, dict(store))
+        self.flushes += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                # Kept for the next flush, the last one (on exit) raises
+                pass
+
+    #### ------------- Loading ------------- ####
+
+    async def _loaded(self, store):
+        """ A plain dict copy of a fetched session (with the values lazy sessions didn't fetch) """
+        if not store:
+            return {}
+        store = dict(dict.items(store))
+        missing = [key for key, value in store.items() if value is NOT_LOADED]
+        if missing:
+            vals = await self._session.master_interface.fetch_values(self.sid, missing)
+            for key in missing:
+                if key in vals:
+                    store[key] = vals[key]
+                else:
+                    del store[key]
+        return store
+
+    async def _fetch(self):
+        return await self._loaded(await self._session._fetch_sess(self.sid, request=self.request))
+
+    async def reload(self):
+        """ Replaces the snapshot with the stored session (plus the changes that aren't flushed yet) """
+        self._stale = False
+        self.snapshot = self._apply(self._changes, await self._fetch())
+        self.reloads += 1
+
+    async def _reload_while_stale(self):
+        while self._stale:
+            await self.reload()
+
+    def _invalidate(self, sid, source):
+        if source is self.request:
+            # Written by this handle
+            return
+        self._stale = True
+        if self._reloader is None or self._reloader.done():
+            self._reloader = asyncio.ensure_future(self._reload_while_stale())
+
+    #### ------------- Context manager ------------- ####
+
+    async def __aenter__(self):
+        session_dict = self.request.get(self._session.session_name)
+        if session_dict is None:
+            raise RuntimeError(
+                "request['{}'] isn't set. Is the route excluded from the session middleware?".format(
+                    self._session.session_name
+                )
+            )
+        self.sid = session_dict.sid
+        self.snapshot = await self._loaded(session_dict.store)
+        self._session.hub.subscribe(self.sid, self._invalidate)
+        if self.flush_interval is not None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, *args):
+        self._session.hub.unsubscribe(self.sid, self._invalidate)
+        for task in (self._flusher, self._reloader):
+            if task is not None:
+                task.cancel()
+        self._flusher = self._reloader = None
+        await self.flush()
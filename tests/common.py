@@ -1,3 +1,5 @@
+import uuid
+
 from sanic_cookies import Session, AuthSession
 from sanic_cookies import SessionDict
 
@@ -6,6 +8,9 @@ class MockInterface:
     def __init__(self):
         self._store = {}
 
+    def sid_factory(self):
+        return uuid.uuid4().hex
+
     async def fetch(self, sid, expiry=None, request=None, cookie_name=None):
         return self._store.get(sid)
 
@@ -55,12 +60,38 @@ class MockSessionDict(SessionDict):
         super().__init__(session=session, request=request, *args, **kwargs)
 
 
+class MockCookie(dict):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+class MockCookieJar(dict):
+    def __setitem__(self, k, v):
+        super().__setitem__(k, MockCookie(v))
+
+
+class MockResponse:
+    def __init__(self):
+        self.cookies = MockCookieJar()
+
+
 class MockRequest:
-    def __init__(self, method="GET", session_dict=MockSessionDict(), app=MockApp()):
-        setattr(self, session_dict._session.session_name, session_dict)
+    def __init__(
+        self, method="GET", session_dict=MockSessionDict(), app=MockApp(), path="/"
+    ):
+        if session_dict is not None:
+            setattr(self, session_dict._session.session_name, session_dict)
         self.app = app
         self.method = method
+        self.path = path
         self.cookies = {}
 
     def __getitem__(self, k):
         return getattr(self, k)
+
+    def __setitem__(self, k, v):
+        setattr(self, k, v)
+
+    def get(self, k, default=None):
+        return getattr(self, k, default)
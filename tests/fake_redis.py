@@ -0,0 +1,153 @@
+import time
+import asyncio
+import hashlib
+
+
+def _bytes(val):
+    if isinstance(val, bytes):
+        return val
+    return str(val).encode()
+
+
+class FakeRedis:
+    """ The subset of aioredis 1.x's client used by the Redis interfaces, kept in a dict """
+
+    def __init__(self, scripts=None):
+        self.data = {}
+        self.expires_at = {}
+        self.commands = []
+        # Lua source -> Python implementation: async fn(client, keys, args)
+        self.scripts = {hashlib.sha1(source.encode()).hexdigest(): fn for source, fn in (scripts or {}).items()}
+        self.script_cache = set()
+
+    def _alive(self, key):
+        key = _bytes(key)
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return key in self.data
+
+    def _get(self, key, default=None):
+        return self.data[_bytes(key)] if self._alive(key) else default
+
+    async def get(self, key):
+        self.commands.append("GET")
+        return self._get(key)
+
+    async def setex(self, key, expiry, val):
+        self.commands.append("SETEX")
+        self.data[_bytes(key)] = _bytes(val) if isinstance(val, (str, bytes)) else val
+        self.expires_at[_bytes(key)] = time.time() + expiry
+
+    async def mget(self, key, *keys):
+        self.commands.append("MGET")
+        return [self._get(k) for k in (key,) + keys]
+
+    async def delete(self, key, *keys):
+        self.commands.append("DEL")
+        deleted = 0
+        for k in (key,) + keys:
+            if self._alive(k):
+                del self.data[_bytes(k)]
+                self.expires_at.pop(_bytes(k), None)
+                deleted += 1
+        return deleted
+
+    async def expire(self, key, expiry):
+        self.commands.append("EXPIRE")
+        if self._alive(key):
+            self.expires_at[_bytes(key)] = time.time() + expiry
+
+    async def hkeys(self, key):
+        self.commands.append("HKEYS")
+        return list(self._get(key, {}))
+
+    async def hmget(self, key, field, *fields):
+        self.commands.append("HMGET")
+        hash_ = self._get(key, {})
+        return [hash_.get(_bytes(f)) for f in (field,) + fields]
+
+    async def hgetall(self, key):
+        self.commands.append("HGETALL")
+        return dict(self._get(key, {}))
+
+    async def hmset_dict(self, key, mapping):
+        self.commands.append("HMSET")
+        self._alive(key)
+        hash_ = self.data.setdefault(_bytes(key), {})
+        hash_.update({_bytes(f): _bytes(v) for f, v in mapping.items()})
+
+    async def hdel(self, key, field, *fields):
+        self.commands.append("HDEL")
+        hash_ = self._get(key, {})
+        for f in (field,) + fields:
+            hash_.pop(_bytes(f), None)
+        if not hash_:
+            self.data.pop(_bytes(key), None)
+
+    async def ttl(self, key):
+        if not self._alive(key):
+            return -2
+        expires_at = self.expires_at.get(_bytes(key))
+        return -1 if expires_at is None else round(expires_at - time.time())
+
+    async def incr(self, key):
+        val = int(self._get(key, 0)) + 1
+        self.data[_bytes(key)] = _bytes(val)
+        return val
+
+    async def set(self, key, val):
+        self.data[_bytes(key)] = _bytes(val)
+        self.expires_at.pop(_bytes(key), None)
+
+    async def script_load(self, source):
+        self.commands.append("SCRIPT LOAD")
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        self.script_cache.add(sha)
+        return sha
+
+    async def evalsha(self, sha, keys=(), args=()):
+        self.commands.append("EVALSHA")
+        if sha not in self.script_cache:
+            raise Exception("NOSCRIPT No matching script. Please use EVAL.")
+        return await self.scripts[sha](self, keys, args)
+
+    async def eval(self, source, keys=(), args=()):
+        self.commands.append("EVAL")
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        self.script_cache.add(sha)
+        return await self.scripts[sha](self, keys, args)
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+    def multi_exec(self):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """ Queues commands and runs them on execute (Each queued command returns a future of its result) """
+
+    def __init__(self, client):
+        self._client = client
+        self._queued = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            future = asyncio.get_event_loop().create_future()
+            self._queued.append((command, args, kwargs, future))
+            return future
+
+        return queue
+
+    async def execute(self):
+        results = []
+        for command, args, kwargs, future in self._queued:
+            result = await command(*args, **kwargs)
+            future.set_result(result)
+            results.append(result)
+        self._queued = []
+        return results
@@ -0,0 +1,129 @@
+import pytest
+
+from sanic_cookies import InMemory, AdmissionPolicy, TokenBucket
+from .common import MockApp, MockAuthSession, MockRequest, MockResponse, MockSession
+
+
+async def visit(sess, cookies, modify=True):
+    """ Makes a request with the cookies a client kept and returns the cookies it keeps after """
+    request = MockRequest(session_dict=None)
+    request.cookies = dict(cookies)
+    await sess._open_sess(request)
+    if modify:
+        async with request[sess.session_name] as sess_dict:
+            sess_dict["n"] = sess_dict.get("n", 0) + 1
+    response = MockResponse()
+    await sess._close_sess(request, response)
+    # Pending cookies are set on every response until they're deleted
+    cookies = {name: value for name, value in cookies.items() if name != sess.admission.cookie_name(sess)}
+    cookies.update({name: cookie.value for name, cookie in response.cookies.items()})
+    return request, cookies
+
+
+@pytest.mark.asyncio
+async def test_admitted_on_second_request():
+    interface = InMemory()
+    admission = AdmissionPolicy("secret")
+    sess = MockSession(app=MockApp(), master_interface=interface, admission=admission)
+
+    # One-hit clients are never stored
+    _, cookies = await visit(sess, {})
+    assert interface._store == {}
+    assert sess.cookie_name not in cookies
+    assert admission.deferred == 1
+
+    request, cookies = await visit(sess, cookies)
+    sid = request[sess.session_name].sid
+    assert cookies == {sess.cookie_name: sid}
+    assert (await interface.fetch(sid))["n"] == 2
+    assert admission.admitted == 1
+
+    # Stored sessions are untouched by the policy
+    await visit(sess, cookies)
+    assert (await interface.fetch(sid))["n"] == 3
+    assert admission.admitted == 1
+
+
+@pytest.mark.asyncio
+async def test_returning_client_admitted_without_writes():
+    interface = InMemory()
+    sess = MockSession(app=MockApp(), master_interface=interface, admission=AdmissionPolicy("secret"))
+    _, cookies = await visit(sess, {})
+    request, cookies = await visit(sess, cookies, modify=False)
+    assert (await interface.fetch(request[sess.session_name].sid)) == {"n": 1}
+    assert list(cookies) == [sess.cookie_name]
+
+
+@pytest.mark.asyncio
+async def test_min_age():
+    interface = InMemory()
+    admission = AdmissionPolicy("secret", min_requests=1, min_age=60)
+    sess = MockSession(app=MockApp(), master_interface=interface, admission=admission)
+    _, cookies = await visit(sess, {})
+    _, cookies = await visit(sess, cookies)
+    assert interface._store == {}
+
+    pending = admission.loads(sess, cookies[admission.cookie_name(sess)])
+    pending.first_seen -= 60
+    cookies[admission.cookie_name(sess)] = admission.dumps(sess, pending)
+    request, cookies = await visit(sess, cookies)
+    assert (await interface.fetch(request[sess.session_name].sid))["n"] == 3
+
+
+@pytest.mark.asyncio
+async def test_rate_limit():
+    interface = InMemory()
+    admission = AdmissionPolicy("secret", min_requests=1, rate=1, burst=2)
+    sess = MockSession(app=MockApp(), master_interface=interface, admission=admission)
+    clients = [(await visit(sess, {}))[1] for _ in range(3)]
+    assert len(interface._store) == 2
+    assert (admission.admitted, admission.throttled, admission.deferred) == (2, 1, 1)
+    # Retried on its next request
+    assert admission.cookie_name(sess) in clients[2]
+
+
+def test_forged_or_old_cookies():
+    admission = AdmissionPolicy("secret")
+    sess = MockSession(app=MockApp(), master_interface=InMemory(), admission=admission)
+    other = MockSession(app=MockApp(), master_interface=InMemory(), cookie_name="OTHER", admission=admission)
+    pending = admission.open(sess, MockRequest(session_dict=None))
+    pending.data = {"is_admin": True}
+    value = admission.dumps(sess, pending)
+
+    assert admission.loads(sess, value).data == {"is_admin": True}
+    assert admission.loads(sess, value.replace(".", "x.", 1)) is None
+    assert admission.loads(sess, AdmissionPolicy("other secret").dumps(sess, pending)) is None
+    assert admission.loads(other, value) is None
+    assert admission.loads(sess, "garbage") is None
+
+    pending.first_seen -= admission.max_age + 1
+    assert admission.loads(sess, admission.dumps(sess, pending)) is None
+
+
+@pytest.mark.asyncio
+async def test_login_skips_admission():
+    interface = InMemory()
+    admission = AdmissionPolicy("secret", min_requests=10)
+    sess = MockAuthSession(app=MockApp(), master_interface=interface, admission=admission)
+    _, cookies = await visit(sess, {})
+
+    request = MockRequest(session_dict=None)
+    request.cookies = cookies
+    await sess._open_sess(request)
+    await sess.login_user(request, "user", reset_session=False)
+    response = MockResponse()
+    await sess._close_sess(request, response)
+
+    sid = request[sess.session_name].sid
+    assert response.cookies[sess.cookie_name].value == sid
+    assert await interface.fetch(sid) == {"n": 1, "current_user": "user"}
+    assert admission.admitted == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    bucket.updated_at -= 0.1
+    assert bucket.take()
+    assert not bucket.take()
@@ -0,0 +1,179 @@
+import pytest
+
+from sanic_cookies import Aioredis, AuthSession, FastSessionDict, SessionDict
+from sanic_cookies.models import lock_keeper
+from sanic_cookies.interfaces.redis_scripts import FETCH_AND_TOUCH, STORE_IF_VERSION, VersionConflict
+
+from .common import MockApp, MockRequest, MockResponse, MockSession
+from .fake_redis import FakeRedis, _bytes
+
+
+# Python equivalents of the Lua scripts, run by FakeRedis
+
+
+async def fetch_and_touch(client, keys, args):
+    val = client._get(keys[0])
+    if val is None:
+        return [None, None]
+    version = client._get(keys[1], {})
+    expiry = int(version.get(b"expiry", args[0]))
+    for key in keys:
+        await client.expire(key, expiry)
+    return [val, version.get(b"version")]
+
+
+async def store_if_version(client, keys, args):
+    expiry, val, expected = args[0], args[1], args[2]
+    version = int(client._get(keys[1], {}).get(b"version", 0))
+    if expected != "" and version != int(expected):
+        return None
+    version += 1
+    await client.hmset_dict(keys[1], {"version": version, "expiry": expiry})
+    await client.expire(keys[1], expiry)
+    await client.setex(keys[0], expiry, _bytes(val))
+    return version
+
+
+SCRIPTS = {FETCH_AND_TOUCH.source: fetch_and_touch, STORE_IF_VERSION.source: store_if_version}
+
+
+@pytest.mark.asyncio
+async def test_store_fetch_delete():
+    client = FakeRedis()
+    interface = Aioredis(client)
+    await interface.store("sid", 60, {"foo": "bar"})
+    assert await interface.fetch("sid", expiry=60) == {"foo": "bar"}
+    assert await interface.fetch_many(["sid", "missing"]) == [{"foo": "bar"}, None]
+    await interface.delete("sid")
+    assert await interface.fetch("sid") is None
+    assert client.commands == ["SETEX", "GET", "MGET", "DEL", "GET"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_touch():
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True)
+    await interface.store("sid", 10, {"foo": "bar"})
+    await client.expire("session:sid", 5)
+    await client.expire("session_version:sid", 5)
+
+    # Touched with the expiry it was stored with
+    assert await interface.fetch("sid", expiry=60) == {"foo": "bar"}
+    assert await client.ttl("session:sid") == 10
+    assert await client.ttl("session_version:sid") == 10
+    assert await interface.fetch("missing", expiry=60) is None
+
+    # Sessions stored without the scripts are touched with the fetch's expiry
+    await client.setex("session:unversioned", 10, _bytes('{"foo": "bar"}'))
+    assert await interface.fetch("unversioned", expiry=60) == {"foo": "bar"}
+    assert await client.ttl("session:unversioned") == 60
+
+
+@pytest.mark.asyncio
+async def test_fetch_keeps_login_duration():
+    client = FakeRedis(scripts=SCRIPTS)
+    sess = AuthSession(MockApp(), master_interface=Aioredis(client, scripts=True))
+    request = MockRequest(session_dict=None)
+    await sess._open_sess(request)
+    await sess.login_user(request, "user", duration=60)
+    sid = request[sess.session_name].sid
+    assert await client.ttl("session:" + sid) == 60
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = sid
+    await sess._open_sess(request)
+    assert await sess.current_user(request) == "user"
+    assert await client.ttl("session:" + sid) == 60
+
+
+@pytest.mark.asyncio
+async def test_delete_many_deletes_versions():
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True)
+    for sid in ("a", "b", "c"):
+        await interface.store(sid, 60, {"foo": "bar"})
+    await interface.delete_many(["a", "b"], batch_size=1)
+    assert sorted(client.data) == [b"session:c", b"session_version:c"]
+
+
+@pytest.mark.asyncio
+async def test_scripts_are_loaded_once():
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True)
+    await interface.fetch("sid", expiry=60)
+    await interface.fetch("sid", expiry=60)
+    # NOSCRIPT, then EVAL caches the script
+    assert client.commands == ["EVALSHA", "EVAL", "EVALSHA"]
+
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True)
+    await interface.load_scripts()
+    client.commands = []
+    await interface.fetch("sid", expiry=60)
+    assert client.commands == ["EVALSHA"]
+
+
+@pytest.mark.asyncio
+async def test_check_version():
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True, check_version=True)
+    await interface.store("sid", 60, {"n": 0})
+
+    first, second = MockRequest(session_dict=None), MockRequest(session_dict=None)
+    assert await interface.fetch("sid", expiry=60, request=first) == {"n": 0}
+    assert await interface.fetch("sid", expiry=60, request=second) == {"n": 0}
+
+    await interface.store("sid", 60, {"n": 1}, request=first)
+    # The same request can write again
+    await interface.store("sid", 60, {"n": 2}, request=first)
+    with pytest.raises(VersionConflict):
+        await interface.store("sid", 60, {"n": -1}, request=second)
+    assert await interface.fetch("sid", expiry=60) == {"n": 2}
+
+    # New sessions can't overwrite existing ones
+    third = MockRequest(session_dict=None)
+    assert await interface.fetch("new_sid", expiry=60, request=third) is None
+    await interface.store("new_sid", 60, {"n": 0})
+    with pytest.raises(VersionConflict):
+        await interface.store("new_sid", 60, {"n": 1}, request=third)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("store_factory", [SessionDict, FastSessionDict])
+async def test_version_conflict_releases_the_session(store_factory):
+    client = FakeRedis(scripts=SCRIPTS)
+    interface = Aioredis(client, scripts=True, check_version=True)
+    sess = MockSession(app=MockApp(), master_interface=interface, store_factory=store_factory)
+    sid = interface.sid_factory()
+    await interface.store(sid, 60, {"n": 0})
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = sid
+    await sess._open_sess(request)
+    with pytest.raises(VersionConflict):
+        async with request[sess.session_name] as sess_dict:
+            # Written by another process meanwhile
+            await interface.store(sid, 60, {"n": 1})
+            sess_dict["n"] = 2
+
+    assert sid not in lock_keeper.acquired_locks
+    # The conflicting changes are dropped, the session can be entered again
+    async with request[sess.session_name] as sess_dict:
+        assert sess_dict["n"] == 1
+    await sess._close_sess(request, MockResponse())
+    assert await interface.fetch(sid) == {"n": 1}
+
+
+def test_check_version_requires_scripts():
+    with pytest.raises(ValueError):
+        Aioredis(FakeRedis(), check_version=True)
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_raised():
+    class BrokenRedis(FakeRedis):
+        async def evalsha(self, sha, keys=(), args=()):
+            raise ConnectionError("Connection reset")
+
+    with pytest.raises(ConnectionError):
+        await Aioredis(BrokenRedis(scripts=SCRIPTS), scripts=True).fetch("sid", expiry=60)
@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+from sanic_cookies import AsyncPG
+
+
+class FakeConnection:
+    """ Stands in for an asyncpg connection: runs AsyncPG's statements against a dict, through the registered codec """
+
+    def __init__(self, interface, db):
+        self.interface = interface
+        self.db = db
+        self.codecs = {}
+
+    async def set_type_codec(self, typename, encoder, decoder, schema, format):
+        self.codecs[typename] = (encoder, decoder, schema, format)
+
+    def _live(self):
+        now = time.time()
+        return {sid: row for sid, row in self.db.rows.items() if row["expires_at"] > now}
+
+    async def execute(self, sql, *args):
+        self.db.statements.append((sql, args))
+        interface = self.interface
+        if sql == interface._store:
+            sid, val, secs, user_id = args
+            encoder = self.codecs["jsonb"][0]
+            self.db.rows[sid] = {"val": encoder(val), "expires_at": time.time() + secs, "user_id": user_id}
+        elif sql == interface._delete:
+            self.db.rows.pop(args[0], None)
+        elif sql == interface._delete_many:
+            for sid in args[0]:
+                self.db.rows.pop(sid, None)
+        elif sql in interface._create_table or sql == interface._delete_expired:
+            pass
+        else:
+            raise AssertionError("Unexpected statement: " + sql)
+
+    async def fetch(self, sql, *args):
+        self.db.statements.append((sql, args))
+        decoder = self.codecs["jsonb"][1]
+        live = self._live()
+        if sql == self.interface._fetch_many:
+            return [(sid, decoder(live[sid]["val"])) for sid in args[0] if sid in live]
+        if sql == self.interface._user_sids:
+            return [(sid,) for sid, row in live.items() if row["user_id"] == args[0]]
+        if sql == self.interface._scan:
+            last_sid, limit = args
+            return [(sid, decoder(live[sid]["val"])) for sid in sorted(live) if sid > last_sid][:limit]
+        raise AssertionError("Unexpected statement: " + sql)
+
+    async def fetchval(self, sql, *args):
+        self.db.statements.append((sql, args))
+        assert sql == self.interface._fetch
+        row = self._live().get(args[0])
+        if row is not None:
+            return self.codecs["jsonb"][1](row["val"])
+
+
+class FakePool:
+    def __init__(self):
+        self.rows = {}
+        self.statements = []
+        self.timeouts = []
+        self.conn = None
+
+    def acquire(self, timeout=None):
+        self.timeouts.append(timeout)
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *args):
+                pass
+
+        return Acquire()
+
+
+async def make_interface():
+    interface = AsyncPG(pool=FakePool(), acquire_timeout=5)
+    interface.pool.conn = FakeConnection(interface, interface.pool)
+    await interface.setup_connection(interface.pool.conn)
+    return interface
+
+
+@pytest.mark.asyncio
+async def test_binary_jsonb_codec():
+    interface = await make_interface()
+    encoder, decoder, schema, format = interface.pool.conn.codecs["jsonb"]
+    assert (schema, format) == ("pg_catalog", "binary")
+    # Version 1 of jsonb's binary format, followed by the JSON text
+    assert encoder({"foo": "bar"}) == b'\x01{"foo":"bar"}'
+    assert decoder(b'\x01{"foo":"bar"}') == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_store_fetch_delete():
+    interface = await make_interface()
+    pool = interface.pool
+    await interface.create_table()
+    await interface.store("sid", 60, {"foo": "bar"}, user_id=1)
+    sql, args = pool.statements[-1]
+    assert "make_interval(secs => $3)" in sql and "ON CONFLICT (sid) DO UPDATE" in sql
+    assert args == ("sid", {"foo": "bar"}, 60.0, "1")
+    assert pool.rows["sid"]["val"] == b'\x01{"foo":"bar"}'
+
+    assert await interface.fetch("sid") == {"foo": "bar"}
+    assert await interface.fetch_many(["missing", "sid"]) == [None, {"foo": "bar"}]
+    assert await interface.user_sids(1) == ["sid"]
+
+    await interface.delete("sid")
+    assert await interface.fetch("sid") is None
+    assert set(pool.timeouts) == {5}
+
+
+@pytest.mark.asyncio
+async def test_expired_sessions_arent_fetched():
+    interface = await make_interface()
+    await interface.store("sid", 0, {"foo": "bar"})
+    assert await interface.fetch("sid") is None
+
+
+@pytest.mark.asyncio
+async def test_keyset_scan_and_delete_many():
+    interface = await make_interface()
+    sids = ["sid{:02}".format(i) for i in range(25)]
+    for sid in sids:
+        await interface.store(sid, 60, {"sid": sid})
+
+    batches = [batch async for batch in interface.scan_batches(batch_size=10)]
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [sid for batch in batches for sid, _ in batch] == sids
+    # Each page starts after the last SID of the previous one
+    scans = [args for sql, args in interface.pool.statements if sql == interface._scan]
+    assert scans == [("", 10), ("sid09", 10), ("sid19", 10)]
+
+    await interface.delete_many(sids, batch_size=20)
+    assert interface.pool.rows == {}
+    assert [len(args[0]) for sql, args in interface.pool.statements if sql == interface._delete_many] == [20, 5]
+
+
+def test_rejects_invalid_identifiers():
+    with pytest.raises(ValueError):
+        AsyncPG(table='sessions"; DROP TABLE users; --')
@@ -1,10 +1,12 @@
 import pytest
 
-from sanic_cookies import login_required
+from sanic_cookies import login_required, InMemory, SQLite
 from sanic_cookies.sessions.auth import _DURATION_KEY, _REMEMBER_ME_KEY
 from .common import (
+    MockApp,
     MockRequest,
     MockAuthSession,
+    MockInterface,
     MockSessionDict,
 )
 
@@ -112,3 +114,96 @@ def test_custom_post_sess():
 def test_custom_set_cookie_expiry():
     # TODO:
     pass
+
+
+@pytest.mark.asyncio
+async def test_user_loader():
+
+    # SETUP
+    USERS = {1: {"id": 1, "name": "foo"}}
+    loaded = []
+
+    async def user_loader(user_id):
+        loaded.append(user_id)
+        return USERS.get(user_id)
+
+    sess = MockAuthSession(user_loader=user_loader, user_id_getter=lambda user: user["id"])
+    session_dict = MockSessionDict(session=sess)
+    request = MockRequest(session_dict=session_dict)
+
+    await sess.login_user(request=request, user=USERS[1])
+    async with request[sess.session_name]:
+        # Only the ID is stored
+        assert request[sess.session_name][sess.auth_key] == 1
+
+    # Primed by login_user
+    assert await sess.current_user(request) == USERS[1]
+    assert loaded == []
+
+    USERS[1] = {"id": 1, "name": "bar"}
+    assert await sess.current_user(request) == {"id": 1, "name": "foo"}
+
+    sess.invalidate_user(1)
+    assert await sess.current_user(request) == {"id": 1, "name": "bar"}
+    assert await sess.current_user(request) == {"id": 1, "name": "bar"}
+    assert loaded == [1]
+
+    # Deleted users aren't logged in
+    del USERS[1]
+    sess.invalidate_user(1)
+    assert await sess.current_user(request) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id_getter,expected", [(lambda user: user["id"], {"id": 1, "name": "foo"}), (None, None)])
+async def test_user_loader_with_legacy_sessions(user_id_getter, expected):
+    # Sessions logged in before the user_loader was set hold the whole user
+    async def user_loader(user_id):
+        return {1: {"id": 1, "name": "foo"}}.get(user_id)
+
+    interface = MockInterface()
+    sess = MockAuthSession(master_interface=interface, user_loader=user_loader, user_id_getter=user_id_getter)
+    interface._store["sid"] = {sess.auth_key: {"id": 1, "name": "stale"}}
+    session_dict = MockSessionDict(session=sess, sid="sid")
+    request = MockRequest(session_dict=session_dict)
+
+    assert await sess.current_user(request) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("interface_factory", ["inmemory", "sqlite"])
+async def test_logout_all(interface_factory, tmp_path):
+    if interface_factory == "inmemory":
+        interface = InMemory()
+    else:
+        interface = SQLite(path=str(tmp_path / "sessions.db"))
+    sess = MockAuthSession(
+        app=MockApp(),
+        master_interface=interface,
+        user_id_getter=lambda user: user["id"],
+        track_user_sessions=True,
+    )
+
+    async def login(user):
+        request = MockRequest(session_dict=None)
+        await sess._open_sess(request)
+        await sess.login_user(request, user)
+        return request[sess.session_name].sid
+
+    sids = [await login({"id": 1}) for _ in range(3)]
+    other_sid = await login({"id": 2})
+
+    assert sorted(sid for sid, _ in await sess.list_sessions(1)) == sorted(sids)
+    assert all(val[sess.auth_key] == {"id": 1} for _, val in await sess.list_sessions(1))
+
+    # Logged out sessions aren't listed
+    await interface.delete(sids[0])
+    assert sorted(sid for sid, _ in await sess.list_sessions(1)) == sorted(sids[1:])
+
+    await sess.logout_all(1)
+    assert await sess.list_sessions(1) == []
+    assert [await interface.fetch(sid) for sid in sids] == [None, None, None]
+    assert await interface.fetch(other_sid) == {sess.auth_key: {"id": 2}}
+
+    if interface_factory == "sqlite":
+        interface.close()
@@ -1,5 +1,17 @@
+import re
+
+import pytest
+
+from sanic_cookies import InMemory, TTLCache
 from sanic_cookies.sessions.base import BaseSession
-from .common import MockApp
+from .common import (
+    MockApp,
+    MockAuthSession,
+    MockInterface,
+    MockRequest,
+    MockResponse,
+    MockSession,
+)
 
 
 def test_middlewares_registered():
@@ -8,3 +20,233 @@ def test_middlewares_registered():
 
     assert len(app.req_middleware) == 1
     assert len(app.res_middleware) == 1
+
+
+class MockRoute:
+    def __init__(self, handler):
+        self.handler = handler
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path,excluded",
+    [
+        ("/static/app.js", True),
+        ("/healthz", True),
+        ("/webhooks/stripe/events", True),
+        ("/webhooks/stripe", False),
+        ("/", False),
+        ("/api/static", False),
+    ],
+)
+async def test_excluded_paths(path, excluded):
+    sess = MockSession(
+        app=MockApp(),
+        master_interface=MockInterface(),
+        exclude=["/static", "/healthz", re.compile("/webhooks/[a-z]+/events")],
+    )
+    request = MockRequest(session_dict=None, path=path)
+
+    await sess._open_sess(request)
+    assert (request.get(sess.session_name) is None) is excluded
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path,excluded",
+    [
+        ("/API/hooks", True),
+        ("/api/HOOKS", True),
+        ("/Admin", True),
+        ("/static/app.js", True),
+        ("/STATIC/app.js", False),
+        ("/api/other", False),
+    ],
+)
+async def test_excluded_paths_keep_regex_flags(path, excluded):
+    sess = MockSession(
+        app=MockApp(),
+        master_interface=MockInterface(),
+        exclude=["/static", re.compile("/api/hooks", re.I), re.compile("(?i)/admin")],
+    )
+    request = MockRequest(session_dict=None, path=path)
+
+    await sess._open_sess(request)
+    assert (request.get(sess.session_name) is None) is excluded
+
+
+@pytest.mark.asyncio
+async def test_exempt_route():
+    sess = MockSession(app=MockApp(), master_interface=MockInterface())
+    other_sess = MockSession(
+        app=MockApp(), master_interface=MockInterface(), session_name="other"
+    )
+
+    @sess.exempt
+    async def handler(request):
+        pass
+
+    request = MockRequest(session_dict=None)
+    request.route = MockRoute(handler)
+
+    await sess._open_sess(request)
+    await other_sess._open_sess(request)
+    assert request.get(sess.session_name) is None
+    assert request.get(other_sess.session_name) is not None
+
+    # Shouldn't delete anything or touch the cookies on the way out
+    response = MockResponse()
+    response.cookies[sess.cookie_name] = "untouched"
+    await sess._close_sess(request, response)
+    assert response.cookies[sess.cookie_name].value == "untouched"
+
+
+class CountingInterface(MockInterface):
+    def __init__(self):
+        super().__init__()
+        self.stores = 0
+        self.deletes = 0
+
+    async def store(self, sid, *args, **kwargs):
+        self.stores += 1
+        await super().store(sid, *args, **kwargs)
+
+    async def delete(self, sid, *args, **kwargs):
+        self.deletes += 1
+        await super().delete(sid, *args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_deferred_flush_writes_once():
+    interface = CountingInterface()
+    sess = MockAuthSession(
+        app=MockApp(), master_interface=interface, deferred_flush=True
+    )
+    interface._store["old_sid"] = {"foo": "bar"}
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = "old_sid"
+    await sess._open_sess(request)
+
+    await sess.login_user(request, {"id": 1}, reset_session=False)
+    assert await sess.current_user(request) == {"id": 1}
+    async with request[sess.session_name] as sess_dict:
+        sess_dict["baz"] = "qux"
+        sess_dict.sid = "new_sid"
+
+    assert interface.stores == 0
+    assert interface.deletes == 0
+
+    response = MockResponse()
+    await sess._close_sess(request, response)
+
+    assert interface.stores == 1
+    assert interface.deletes == 1
+    assert "old_sid" not in interface._store
+    assert interface._store["new_sid"] == {"foo": "bar", "current_user": {"id": 1}, "baz": "qux"}
+    assert response.cookies[sess.cookie_name].value == "new_sid"
+
+
+@pytest.mark.asyncio
+async def test_negative_cache():
+    class CountingInMemory(InMemory):
+        fetches = 0
+
+        async def fetch(self, sid, **kwargs):
+            self.fetches += 1
+            return await super().fetch(sid, **kwargs)
+
+    interface = CountingInMemory()
+    sess = MockSession(
+        app=MockApp(), master_interface=interface, negative_cache=TTLCache()
+    )
+    expired_sid = interface.sid_factory()
+
+    for _ in range(3):
+        request = MockRequest(session_dict=None)
+        request.cookies[sess.cookie_name] = expired_sid
+        await sess._open_sess(request)
+        assert request[sess.session_name].sid != expired_sid
+
+    assert interface.fetches == 1
+
+    # Writing the SID invalidates it
+    await sess._post_sess(expired_sid, {"foo": "bar"})
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = expired_sid
+    await sess._open_sess(request)
+
+    assert interface.fetches == 2
+    assert request[sess.session_name].sid == expired_sid
+    assert request[sess.session_name].store == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_delete_where():
+    master, secondary = InMemory(), InMemory()
+    sess = MockSession(app=MockApp(), master_interface=master)
+    sess.add_interface(secondary)
+    for i in range(10):
+        await sess._post_sess("sid%d" % i, {"user_id": i % 2})
+
+    assert await sess.delete_where(lambda sid, val: val["user_id"] == 1, batch_size=3) == 5
+    for interface in (master, secondary):
+        assert sorted([sid async for sid, _ in interface.scan()]) == ["sid%d" % i for i in range(0, 10, 2)]
+
+
+@pytest.mark.asyncio
+async def test_reissue_fraction():
+    interface = InMemory()
+    sess = MockSession(
+        app=MockApp(), master_interface=interface, reissue_fraction=0.5, expiry=100, domain="example.com"
+    )
+
+    async def modify(sid=None):
+        request = MockRequest(session_dict=None)
+        if sid is not None:
+            request.cookies[sess.cookie_name] = sid
+        await sess._open_sess(request)
+        async with request[sess.session_name] as sess_dict:
+            sess_dict["n"] = sess_dict.get("n", 0) + 1
+        response = MockResponse()
+        await sess._close_sess(request, response)
+        return request[sess.session_name].sid, response.cookies.get(sess.cookie_name)
+
+    # New SIDs get a cookie
+    sid, cookie = await modify()
+    assert cookie.value == sid
+    assert cookie["domain"] == "example.com"
+    assert cookie["max-age"] == 100
+
+    # Unchanged SIDs don't until half of the cookie's lifetime has passed
+    assert await modify(sid) == (sid, None)
+    assert (await interface.fetch(sid))["n"] == 2
+
+    stored = await interface.fetch(sid)
+    stored["_cookie_issued_at"] -= 50
+    await interface.store(sid, 100, stored)
+    _, cookie = await modify(sid)
+    assert cookie.value == sid
+    assert await modify(sid) == (sid, None)
+
+
+@pytest.mark.asyncio
+async def test_reissue_fraction_emptied_session_is_deleted():
+    interface = InMemory()
+    sess = MockSession(app=MockApp(), master_interface=interface, reissue_fraction=0.5)
+
+    request = MockRequest(session_dict=None)
+    await sess._open_sess(request)
+    async with request[sess.session_name] as sess_dict:
+        sess_dict["cart"] = [1]
+    await sess._close_sess(request, MockResponse())
+    sid = request[sess.session_name].sid
+    assert "_cookie_issued_at" in await interface.fetch(sid)
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = sid
+    await sess._open_sess(request)
+    async with request[sess.session_name] as sess_dict:
+        del sess_dict["cart"]
+    await sess._close_sess(request, MockResponse())
+    assert await interface.fetch(sid) is None
+    assert request[sess.session_name]._should_del_cookie is True
@@ -0,0 +1,36 @@
+import time
+
+from sanic_cookies.cache import TTLCache
+
+
+def test_entry_expires():
+    cache = TTLCache(ttl=0.1)
+    cache.set("foo", "bar")
+
+    assert cache.get("foo") == "bar"
+    assert "foo" in cache
+    time.sleep(0.1)
+    assert cache.get("foo") is None
+    assert "foo" not in cache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_delete():
+    cache = TTLCache()
+    cache.set("foo", "bar")
+    cache.delete("foo")
+    cache.delete("foo")
+
+    assert cache.get("foo") is None
@@ -0,0 +1,51 @@
+import pickle
+
+import pytest
+
+from sanic_cookies import Compressor, InMemory, SharedMemory, Offload
+
+SESSION = {"cart": [{"sku": "sku-%d" % i, "qty": i} for i in range(200)]}
+
+
+@pytest.mark.parametrize("text", [False, True])
+def test_compressor_roundtrip(text):
+    compressor = Compressor(threshold=100, algorithm="zlib", text=text)
+    small, large = '{"foo":"bar"}', '{"foo":"%s"}' % ("bar" * 100)
+
+    assert compressor.compress(small) == small
+    compressed = compressor.compress(large)
+    assert isinstance(compressed, str if text else bytes)
+    assert len(compressed) < len(large)
+    assert compressor.decompress(compressed) in (large, large.encode())
+
+    # Values written before compression was enabled are read as they are
+    assert compressor.decompress(large) == large
+    assert compressor.decompress(large.encode()) == large.encode()
+
+
+def test_compressor_pickles():
+    compressor = pickle.loads(pickle.dumps(Compressor(threshold=10, algorithm="zlib", level=1)))
+    assert compressor.decompress(compressor.compress(b"x" * 100)) == b"x" * 100
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError):
+        Compressor(algorithm="rot13")
+
+
+@pytest.mark.asyncio
+async def test_interfaces_compress(tmp_path):
+    for interface in (
+        InMemory(compressor=Compressor(algorithm="zlib")),
+        InMemory(compressor=Compressor(algorithm="zlib"), offload=Offload(threshold=0)),
+        SharedMemory(path=str(tmp_path / "sessions"), capacity=8, compressor=Compressor(algorithm="zlib")),
+    ):
+        await interface.store("sid", 60, SESSION)
+        assert await interface.fetch("sid") == SESSION
+        if isinstance(interface, InMemory):
+            stored = interface._store.get(interface.prefix + "sid")
+            assert stored.startswith(b"\xffZ")
+
+    # A compressed session fits in a slot it would otherwise overflow
+    with pytest.raises(ValueError):
+        await SharedMemory(path=str(tmp_path / "uncompressed"), capacity=8).store("sid", 60, SESSION)
@@ -0,0 +1,74 @@
+import pytest
+
+from sanic_cookies import InMemory, Coordinator, FallbackRead
+
+from .common import MockApp, MockRequest, MockSession, MockAuthSession
+
+
+class CountingInMemory(InMemory):
+    fetches = 0
+    batched_fetches = 0
+
+    async def fetch(self, sid, **kwargs):
+        self.fetches += 1
+        return await super().fetch(sid, **kwargs)
+
+    async def fetch_many(self, sids, **kwargs):
+        self.batched_fetches += 1
+        return [await super(CountingInMemory, self).fetch(sid) for sid in sids]
+
+
+@pytest.mark.asyncio
+async def test_coordinator_batches_shared_interface():
+    app = MockApp()
+    interface = CountingInMemory()
+    coordinator = Coordinator(app)
+    sess = MockSession(app=app, master_interface=interface, coordinator=coordinator)
+    auth = MockAuthSession(app=app, master_interface=interface, coordinator=coordinator)
+    assert app.req_middleware == [coordinator._open_sessions]
+
+    sid, auth_sid = interface.sid_factory(), interface.sid_factory()
+    await interface.store(sid, 60, {"foo": "bar"})
+    await interface.store(auth_sid, 60, {"current_user": {"id": 1}})
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = sid
+    request.cookies[auth.cookie_name] = auth_sid
+    await coordinator._open_sessions(request)
+
+    assert interface.batched_fetches == 1
+    assert interface.fetches == 0
+    assert request[sess.session_name].sid == sid
+    assert request[sess.session_name].store == {"foo": "bar"}
+    assert await auth.current_user(request) == {"id": 1}
+
+
+@pytest.mark.asyncio
+async def test_coordinator_without_cookies_or_batching():
+    app = MockApp()
+    interface = CountingInMemory()
+    other = CountingInMemory()
+    coordinator = Coordinator(app)
+    sess = MockSession(app=app, master_interface=interface, coordinator=coordinator)
+    auth = MockAuthSession(
+        app=app,
+        master_interface=interface,
+        coordinator=coordinator,
+        read_policy=FallbackRead(),
+    )
+    auth.add_interface(other)
+
+    sid = interface.sid_factory()
+    await interface.store(sid, 60, {"current_user": {"id": 1}})
+
+    request = MockRequest(session_dict=None)
+    request.cookies[auth.cookie_name] = sid
+    await coordinator._open_sessions(request)
+
+    # No cookie: a new session without a fetch
+    assert request[sess.session_name].sid != sid
+    assert not request[sess.session_name].store
+    # Read policies fetch on their own
+    assert interface.batched_fetches == 0
+    assert interface.fetches == 1
+    assert await auth.current_user(request) == {"id": 1}
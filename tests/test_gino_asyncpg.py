@@ -0,0 +1,45 @@
+import pytest
+
+from sanic_cookies import GinoAsyncPG
+
+
+class FakeClient:
+    """ Stands in for a Gino client: records the statements it's given """
+
+    def __init__(self):
+        self.statements = []
+
+    async def scalar(self, sql, *args):
+        self.statements.append((sql, args))
+
+    async def all(self, sql, *args):
+        self.statements.append((sql, args))
+        return []
+
+
+@pytest.mark.asyncio
+async def test_store_clears_user_id():
+    client = FakeClient()
+    interface = GinoAsyncPG(client, user_id_column=True)
+    await interface.store("sid", 60, {"current_user": 1}, user_id=1)
+    # The user was removed from the session
+    await interface.store("sid", 60, {})
+
+    (first_sql, first_args), (second_sql, second_args) = client.statements
+    assert first_sql == second_sql
+    assert "user_id = EXCLUDED.user_id" in second_sql
+    assert first_args[3] == "1"
+    assert second_args[3] is None
+
+
+@pytest.mark.asyncio
+async def test_user_index_requires_column():
+    client = FakeClient()
+    interface = GinoAsyncPG(client)
+    await interface.store("sid", 60, {"foo": "bar"})
+    assert "user_id" not in client.statements[0][0]
+
+    with pytest.raises(ValueError):
+        await interface.store("sid", 60, {"current_user": 1}, user_id=1)
+    with pytest.raises(ValueError):
+        await interface.user_sids(1)
@@ -0,0 +1,62 @@
+import sys
+import subprocess
+
+import pytest
+
+import sanic_cookies
+
+
+def _modules_after(code):
+    out = subprocess.check_output(
+        [sys.executable, "-c", code + "\nimport sys\nprint(' '.join(sys.modules))"]
+    )
+    return set(out.decode().split())
+
+
+def test_import_is_lazy():
+    modules = _modules_after("import sanic_cookies")
+    assert "cryptography" not in modules
+    assert "sanic_cookies.interfaces.incookie" not in modules
+    assert "sanic_cookies.sessions.base" not in modules
+
+
+OPEN_SESSION = """
+import asyncio
+from sanic_cookies import Session, InMemory
+
+class App:
+    def register_middleware(self, middleware, attach_to=None):
+        pass
+
+class Request(dict):
+    cookies = {"SESSION": "0" * 32}
+    path = "/"
+
+session = Session(App(), master_interface=InMemory())
+request = Request()
+asyncio.new_event_loop().run_until_complete(session._open_sess(request))
+assert request["session"] is not None
+"""
+
+
+def test_unused_interfaces_are_not_imported():
+    modules = _modules_after("from sanic_cookies import Session, AuthSession, InMemory")
+    assert "sanic_cookies.interfaces.inmemory" in modules
+    assert "cryptography" not in modules
+
+
+def test_opening_sessions_doesnt_import_other_interfaces():
+    modules = _modules_after(OPEN_SESSION)
+    assert "sanic_cookies.interfaces.inmemory" in modules
+    for module in ("static", "sqlite", "sharedmem", "asyncpg_pool", "gino_asyncpg", "aioredis", "migrating", "incookie"):
+        assert "sanic_cookies.interfaces." + module not in modules
+    for module in ("sqlite3", "mmap", "cryptography"):
+        assert module not in modules
+
+
+def test_public_api():
+    for name in sanic_cookies.__all__:
+        assert getattr(sanic_cookies, name) is not None
+    assert "InCookieEncrypted" in dir(sanic_cookies)
+    with pytest.raises(AttributeError):
+        sanic_cookies.NotAnAttribute
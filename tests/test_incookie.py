@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+from sanic_cookies import InCookieEncrypted, Offload
+from .common import MockRequest, MockSessionDict
+
+
+def test_encrypt_decrypt():
+    interface = InCookieEncrypted(Fernet.generate_key())
+    token = interface._encrypt({"foo": "bar"})
+
+    assert interface._decrypt(token, ttl=None) == {"foo": "bar"}
+    assert interface._decrypt("garbage", ttl=None) == {}
+
+
+@pytest.mark.asyncio
+async def test_small_payloads_stay_inline():
+    executor = ThreadPoolExecutor(max_workers=1)
+    interface = InCookieEncrypted(
+        Fernet.generate_key(), offload=Offload(threshold=1024, executor=executor)
+    )
+    threads = set()
+
+    def decoder(val):
+        threads.add(threading.get_ident())
+        return {}
+
+    interface.decoder = decoder
+    await interface.fetch(interface._encrypt({"foo": "bar"}), None, None, "SESSION")
+
+    assert threads == {threading.get_ident()}
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_large_payloads_are_offloaded():
+    executor = ThreadPoolExecutor(max_workers=1)
+    interface = InCookieEncrypted(
+        Fernet.generate_key(), offload=Offload(threshold=1024, executor=executor)
+    )
+    threads = set()
+
+    def decoder(val):
+        threads.add(threading.get_ident())
+        return {}
+
+    interface.decoder = decoder
+    await interface.fetch(interface._encrypt({"foo": "x" * 2048}), None, None, "SESSION")
+
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("Executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+async def test_offloaded_store_roundtrip(Executor):
+    executor = Executor(max_workers=1)
+    interface = InCookieEncrypted(
+        Fernet.generate_key(), offload=Offload(threshold=1024, executor=executor)
+    )
+    session_dict = MockSessionDict()
+    request = MockRequest(session_dict=session_dict)
+    name = session_dict._session.session_name
+    val = {"foo": "x" * 4096}
+
+    # First write: the client has no cookie yet, so encoding happens inline
+    await interface.store(None, None, val, request, "SESSION", name)
+    request.cookies["SESSION"] = request[name].sid
+
+    # Second write: the previous cookie is large, so everything is offloaded
+    await interface.store(None, None, val, request, "SESSION", name)
+
+    assert await interface.fetch(request[name].sid, None, request, "SESSION") == val
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_keyring_routes_by_key_id():
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    old = InCookieEncrypted(old_key)
+    before_rotation = InCookieEncrypted({"k1": old_key})
+    after_rotation = InCookieEncrypted({"k2": new_key, "k1": old_key}, legacy_key_id="k1")
+
+    legacy_token = old._encrypt({"v": "legacy"})
+    old_token = before_rotation._encrypt({"v": "old"})
+    new_token = after_rotation._encrypt({"v": "new"})
+    assert old_token.startswith("k1.")
+    assert new_token.startswith("k2.")
+
+    assert await after_rotation.fetch(legacy_token, None, None, "SESSION") == {"v": "legacy"}
+    assert await after_rotation.fetch(old_token, None, None, "SESSION") == {"v": "old"}
+    assert await after_rotation.fetch(new_token, None, None, "SESSION") == {"v": "new"}
+
+    # Doesn't try other keys
+    forged = "k2." + old_token[len("k1."):]
+    assert await after_rotation.fetch(forged, None, None, "SESSION") == {}
+
+    # Retired keys
+    retired = InCookieEncrypted({"k2": new_key})
+    assert await retired.fetch(old_token, None, None, "SESSION") == {}
+    assert await retired.fetch("unknown." + old_token, None, None, "SESSION") == {}
+
+
+@pytest.mark.asyncio
+async def test_keyring_reencrypts_on_write():
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    interface = InCookieEncrypted({"k2": new_key, "k1": old_key})
+    session_dict = MockSessionDict()
+    request = MockRequest(session_dict=session_dict)
+    name = session_dict._session.session_name
+    request.cookies["SESSION"] = InCookieEncrypted({"k1": old_key})._encrypt({"foo": "bar"})
+
+    val = await interface.fetch(request.cookies["SESSION"], None, request, "SESSION")
+    await interface.store(None, None, val, request, "SESSION", name)
+
+    assert request[name].sid.startswith("k2.")
+    assert await interface.fetch(request[name].sid, None, request, "SESSION") == {"foo": "bar"}
+
+
+def test_invalid_key_id():
+    with pytest.raises(ValueError):
+        InCookieEncrypted({"has.dot": Fernet.generate_key()})
@@ -1,5 +1,9 @@
 import time
+import asyncio
 
+import pytest
+
+from sanic_cookies import InMemory
 from sanic_cookies.interfaces.inmemory import ExpiringDict
 
 
@@ -23,3 +27,93 @@ def test_entry_expires():
 def test_cleanup():
     # TODO
     pass
+
+
+@pytest.mark.asyncio
+async def test_snapshot_restore(tmp_path):
+    path = str(tmp_path / "sessions.snapshot")
+    interface = InMemory(snapshot_path=path)
+    await interface.store("foo", 60, {"foo": "bar"})
+    await interface.store("expired", 0.1, {"foo": "bar"})
+    interface._store.set("raw_bytes", 60, b"\x00\xff")
+    await interface.snapshot()
+    time.sleep(0.1)
+
+    restored_interface = InMemory(snapshot_path=path)
+    await restored_interface.store("foo", 60, {"written": "after start"})
+    assert await restored_interface.restore(batch_size=1) == 1
+
+    assert await restored_interface.fetch("foo") == {"written": "after start"}
+    assert await restored_interface.fetch("expired") is None
+    assert restored_interface._store.get("raw_bytes") == b"\x00\xff"
+    expires_at = interface._store.expiry_times["raw_bytes"]
+    assert restored_interface._store.expiry_times["raw_bytes"] == expires_at
+
+
+@pytest.mark.asyncio
+async def test_restore_missing_snapshot(tmp_path):
+    interface = InMemory(snapshot_path=str(tmp_path / "nope"))
+    assert await interface.restore() == 0
+
+
+@pytest.mark.asyncio
+async def test_restore_in_background(tmp_path):
+    path = str(tmp_path / "sessions.snapshot")
+    interface = InMemory(snapshot_path=path)
+    for i in range(100):
+        await interface.store(str(i), 60, {"i": i})
+    await interface.snapshot()
+
+    restored_interface = InMemory(snapshot_path=path, snapshot_interval=0.01)
+    restored_interface.init()
+    await restored_interface.delete("0")
+    await restored_interface.restorer
+    await asyncio.sleep(0.05)
+    restored_interface.kill()
+
+    assert await restored_interface.fetch("0") is None
+    assert await restored_interface.fetch("99") == {"i": 99}
+    # The periodic snapshot ran
+    assert await InMemory(snapshot_path=path).restore() == 99
+
+
+@pytest.mark.asyncio
+async def test_snapshot_keeps_file_of_unfinished_restore(tmp_path):
+    path = str(tmp_path / "sessions.snapshot")
+    interface = InMemory(snapshot_path=path)
+    for i in range(100):
+        await interface.store(str(i), 60, {"i": i})
+    await interface.snapshot()
+
+    # Shut down while restoring
+    restored_interface = InMemory(snapshot_path=path)
+    restored_interface.init()
+    await asyncio.sleep(0)
+    restored_interface.kill()
+    assert await restored_interface.snapshot() is False
+    assert await InMemory(snapshot_path=path).restore() == 100
+
+    # Waits for the restore to finish
+    restored_interface = InMemory(snapshot_path=path)
+    restored_interface.init()
+    await restored_interface.store("new", 60, {"i": "new"})
+    assert await restored_interface.snapshot() is True
+    restored_interface.kill()
+    assert await InMemory(snapshot_path=path).restore() == 101
+
+
+@pytest.mark.asyncio
+async def test_scan_and_delete_many():
+    interface = InMemory()
+    for i in range(5):
+        await interface.store("sid%d" % i, 60, {"i": i})
+
+    seen = []
+    async for batch in interface.scan_batches(batch_size=2):
+        seen.append(len(batch))
+        # Deleting while scanning is fine
+        await interface.delete("sid4")
+    assert seen == [2, 2]
+
+    await interface.delete_many(["sid0", "sid1"])
+    assert [item async for item in interface.scan()] == [("sid2", {"i": 2}), ("sid3", {"i": 3})]
@@ -0,0 +1,116 @@
+import pytest
+
+from sanic_cookies import AioredisHash, LazySessionDict, NotLoadedError
+
+from .common import MockApp, MockAuthSession, MockRequest, MockResponse, MockSession
+from .fake_redis import FakeRedis
+
+
+async def open_request(sess, sid=None):
+    request = MockRequest(session_dict=None)
+    if sid is not None:
+        request.cookies[sess.cookie_name] = sid
+    await sess._open_sess(request)
+    return request
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_only_fetches_what_it_reads():
+    client = FakeRedis()
+    interface = AioredisHash(client)
+    sess = MockSession(app=MockApp(), master_interface=interface, store_factory=LazySessionDict)
+    sid = interface.sid_factory()
+    await interface.store(sid, 60, {"cart": ["a"] * 100, "flags": {"beta": True}, "theme": "dark"})
+    assert await interface.fetch(sid) == {"cart": ["a"] * 100, "flags": {"beta": True}, "theme": "dark"}
+
+    client.commands = []
+    request = await open_request(sess, sid)
+    async with request[sess.session_name] as sess_dict:
+        assert sorted(sess_dict) == ["cart", "flags", "theme"]
+        with pytest.raises(NotLoadedError):
+            sess_dict["cart"]
+        assert await sess_dict.aget("theme") == "dark"
+        # Cached
+        assert sess_dict["theme"] == "dark"
+        assert await sess_dict.aget("missing", "default") == "default"
+        sess_dict["theme"] = "light"
+        del sess_dict["flags"]
+
+    # Field names (+ eager fields) on open and on entering the context manager, then one value
+    assert client.commands == ["HKEYS", "HMGET", "HKEYS", "HMGET", "HMGET", "HDEL", "HMSET", "EXPIRE"]
+    assert await interface.fetch(sid) == {"cart": ["a"] * 100, "theme": "light"}
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_new_and_reset():
+    interface = AioredisHash(FakeRedis())
+    sess = MockSession(app=MockApp(), master_interface=interface, store_factory=LazySessionDict)
+
+    request = await open_request(sess)
+    async with request[sess.session_name] as sess_dict:
+        sess_dict.update({"foo": "bar", "baz": 1})
+    sid = request[sess.session_name].sid
+    assert await interface.fetch(sid) == {"foo": "bar", "baz": 1}
+
+    request = await open_request(sess, sid)
+    async with request[sess.session_name] as sess_dict:
+        sess_dict.reset()
+        sess_dict["qux"] = True
+    assert await interface.fetch(sid) == {"qux": True}
+
+
+@pytest.mark.asyncio
+async def test_lazy_current_user():
+    interface = AioredisHash(FakeRedis())
+    sess = MockAuthSession(app=MockApp(), master_interface=interface, store_factory=LazySessionDict)
+
+    request = await open_request(sess)
+    await sess.login_user(request, {"id": 1}, duration=60)
+    await sess._close_sess(request, MockResponse())
+    sid = request[sess.session_name].sid
+
+    request = await open_request(sess, sid)
+    store = request[sess.session_name].store
+    assert dict.get(store, "_override_expiry") == 60
+    assert await sess.current_user(request) == {"id": 1}
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_keeps_unloaded_fields_on_new_sid():
+    interface = AioredisHash(FakeRedis())
+    sess = MockAuthSession(app=MockApp(), master_interface=interface, store_factory=LazySessionDict)
+    sid = interface.sid_factory()
+    await interface.store(sid, 60, {"cart": [1, 2, 3], "theme": "dark"})
+
+    request = await open_request(sess, sid)
+    await sess.login_user(request, {"id": 1}, reset_session=False)
+    await sess._close_sess(request, MockResponse())
+    new_sid = request[sess.session_name].sid
+    assert new_sid != sid
+    assert await interface.fetch(sid) is None
+    assert await interface.fetch(new_sid) == {"cart": [1, 2, 3], "theme": "dark", "current_user": {"id": 1}}
+
+    # refresh_sid
+    request = await open_request(sess, new_sid)
+    async with request[sess.session_name] as sess_dict:
+        sess.refresh_sid(sess_dict)
+        sess_dict["theme"] = "light"
+    assert await interface.fetch(request[sess.session_name].sid) == {"cart": [1, 2, 3], "theme": "light", "current_user": {"id": 1}}
+
+
+@pytest.mark.asyncio
+async def test_lazy_logout_user():
+    interface = AioredisHash(FakeRedis())
+    sess = MockAuthSession(app=MockApp(), master_interface=interface, store_factory=LazySessionDict)
+    request = await open_request(sess)
+    await sess.login_user(request, {"id": 1})
+    await sess._close_sess(request, MockResponse())
+    sid = request[sess.session_name].sid
+
+    request = await open_request(sess, sid)
+    # Read by the session manager on every write
+    assert dict.get(request[sess.session_name].store, "current_user") == {"id": 1}
+    assert not sess._is_anonymous(request[sess.session_name].store)
+    await sess.logout_user(request, logout_anon=False)
+    await sess._close_sess(request, MockResponse())
+    assert await interface.fetch(sid) is None
@@ -0,0 +1,180 @@
+import asyncio
+import uuid
+
+import pytest
+
+from sanic_cookies import InMemory, Migrating, SignedSID
+from .common import MockApp, MockSession
+
+
+def sids(n):
+    return [uuid.uuid4().hex for _ in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_dual_read():
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    a, b, c = sids(3)
+    await old.store(a, 60, {"from": "old"})
+    await old.store(b, 60, {"from": "old"})
+    await new.store(b, 60, {"from": "new"})
+
+    assert await interface.fetch(a) == {"from": "old"}
+    assert await interface.fetch(b) == {"from": "new"}
+    assert await interface.fetch(c) is None
+    assert await interface.fetch_many([a, b, c]) == [{"from": "old"}, {"from": "new"}, None]
+    assert interface.fallbacks == 2
+
+    # Writes go to the new interface, deletes to both
+    await interface.store(a, 60, {"from": "app"})
+    assert await new.fetch(a) == {"from": "app"}
+    assert await old.fetch(a) == {"from": "old"}
+    await interface.delete(a)
+    assert await interface.fetch(a) is None
+
+
+@pytest.mark.asyncio
+async def test_session_with_migrating_interface():
+    old = InMemory()
+    interface = Migrating(old=old, new=InMemory(sid_factory=SignedSID("secret")))
+    sess = MockSession(app=MockApp(), master_interface=interface)
+    sid = sids(1)[0]
+    await old.store(sid, 60, {"foo": "bar"})
+
+    # Old SIDs are still valid
+    assert sess._is_valid_sid(sid)
+    assert sess._is_valid_sid(interface.sid_factory())
+    assert not sess._is_valid_sid("garbage")
+    assert sess._is_static_master_interface
+    assert [sid async for sid, _ in interface.scan()] == [sid]
+
+
+@pytest.mark.asyncio
+async def test_copy():
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    all_sids = sids(25)
+    for i, sid in enumerate(all_sids):
+        await old.store(sid, 60, {"i": i})
+    await new.store(all_sids[0], 60, {"i": "newer"})
+
+    reports = []
+    progress = await interface.copy(expiry=60, batch_size=10, progress=reports.append)
+    assert progress["done"]
+    assert (progress["batches"], progress["scanned"], progress["copied"], progress["skipped"]) == (3, 25, 24, 1)
+    assert [report["batches"] for report in reports] == [1, 2, 3]
+    # Not overwritten
+    assert await new.fetch(all_sids[0]) == {"i": "newer"}
+    assert [await new.fetch(sid) for sid in all_sids[1:]] == [{"i": i} for i in range(1, 25)]
+
+
+@pytest.mark.asyncio
+async def test_copy_doesnt_restore_deleted_sessions():
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    sid_a, sid_b = sids(2)
+    await old.store(sid_a, 60, {"u": 1})
+    await old.store(sid_b, 60, {"u": 2})
+
+    copying = asyncio.ensure_future(interface.copy(expiry=60, batch_size=1, rate=2))
+    # Logged out while copy() sleeps after the first batch (the second one is already scanned)
+    await asyncio.sleep(0.1)
+    await interface.delete(sid_b)
+    assert await interface.fetch(sid_b) is None
+
+    # Only the batches that aren't written yet are tracked
+    assert list(interface._scanned) == [sid_b]
+    await interface.delete(sid_a)
+    assert list(interface._scanned) == [sid_b]
+
+    progress = await copying
+    assert (progress["copied"], progress["skipped"]) == (1, 1)
+    assert await interface.fetch(sid_b) is None
+    assert interface._scanned is None
+
+
+@pytest.mark.asyncio
+async def test_copy_doesnt_overwrite_writes():
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    sid = sids(1)[0]
+    await old.store(sid, 60, {"u": "stale"})
+    new_store = new.store
+
+    async def slow_store(sid, expiry, val, **kwargs):
+        if val == {"u": "stale"}:
+            await asyncio.sleep(0.1)
+        await new_store(sid, expiry, val, **kwargs)
+
+    new.store = slow_store
+    copying = asyncio.ensure_future(interface.copy(expiry=60))
+    await asyncio.sleep(0.05)
+    # Written while copy() writes the stale session, lands after it
+    await interface.store(sid, 60, {"u": "fresh"})
+    await copying
+    assert await new.fetch(sid) == {"u": "fresh"}
+
+
+@pytest.mark.asyncio
+async def test_copy_indexes_users():
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    sid_a, sid_b = sids(2)
+    await old.store(sid_a, 60, {"user": {"id": 1}}, user_id=1)
+    await old.store(sid_b, 60, {})
+
+    await interface.copy(expiry=60, user_id_of=lambda val: (val.get("user") or {}).get("id"))
+    assert await new.user_sids(1) == [sid_a]
+    # Once the old interface is removed
+    await old.delete(sid_a)
+    assert await interface.user_sids(1) == [sid_a]
+
+
+@pytest.mark.asyncio
+async def test_copy_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "migration.json")
+    old, new = InMemory(), InMemory()
+    interface = Migrating(old=old, new=new)
+    for i, sid in enumerate(sids(25)):
+        await old.store(sid, 60, {"i": i})
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(progress):
+        if progress["batches"] == 2:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        await interface.copy(expiry=60, batch_size=10, checkpoint=checkpoint, progress=interrupt)
+    assert len(new._store) == 20
+
+    copied = []
+    new_store = new.store
+
+    async def store(sid, expiry, val, **kwargs):
+        copied.append(sid)
+        await new_store(sid, expiry, val, **kwargs)
+
+    new.store = store
+    progress = await interface.copy(expiry=60, batch_size=10, checkpoint=checkpoint)
+    assert len(copied) == 5
+    assert (progress["batches"], progress["copied"], progress["done"]) == (3, 25, True)
+    assert len(new._store) == 25
+
+    # Completed
+    assert await interface.copy(expiry=60, batch_size=10, checkpoint=checkpoint) == progress
+    assert len(copied) == 5
+
+
+@pytest.mark.asyncio
+async def test_copy_raises_scan_errors():
+    class BrokenInMemory(InMemory):
+        async def scan_batches(self, batch_size=1000, **kwargs):
+            yield [(sids(1)[0], {})]
+            raise ConnectionError
+
+    interface = Migrating(old=BrokenInMemory(), new=InMemory())
+    with pytest.raises(ConnectionError):
+        await interface.copy(expiry=60)
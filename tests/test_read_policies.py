@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+
+from sanic_cookies import CircuitBreaker, FallbackRead, HedgedRead
+from .common import MockInterface, MockSession
+
+
+class SlowInterface(MockInterface):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch(self, sid, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return await super().fetch(sid, **kwargs)
+
+
+class BrokenInterface(MockInterface):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def fetch(self, sid, **kwargs):
+        self.calls += 1
+        raise ConnectionError("down")
+
+
+def make_session(master, secondary, read_policy):
+    sess = MockSession(master_interface=master, read_policy=read_policy)
+    sess.add_interface(secondary)
+    return sess
+
+
+@pytest.mark.asyncio
+async def test_fallback_read_on_error():
+    secondary = MockInterface()
+    secondary._store["sid"] = {"foo": "bar"}
+    sess = make_session(BrokenInterface(), secondary, FallbackRead())
+
+    assert await sess._fetch_sess("sid") == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_fallback_read_on_timeout():
+    master = SlowInterface(1)
+    secondary = MockInterface()
+    secondary._store["sid"] = {"foo": "bar"}
+    sess = make_session(master, secondary, FallbackRead(timeout=0.01))
+
+    assert await sess._fetch_sess("sid") == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_fallback_read_raises_without_secondaries():
+    sess = MockSession(master_interface=BrokenInterface(), read_policy=FallbackRead())
+
+    with pytest.raises(ConnectionError):
+        await sess._fetch_sess("sid")
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_unhealthy_master():
+    master = BrokenInterface()
+    sess = make_session(
+        master,
+        MockInterface(),
+        FallbackRead(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)),
+    )
+
+    for _ in range(5):
+        assert await sess._fetch_sess("sid") is None
+
+    assert master.calls == 2
+    assert sess.read_policy.breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # Only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_takes_fastest():
+    master = SlowInterface(1)
+    master._store["sid"] = {"from": "master"}
+    secondary = MockInterface()
+    secondary._store["sid"] = {"from": "secondary"}
+    policy = HedgedRead(initial_delay=0.01)
+    sess = make_session(master, secondary, policy)
+
+    assert await sess._fetch_sess("sid") == {"from": "secondary"}
+    assert policy.hedged == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_doesnt_hedge_fast_master():
+    master = MockInterface()
+    master._store["sid"] = {"from": "master"}
+    secondary = SlowInterface(0)
+    policy = HedgedRead(initial_delay=1)
+    sess = make_session(master, secondary, policy)
+
+    assert await sess._fetch_sess("sid") == {"from": "master"}
+    assert policy.hedged == 0
+    assert secondary.calls == 0
+    assert len(policy.latencies) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_cancelled_trial_reopens_breaker():
+    master = SlowInterface(1)
+    master._store["sid"] = {"from": "master"}
+    secondary = MockInterface()
+    secondary._store["sid"] = {"from": "secondary"}
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    policy = HedgedRead(initial_delay=0.01, breaker=breaker)
+    sess = make_session(master, secondary, policy)
+
+    # The half-open trial read loses the hedge and is cancelled
+    assert await sess._fetch_sess("sid") == {"from": "secondary"}
+    await asyncio.sleep(0)
+    assert breaker._trial_running is False
+
+    # The recovered master is tried again
+    master.delay = 0
+    assert await sess._fetch_sess("sid") == {"from": "master"}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_records_cancelled_master_reads():
+    master = SlowInterface(1)
+    master._store["sid"] = {"from": "master"}
+    secondary = MockInterface()
+    secondary._store["sid"] = {"from": "secondary"}
+    policy = HedgedRead(initial_delay=0.05, min_samples=1, min_delay=0)
+    sess = make_session(master, secondary, policy)
+    policy.latencies.append(0.01)
+
+    # The master slows down: the reads it loses still raise the delay
+    for _ in range(3):
+        assert await sess._fetch_sess("sid") == {"from": "secondary"}
+        await asyncio.sleep(0)
+    assert len(policy.latencies) == 4
+    assert min(policy.latencies) > 0.005
+
+
+@pytest.mark.asyncio
+async def test_cancelled_hedged_read_cancels_master():
+    master = SlowInterface(1)
+    master._store["sid"] = {"from": "master"}
+    policy = HedgedRead(initial_delay=1)
+    sess = make_session(master, MockInterface(), policy)
+
+    fetching = asyncio.ensure_future(sess._fetch_sess("sid"))
+    await asyncio.sleep(0.01)
+    fetching.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await fetching
+    await asyncio.sleep(0)
+    assert len(policy.latencies) == 1
+    assert policy.breaker._trial_running is False
+
+
+def test_hedged_read_delay_percentile():
+    policy = HedgedRead(percentile=90, min_samples=10, min_delay=0)
+    assert policy.delay == policy.initial_delay
+
+    policy.latencies.extend(i / 100 for i in range(1, 11))
+    assert policy.delay == 0.1
@@ -54,3 +54,33 @@ async def test_is_modified():
     sess.is_modified = False
     sess["foo"]
     assert sess.is_modified is False
+
+
+@pytest.mark.asyncio
+async def test_fast_session_dict():
+    from sanic_cookies import FastSessionDict
+
+    interface = MockInterface()
+    interface._store["sid"] = {"foo": "bar"}
+    sess = FastSessionDict(sid="sid", session=MockSession(master_interface=interface))
+    assert not hasattr(sess, "__dict__")
+
+    with pytest.warns(RuntimeWarning):
+        sess["foo"] = "baz"
+
+    sess.is_modified = False
+    async with sess:
+        assert sess._is_locked()
+        assert sess["foo"] == "bar"
+        assert sess.get("missing") is None
+        assert sess.setdefault("baz", 1) == 1
+        sess.update(qux=2)
+        assert sess.pop("foo") == "bar"
+        assert sess.is_modified is True
+    assert not sess._is_locked()
+    assert sess.is_modified is False
+    assert interface._store["sid"] == {"baz": 1, "qux": 2}
+
+    async with sess:
+        sess.reset()
+    assert "sid" not in interface._store
@@ -0,0 +1,113 @@
+import time
+import multiprocessing
+
+import pytest
+
+from sanic_cookies import SharedMemory
+from sanic_cookies.interfaces.sharedmem import _DELETED
+
+
+@pytest.fixture
+def interface(tmp_path):
+    interface = SharedMemory(path=str(tmp_path / "sessions"), capacity=8, slot_size=256)
+    yield interface
+    interface.close()
+
+
+@pytest.mark.asyncio
+async def test_store_fetch_delete(interface):
+    await interface.store("sid", 60, {"foo": "bar"})
+    assert await interface.fetch("sid") == {"foo": "bar"}
+
+    await interface.store("sid", 60, {"foo": "baz"})
+    assert await interface.fetch("sid") == {"foo": "baz"}
+
+    await interface.delete("sid")
+    assert await interface.fetch("sid") is None
+
+
+@pytest.mark.asyncio
+async def test_entry_expires(interface):
+    await interface.store("sid", 0.1, {"foo": "bar"})
+    time.sleep(0.1)
+    assert await interface.fetch("sid") is None
+
+
+@pytest.mark.asyncio
+async def test_sweep_in_chunks(interface):
+    await interface.store("expired", 0.01, {"foo": "bar"})
+    await interface.store("live", 60, {"foo": "bar"})
+    time.sleep(0.01)
+
+    chunks = []
+    sweep_chunk = interface._sweep
+
+    def _sweep(start, stop):
+        chunks.append((start, stop))
+        sweep_chunk(start, stop)
+
+    interface._sweep = _sweep
+    await interface.sweep(chunk_size=3)
+    assert chunks == [(0, 3), (3, 6), (6, 8)]
+    states = [interface._mmap[interface._offset(index)] for index in range(interface.capacity)]
+    assert states.count(_DELETED) == 1
+    assert await interface.fetch("live") == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_evicts_soonest_expiring_when_full(interface):
+    for i in range(interface.capacity):
+        await interface.store(str(i), 60 + i, {"i": i})
+
+    await interface.store("new", 60, {"i": "new"})
+
+    assert interface.evictions == 1
+    assert await interface.fetch("new") == {"i": "new"}
+    assert await interface.fetch("0") is None
+    for i in range(1, interface.capacity):
+        assert await interface.fetch(str(i)) == {"i": i}
+
+
+@pytest.mark.asyncio
+async def test_rejects_large_sessions(interface):
+    with pytest.raises(ValueError):
+        await interface.store("sid", 60, {"foo": "x" * interface.slot_size})
+
+
+def test_rejects_incompatible_layout(tmp_path, interface):
+    interface._open()
+    with pytest.raises(ValueError):
+        SharedMemory(path=interface.path, capacity=16, slot_size=256)._open()
+
+
+def _store_in_child(path):
+    import asyncio
+
+    interface = SharedMemory(path=path, capacity=8, slot_size=256)
+    asyncio.new_event_loop().run_until_complete(interface.store("sid", 60, {"from": "child"}))
+    interface.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_across_processes(interface):
+    await interface.store("other_sid", 60, {"from": "parent"})
+
+    process = multiprocessing.get_context("spawn").Process(target=_store_in_child, args=(interface.path,))
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    assert await interface.fetch("sid") == {"from": "child"}
+    assert await interface.fetch("other_sid") == {"from": "parent"}
+
+
+@pytest.mark.asyncio
+async def test_scan_and_delete_many(interface):
+    for i in range(5):
+        await interface.store("sid%d" % i, 60, {"i": i})
+
+    scanned = [item async for item in interface.scan(batch_size=3)]
+    assert sorted(scanned) == [("sid%d" % i, {"i": i}) for i in range(5)]
+
+    await interface.delete_many(["sid0", "sid1"], batch_size=1)
+    assert sorted([sid async for sid, _ in interface.scan()]) == ["sid2", "sid3", "sid4"]
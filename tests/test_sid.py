@@ -0,0 +1,64 @@
+import pytest
+
+from sanic_cookies import InMemory, SignedSID
+from sanic_cookies.interfaces.sid import is_uuid_sid, uuid_sid_factory
+from .common import MockApp, MockRequest, MockSession
+
+
+class CountingInMemory(InMemory):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = 0
+
+    async def fetch(self, sid, **kwargs):
+        self.fetches += 1
+        return await super().fetch(sid, **kwargs)
+
+
+def test_uuid_sid():
+    assert is_uuid_sid(uuid_sid_factory())
+    for sid in ("", "garbage", uuid_sid_factory().upper(), uuid_sid_factory() + "0", None):
+        assert not is_uuid_sid(sid)
+
+
+def test_signed_sid():
+    signed_sid = SignedSID("secret")
+    sid = signed_sid()
+
+    assert signed_sid.validate(sid)
+    assert not SignedSID("other secret").validate(sid)
+    assert not signed_sid.validate(sid[:-1] + ("0" if sid[-1] != "0" else "1"))
+    assert not signed_sid.validate(sid.replace(".", ""))
+    assert not signed_sid.validate("garbage")
+
+
+def test_interfaces_pick_validator():
+    assert InMemory().sid_validator is is_uuid_sid
+    assert InMemory(sid_factory=lambda: "custom").sid_validator is None
+
+    signed_sid = SignedSID("secret")
+    assert InMemory(sid_factory=signed_sid).sid_validator == signed_sid.validate
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sid_factory", [uuid_sid_factory, SignedSID("secret")])
+async def test_invalid_sid_skips_lookup(sid_factory):
+    interface = CountingInMemory(sid_factory=sid_factory)
+    sess = MockSession(app=MockApp(), master_interface=interface)
+    valid_sid = sid_factory()
+    await interface.store(valid_sid, 60, {"foo": "bar"})
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = "forged"
+    await sess._open_sess(request)
+
+    assert interface.fetches == 0
+    assert request[sess.session_name].sid != "forged"
+    assert request[sess.session_name].store == {}
+
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = valid_sid
+    await sess._open_sess(request)
+
+    assert interface.fetches == 1
+    assert request[sess.session_name].store == {"foo": "bar"}
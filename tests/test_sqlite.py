@@ -0,0 +1,106 @@
+import time
+import asyncio
+
+import pytest
+
+from sanic_cookies import SQLite
+from .common import MockApp, MockSession
+
+
+@pytest.fixture
+def interface(tmp_path):
+    interface = SQLite(path=str(tmp_path / "sessions.db"))
+    yield interface
+    interface.close()
+
+
+@pytest.mark.asyncio
+async def test_store_fetch_delete(interface):
+    await interface.store("sid", 60, {"foo": "bar"})
+    assert await interface.fetch("sid") == {"foo": "bar"}
+
+    await interface.store("sid", 60, {"foo": "baz"})
+    assert await interface.fetch("sid") == {"foo": "baz"}
+
+    await interface.delete("sid")
+    assert await interface.fetch("sid") is None
+
+
+@pytest.mark.asyncio
+async def test_wal_mode(interface):
+    assert await interface._read("PRAGMA journal_mode", ()) == [("wal",)]
+
+
+@pytest.mark.asyncio
+async def test_entry_expires(interface):
+    await interface.store("sid", 0.1, {"foo": "bar"})
+    time.sleep(0.1)
+    assert await interface.fetch("sid") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_batched(interface):
+    await asyncio.gather(
+        *(interface.store(str(i), 60, {"i": i}) for i in range(100))
+    )
+
+    assert interface.commits < 100
+    for i in range(100):
+        assert await interface.fetch(str(i)) == {"i": i}
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_raises(interface):
+    with pytest.raises(Exception):
+        await interface._write("INSERT INTO nope VALUES (?)", (1,))
+
+    # The writer is still usable
+    await interface.store("sid", 60, {"foo": "bar"})
+    assert await interface.fetch("sid") == {"foo": "bar"}
+
+
+@pytest.mark.asyncio
+async def test_delete_expired(interface):
+    interface.cleanup_batch_size = 3
+    for i in range(10):
+        await interface.store("expired" + str(i), 0, {"i": i})
+    await interface.store("live", 60, {"foo": "bar"})
+
+    await interface.delete_expired()
+
+    assert await interface._read("SELECT sid FROM sessions", ()) == [("live",)]
+
+
+@pytest.mark.asyncio
+async def test_scan_and_delete_many(interface):
+    for i in range(25):
+        await interface.store("sid%02d" % i, 60, {"i": i})
+    await interface.store("expired", 0.01, {"i": -1})
+    await asyncio.sleep(0.02)
+
+    batches = [batch async for batch in interface.scan_batches(batch_size=10)]
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert sorted(val["i"] for sid, val in [item async for item in interface.scan()]) == list(range(25))
+
+    await interface.delete_many(["sid%02d" % i for i in range(20)], batch_size=7)
+    assert [sid async for sid, _ in interface.scan()] == ["sid%02d" % i for i in range(20, 25)]
+
+
+@pytest.mark.asyncio
+async def test_deletes_stay_under_host_parameter_limit(interface):
+    for i in range(2300):
+        await interface.store("sid%04d" % i, 60, {"i": i})
+    params = []
+    write = interface._write
+
+    async def recording_write(sql, args):
+        if sql.startswith("DELETE"):
+            params.append(len(args))
+        return await write(sql, args)
+
+    interface._write = recording_write
+    await interface.delete_many(["sid%04d" % i for i in range(1000)], batch_size=5000)
+    sess = MockSession(app=MockApp(), master_interface=interface)
+    assert await sess.delete_where(lambda sid, val: True, batch_size=1300) == 1300
+    assert params and max(params) <= 999
+    assert [item async for item in interface.scan()] == []
@@ -95,3 +95,73 @@ async def test_awaits_locked_session_dict(Session, Interface):
             async with session_dict:
                 session_dict["asd"]
                 assert len(lock_keeper.acquired_locks[SID]._waiters) == 1
+
+
+class SlowInterface(MockInterface):
+    def __init__(self):
+        super().__init__()
+        self.fetches = 0
+
+    def sid_factory(self):
+        return "new_sid"
+
+    async def fetch(self, sid, **kwargs):
+        self.fetches += 1
+        val = await super().fetch(sid, **kwargs)
+        await asyncio.sleep(0.01)
+        return val
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_fetches():
+    interface = SlowInterface()
+    interface._store["sid"] = {"foo": {"bar": "baz"}}
+    sess_man = MockSession(master_interface=interface, singleflight=True)
+    fetched = await asyncio.gather(
+        *(sess_man._fetch_shared("sid") for _ in range(10))
+    )
+
+    assert interface.fetches == 1
+    assert sess_man.singleflight.calls == 1
+    assert sess_man.singleflight.deduplicated == 9
+    assert all(f == {"foo": {"bar": "baz"}} for f in fetched)
+    # Independent copies
+    assert len(set(map(id, fetched))) == 10
+    assert len(set(id(f["foo"]) for f in fetched)) == 10
+
+    await sess_man._fetch_shared("sid")
+    assert interface.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_forgets_written_sids():
+    interface = SlowInterface()
+    interface._store["sid"] = {"foo": "old"}
+    sess_man = MockSession(master_interface=interface, singleflight=True)
+
+    async def write():
+        await asyncio.sleep(0.001)
+        await sess_man._post_sess("sid", {"foo": "new"})
+        return await sess_man._fetch_shared("sid")
+
+    old, new = await asyncio.gather(sess_man._fetch_shared("sid"), write())
+
+    assert old == {"foo": "old"}
+    assert new == {"foo": "new"}
+    assert interface.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_errors():
+    sess_man = MockSession(master_interface=MockInterface(), singleflight=True)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ConnectionError()
+
+    results = await asyncio.gather(
+        *(sess_man.singleflight.do("sid", fail) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert sess_man.singleflight.calls == 1
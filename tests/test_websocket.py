@@ -0,0 +1,139 @@
+import uuid
+import asyncio
+
+import pytest
+
+from sanic_cookies import InMemory, InCookieEncrypted, InvalidationHub
+from .common import MockApp, MockRequest, MockResponse, MockSession
+
+
+class CountingInMemory(InMemory):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = 0
+
+    async def fetch(self, sid, **kwargs):
+        self.fetches += 1
+        return await super().fetch(sid, **kwargs)
+
+
+async def open_request(sess, sid):
+    request = MockRequest(session_dict=None)
+    request.cookies[sess.cookie_name] = sid
+    await sess._open_sess(request)
+    return request
+
+
+SID = uuid.uuid4().hex
+
+
+@pytest.fixture
+def sess():
+    return MockSession(app=MockApp(), master_interface=CountingInMemory())
+
+
+@pytest.mark.asyncio
+async def test_reads_from_snapshot(sess):
+    interface = sess.master_interface
+    await interface.store(SID, 60, {"foo": "bar"})
+    request = await open_request(sess, SID)
+    assert interface.fetches == 1
+
+    async with sess.websocket(request) as ws_sess:
+        for _ in range(10):
+            assert ws_sess["foo"] == "bar"
+            assert ws_sess.get("missing") is None
+        assert dict(ws_sess) == {"foo": "bar"}
+    assert interface.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched(sess):
+    interface = sess.master_interface
+    await interface.store(SID, 60, {"foo": "bar", "gone": 1})
+    request = await open_request(sess, SID)
+
+    async with sess.websocket(request, flush_interval=None) as ws_sess:
+        for i in range(10):
+            ws_sess["n"] = i
+        del ws_sess["gone"]
+        assert ws_sess["n"] == 9
+        assert await interface.fetch(SID) == {"foo": "bar", "gone": 1}
+
+        # Changes to other keys made meanwhile are kept
+        await interface.store(SID, 60, {"foo": "baz", "gone": 1})
+        await ws_sess.flush()
+        assert await interface.fetch(SID) == {"foo": "baz", "n": 9}
+        assert dict(ws_sess) == {"foo": "baz", "n": 9}
+        assert ws_sess.flushes == 1
+
+        ws_sess["n"] = 10
+    # Flushed on exit
+    assert await interface.fetch(SID) == {"foo": "baz", "n": 10}
+
+
+@pytest.mark.asyncio
+async def test_periodic_flush(sess):
+    request = await open_request(sess, SID)
+    async with sess.websocket(request, flush_interval=0.01) as ws_sess:
+        ws_sess["foo"] = "bar"
+        await asyncio.sleep(0.05)
+        assert await sess.master_interface.fetch(ws_sess.sid) == {"foo": "bar"}
+        assert ws_sess.flushes == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidated_by_other_requests(sess):
+    await sess.master_interface.store(SID, 60, {"foo": "bar"})
+    ws_request = await open_request(sess, SID)
+
+    async with sess.websocket(ws_request, flush_interval=None) as ws_sess:
+        ws_sess["local"] = True
+
+        request = await open_request(sess, SID)
+        async with request[sess.session_name] as sess_dict:
+            sess_dict["foo"] = "baz"
+        await sess._close_sess(request, MockResponse())
+        await asyncio.sleep(0)
+        assert ws_sess["foo"] == "baz"
+        # Unflushed changes survive reloads
+        assert ws_sess["local"] is True
+        assert ws_sess.reloads == 1
+
+        # Its own writes don't trigger reloads
+        await ws_sess.flush()
+        await asyncio.sleep(0)
+        assert ws_sess.reloads == 1
+
+        await sess.delete_where(lambda sid, val: True)
+        await asyncio.sleep(0)
+        assert dict(ws_sess) == {}
+    assert sess.hub._subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_read_only_for_cookie_sessions():
+    from cryptography.fernet import Fernet
+
+    sess = MockSession(app=MockApp(), master_interface=InCookieEncrypted(Fernet.generate_key()))
+    request = MockRequest(session_dict=None)
+    await sess._open_sess(request)
+    async with sess.websocket(request) as ws_sess:
+        with pytest.raises(RuntimeError):
+            ws_sess["foo"] = "bar"
+
+
+def test_hub():
+    hub = InvalidationHub()
+    calls = []
+
+    def callback(sid, source):
+        calls.append((sid, source))
+
+    hub.subscribe("sid", callback)
+    hub.publish("sid", "source")
+    hub.publish("other")
+    hub.unsubscribe("sid", callback)
+    hub.publish("sid")
+    assert calls == [("sid", "source")]
+    assert hub.published == 1